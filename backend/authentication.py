@@ -0,0 +1,106 @@
+"""
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+JWT verification shared by the HTTP and the websocket endpoints
+"""
+
+import collections
+import copy
+import threading
+import time
+
+import jwt
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from rest_framework_jwt.settings import api_settings
+
+CachedToken = collections.namedtuple('CachedToken', ['user', 'expires_at'])
+
+
+def token_from_header(header: str):
+    """Returns the token of an Authorization header value
+    or None if it is not a JWT header"""
+    parts = header.split()
+    if len(parts) != 2 or parts[0] != api_settings.JWT_AUTH_HEADER_PREFIX:
+        return None
+    return parts[1]
+
+
+class TokenVerifier():
+    """Verifies JWT tokens and caches the users of valid tokens
+
+    Entries are kept until the token expires, but at most max_age
+    seconds so changes of the user (e.g. deactivation) are picked up.
+    The least recently used entry is evicted once size is exceeded.
+    """
+
+    def __init__(self, size: int, max_age: float):
+        self.size = size
+        self.max_age = max_age
+        self._cache = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def cached_user(self, token: str):
+        """Returns the user of an already verified token without
+        touching the database or None if the token is not cached"""
+        with self._lock:
+            entry = self._cache.get(token)
+            if entry is None:
+                return None
+            if entry.expires_at <= time.time():
+                del self._cache[token]
+                return None
+            self._cache.move_to_end(token)
+
+        # every request gets its own copy of the shared user object
+        return copy.copy(entry.user)
+
+    def verify(self, token: str):
+        """Returns the active user the token belongs to
+
+        Returns:
+            None if the token is invalid or expired
+        """
+        user = self.cached_user(token)
+        if user is not None:
+            return user
+
+        try:
+            payload = api_settings.JWT_DECODE_HANDLER(token)
+        except jwt.InvalidTokenError:
+            return None
+
+        username = api_settings.JWT_PAYLOAD_GET_USERNAME_HANDLER(payload)
+        if not username:
+            return None
+
+        user_model = get_user_model()
+        try:
+            user = user_model.objects.get_by_natural_key(username)
+        except user_model.DoesNotExist:
+            return None
+
+        if not user.is_active:
+            return None
+
+        expires_at = time.time() + self.max_age
+        if "exp" in payload:
+            expires_at = min(expires_at, payload["exp"])
+
+        with self._lock:
+            self._cache[token] = CachedToken(user, expires_at)
+            self._cache.move_to_end(token)
+            while len(self._cache) > self.size:
+                self._cache.popitem(last=False)
+
+        return copy.copy(user)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+TOKEN_VERIFIER = TokenVerifier(
+    size=settings.JWT_CACHE["SIZE"], max_age=settings.JWT_CACHE["MAX_AGE"])
@@ -0,0 +1,444 @@
+"""
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+End-to-end benchmarks of the GraphQL API.
+
+The workloads drive the ASGI application in process, /gql/ through
+HTTP requests and the subscriptions through websockets, with the
+token of a real user. Running in process makes it possible to count
+the database queries and gRPC calls of every operation. Use the
+fake LND daemon (backend.lnd.fake_lnd) for reproducible numbers.
+
+Every workload first runs a few warm up requests. Then each of its
+operations is profiled alone, i.e. the database queries and gRPC
+calls of PROFILE_RUNS sequential requests are counted. Finally the
+requests are sent with the given concurrency and the latencies are
+recorded. See ./manage.py benchmark.
+"""
+
+import asyncio
+import collections
+import itertools
+import json
+import subprocess
+import time
+
+from channels.testing import HttpCommunicator, WebsocketCommunicator
+from django.utils import timezone
+from rest_framework_jwt.settings import api_settings
+
+from backend.metrics import QueryCounter
+
+# seconds to wait for a response before it counts as an error
+RESPONSE_TIMEOUT = 60
+
+# sequential requests per operation to count queries and calls
+PROFILE_RUNS = 5
+
+# types of the union responses which report a failed operation
+ERROR_TYPES = frozenset([
+    "Unauthenticated", "ServerError", "WalletInstanceNotFound",
+    "WalletInstanceNotRunning"
+])
+
+Operation = collections.namedtuple("Operation",
+                                   ["name", "query", "variables"])
+
+Workload = collections.namedtuple(
+    "Workload", ["name", "description", "operations", "subscription"])
+
+DASHBOARD = Operation(
+    "Dashboard", """
+query Dashboard {
+    lnGetInfo {
+        __typename
+        ... on GetInfoSuccess {
+            lnInfo { alias blockHeight numActiveChannels }
+        }
+    }
+    lnGetWalletBalance {
+        __typename
+        ... on GetWalletBalanceSuccess { lnWalletBalance { totalBalance } }
+    }
+    lnGetChannelBalance {
+        __typename
+        ... on GetChannelBalanceSuccess { lnChannelBalance { balance } }
+    }
+    lnListChannels {
+        __typename
+        ... on ListChannelsSuccess {
+            channels { chanId active capacity localBalance remoteBalance }
+        }
+    }
+}""", lambda index: {})
+
+PAYMENT_PAGE = Operation(
+    "PaymentPage", """
+query PaymentPage($offset: Int) {
+    lnListPayments(indexOffset: $offset, numMaxPayments: 50) {
+        __typename
+        ... on ListPaymentsSuccess {
+            payments { paymentHash value creationDate fee }
+            lastIndexOffset
+        }
+    }
+}""", lambda index: {"offset": (index % 20) * 50})
+
+INVOICE_PAGE = Operation(
+    "InvoicePage", """
+query InvoicePage($offset: Int) {
+    lnListInvoices(indexOffset: $offset, numMaxInvoices: 50) {
+        __typename
+        ... on ListInvoicesSuccess {
+            invoices { memo value settled creationDate addIndex }
+            lastIndexOffset
+        }
+    }
+}""", lambda index: {"offset": (index % 20) * 50})
+
+ADD_INVOICE = Operation(
+    "AddInvoice", """
+mutation AddInvoice($value: Int!, $memo: String) {
+    lnAddInvoice(value: $value, memo: $memo) {
+        result {
+            __typename
+            ... on AddInvoiceSuccess { invoice { paymentRequest addIndex } }
+        }
+    }
+}""", lambda index: {
+        "value": 1000 + index,
+        "memo": "benchmark {}".format(index)
+    })
+
+PENDING_INVOICES = Operation(
+    "PendingInvoices", """
+query PendingInvoices {
+    lnListInvoices(pendingOnly: true, reverse: true, numMaxInvoices: 20) {
+        __typename
+        ... on ListInvoicesSuccess { invoices { paymentRequest addIndex } }
+    }
+}""", lambda index: {})
+
+INVOICE_SUBSCRIPTION = Operation(
+    "InvoiceSubscription", """
+subscription InvoiceSubscription {
+    invoiceSubscription {
+        __typename
+        ... on InvoiceSubSuccess { invoice { addIndex settled } }
+    }
+}""", lambda index: {})
+
+TRANSACTION_SUBSCRIPTION = Operation(
+    "TransactionSubscription", """
+subscription TransactionSubscription {
+    transactionSubscription {
+        __typename
+        ... on TransactionSubSuccess { transaction { txHash amount } }
+    }
+}""", lambda index: {})
+
+WORKLOADS = collections.OrderedDict(
+    (workload.name, workload) for workload in [
+        Workload("dashboard", "The overview screen polled by the app",
+                 [DASHBOARD], None),
+        Workload("payment_history",
+                 "Paging through the payment and invoice history",
+                 [PAYMENT_PAGE, INVOICE_PAGE], None),
+        Workload("invoice_storm",
+                 "Many new invoices while the app polls the pending ones",
+                 [ADD_INVOICE, ADD_INVOICE, ADD_INVOICE, PENDING_INVOICES],
+                 None),
+        Workload("subscribers", "Many concurrent websocket subscribers",
+                 [INVOICE_SUBSCRIPTION, TRANSACTION_SUBSCRIPTION], True),
+    ])
+
+
+def percentile(values, percent: float) -> float:
+    """Returns the percentile of the values, interpolated linearly"""
+    if not values:
+        return None
+    values = sorted(values)
+    rank = (len(values) - 1) * percent / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (rank - lower)
+
+
+def latency_summary(latencies, duration: float) -> dict:
+    """Returns the percentiles in milliseconds and the throughput"""
+    summary = {"requests": len(latencies)}
+    for name, percent in (("p50", 50), ("p95", 95), ("p99", 99)):
+        value = percentile(latencies, percent)
+        summary[name + "_ms"] = None if value is None else value * 1000
+    summary["mean_ms"] = sum(latencies) * 1000 / len(latencies) \
+        if latencies else None
+    summary["max_ms"] = max(latencies) * 1000 if latencies else None
+    summary["throughput_rps"] = len(latencies) / duration \
+        if duration > 0 else None
+    return summary
+
+
+def failed(result: dict) -> bool:
+    """Whether the GraphQL result reports an error"""
+    if result.get("errors"):
+        return True
+
+    def has_error_type(value):
+        if isinstance(value, dict):
+            typename = value.get("__typename", "")
+            if typename in ERROR_TYPES or typename.endswith("Error"):
+                return True
+            return any(has_error_type(child) for child in value.values())
+        if isinstance(value, list):
+            return any(has_error_type(child) for child in value)
+        return False
+
+    return has_error_type(result.get("data"))
+
+
+def auth_headers(user):
+    """Returns the headers of requests authenticated as the user"""
+    token = api_settings.JWT_ENCODE_HANDLER(
+        api_settings.JWT_PAYLOAD_HANDLER(user))
+    return [(b"content-type", b"application/json"),
+            (b"authorization", "{} {}".format(
+                api_settings.JWT_AUTH_HEADER_PREFIX, token).encode())]
+
+
+def git_revision():
+    """Returns the current commit or None outside of a checkout"""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"],
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Benchmark():
+    """Runs workloads against the ASGI application
+
+    application: e.g. backend.subscriptions.routing.session_application
+    user: the requests are authenticated as this user
+    grpc_calls: optional function returning a Counter of the gRPC
+                calls issued so far by method, e.g. of the fake LND
+    """
+
+    def __init__(self, application, user, grpc_calls=None):
+        self.application = application
+        self.headers = auth_headers(user)
+        self.grpc_calls = grpc_calls
+
+    async def post(self, operation: Operation, index: int) -> dict:
+        communicator = HttpCommunicator(
+            self.application,
+            "POST",
+            "/gql/",
+            body=json.dumps({
+                "query": operation.query,
+                "variables": operation.variables(index),
+                "operationName": operation.name
+            }).encode(),
+            headers=self.headers)
+        response = await communicator.get_response(timeout=RESPONSE_TIMEOUT)
+        if response["status"] != 200:
+            return {"errors": [{"message": response["body"].decode()}]}
+        return json.loads(response["body"].decode())
+
+    def _grpc_snapshot(self):
+        if self.grpc_calls is None:
+            return None
+        return collections.Counter(self.grpc_calls())
+
+    def _grpc_delta(self, before, runs: int):
+        if before is None:
+            return None
+        delta = self._grpc_snapshot()
+        delta.subtract(before)
+        by_method = {
+            method: count / runs
+            for method, count in sorted(delta.items()) if count
+        }
+        return {"total": sum(by_method.values()), "by_method": by_method}
+
+    async def profile(self, operation: Operation, runs: int) -> dict:
+        """Counts the queries and calls of sequential requests"""
+        grpc_before = self._grpc_snapshot()
+        with QueryCounter() as queries:
+            for index in range(runs):
+                await self.post(operation, index)
+        return {
+            "db_queries": queries.count / runs,
+            "grpc_calls": self._grpc_delta(grpc_before, runs)
+        }
+
+    async def run_http(self, workload: Workload, requests: int,
+                       concurrency: int, warmup: int) -> dict:
+        for index in range(warmup):
+            await self.post(workload.operations[index % len(
+                workload.operations)], index)
+
+        operations = collections.OrderedDict()
+        for operation in workload.operations:
+            if operation.name not in operations:
+                operations[operation.name] = await self.profile(
+                    operation, PROFILE_RUNS)
+
+        latencies = collections.defaultdict(list)
+        errors = collections.Counter()
+        indexes = itertools.count()
+
+        async def worker():
+            for index in indexes:
+                if index >= requests:
+                    return
+                operation = workload.operations[index % len(
+                    workload.operations)]
+                start = time.perf_counter()
+                try:
+                    result = await self.post(operation, index)
+                except asyncio.TimeoutError:
+                    result = {"errors": [{"message": "timeout"}]}
+                latencies[operation.name].append(time.perf_counter() - start)
+                if failed(result):
+                    errors[operation.name] += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        duration = time.perf_counter() - start
+
+        for name, profile in operations.items():
+            profile.update(latency_summary(latencies[name], duration))
+            profile["errors"] = errors[name]
+
+        total = latency_summary(
+            list(itertools.chain(*latencies.values())), duration)
+        total["errors"] = sum(errors.values())
+        total["duration_s"] = duration
+        return {"operations": operations, "total": total}
+
+    async def subscribe(self, operation: Operation, duration: float,
+                        stats: dict):
+        communicator = WebsocketCommunicator(
+            self.application,
+            "/subscriptions",
+            headers=self.headers,
+            subprotocols=["graphql-ws"])
+
+        start = time.perf_counter()
+        connected, _ = await communicator.connect(timeout=RESPONSE_TIMEOUT)
+        if not connected:
+            stats["errors"] += 1
+            return
+
+        try:
+            await communicator.send_json_to({"type": "connection_init"})
+            await communicator.receive_json_from(timeout=RESPONSE_TIMEOUT)
+            await communicator.send_json_to({
+                "id": "1",
+                "type": "start",
+                "payload": {
+                    "query": operation.query,
+                    "operationName": operation.name
+                }
+            })
+            stats["connect"].append(time.perf_counter() - start)
+
+            first_event = None
+            deadline = time.perf_counter() + duration
+            while time.perf_counter() < deadline:
+                try:
+                    message = await communicator.receive_json_from(
+                        timeout=deadline - time.perf_counter())
+                except asyncio.TimeoutError:
+                    break
+                if message.get("type") != "data":
+                    continue
+                if failed(message.get("payload", {})):
+                    stats["errors"] += 1
+                    continue
+                stats["events"] += 1
+                if first_event is None:
+                    first_event = time.perf_counter() - start
+                    stats["first_event"].append(first_event)
+        finally:
+            await communicator.disconnect()
+
+    async def run_subscriptions(self, workload: Workload, subscribers: int,
+                                duration: float) -> dict:
+        operations = collections.OrderedDict()
+        for operation in workload.operations:
+            operations[operation.name] = {
+                "connect": [],
+                "first_event": [],
+                "events": 0,
+                "errors": 0
+            }
+
+        grpc_before = self._grpc_snapshot()
+        with QueryCounter() as queries:
+            start = time.perf_counter()
+            await asyncio.gather(*[
+                self.subscribe(operation, duration,
+                               operations[operation.name])
+                for operation in itertools.islice(
+                    itertools.cycle(workload.operations), subscribers)
+            ])
+            elapsed = time.perf_counter() - start
+
+        results = collections.OrderedDict()
+        for name, stats in operations.items():
+            result = latency_summary(stats["connect"], elapsed)
+            result["first_event_p50_ms"] = latency_summary(
+                stats["first_event"], elapsed)["p50_ms"]
+            result["events"] = stats["events"]
+            result["events_per_s"] = stats["events"] / elapsed
+            result["errors"] = stats["errors"]
+            results[name] = result
+
+        return {
+            "operations": results,
+            "total": {
+                "subscribers": subscribers,
+                "events": sum(r["events"] for r in results.values()),
+                "errors": sum(r["errors"] for r in results.values()),
+                "duration_s": elapsed,
+                "db_queries": queries.count,
+                "grpc_calls": self._grpc_delta(grpc_before, 1)
+            }
+        }
+
+    def run(self,
+            workload: Workload,
+            requests: int = 200,
+            concurrency: int = 10,
+            warmup: int = 10,
+            duration: float = 10.0) -> dict:
+        """Runs the workload and returns the results
+
+        For subscription workloads concurrency is the number of
+        subscribers, which listen for duration seconds.
+        """
+        started = timezone.now()
+        if workload.subscription:
+            coroutine = self.run_subscriptions(workload, concurrency,
+                                               duration)
+        else:
+            coroutine = self.run_http(workload, requests, concurrency,
+                                      warmup)
+
+        result = asyncio.get_event_loop().run_until_complete(coroutine)
+        result.update({
+            "workload": workload.name,
+            "revision": git_revision(),
+            "started": started.isoformat(),
+            "options": {
+                "requests": requests,
+                "concurrency": concurrency,
+                "warmup": warmup,
+                "duration": duration
+            }
+        })
+        return result
@@ -9,10 +9,38 @@ import configparser
 
 from bitcoinrpc.authproxy import AuthServiceProxy
 
+from backend.tracing import CLIENT, start_span
+
 CONFIG = configparser.ConfigParser()
 CONFIG.read("config.ini")
 
 
+class TracedServiceProxy(AuthServiceProxy):
+    """AuthServiceProxy which traces the calls to bitcoind"""
+
+    def __getattr__(self, name):
+        if name.startswith('__') and name.endswith('__'):
+            # Python internal stuff
+            raise AttributeError
+        service_name = self._AuthServiceProxy__service_name
+        if service_name is not None:
+            name = "%s.%s" % (service_name, name)
+        return TracedServiceProxy(self._AuthServiceProxy__service_url, name,
+                                  self._AuthServiceProxy__timeout,
+                                  self._AuthServiceProxy__conn)
+
+    def __call__(self, *args):
+        method = self._AuthServiceProxy__service_name
+        with start_span(
+                "bitcoind " + str(method),
+                CLIENT,
+                attributes={
+                    "rpc.system": "jsonrpc",
+                    "rpc.method": method
+                }):
+            return super().__call__(*args)
+
+
 def make_rpc_auth_url(testnet=False):
     """Constructs the RPC authentication URL from configuration
 
@@ -37,4 +65,4 @@ def make_rpc_auth_url(testnet=False):
         http_type, config["btc_rpc_username"], config["btc_rpc_password"],
         config["btc_rpc_host"], config["btc_rpc_port"])
 
-    return AuthServiceProxy(url)
+    return TracedServiceProxy(url)
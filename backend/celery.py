@@ -14,6 +14,9 @@ app.config_from_object("django.conf:settings", namespace="CELERY")
 
 app.autodiscover_tasks()
 
+# propagates the trace context in the headers of the tasks
+import backend.tracing  # pylint: disable=C0413,W0611
+
 app.conf.beat_schedule = {
     'update_wan_ip': {
         'task': 'backend.lnd.tasks.update_wan_ip',
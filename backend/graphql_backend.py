@@ -0,0 +1,232 @@
+"""
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+Caches parsed and validated GraphQL documents.
+
+Clients send the same few documents over and over again. Parsing
+and validating them against the schema is expensive, so the HTTP
+views and the subscription server share an LRU cache of validated
+documents. The cache key contains the schema version, documents of
+an older schema are never reused.
+
+The results of introspection documents only depend on the schema,
+they are executed once per process. Their results can be built once
+and stored in a snapshot of the schema (./manage.py
+build_schema_snapshot), which the workers load on the first
+introspection request instead of executing the documents.
+"""
+
+import collections
+import hashlib
+import json
+import logging
+import os
+import threading
+from functools import partial
+
+from django.conf import settings
+from graphql.backend.base import GraphQLBackend, GraphQLDocument
+from graphql.backend.cache import get_unique_schema_id
+from graphql.execution import ExecutionResult, execute
+from graphql.language import ast
+from graphql.language.base import parse
+from graphql.utils.build_client_schema import build_client_schema
+from graphql.utils.introspection_query import introspection_query
+from graphql.validation import validate
+from promise import Promise
+
+LOGGER = logging.getLogger(__name__)
+
+# documents whose results are stored in the snapshots of the schema
+SNAPSHOT_DOCUMENTS = (introspection_query, )
+
+
+def document_hash(document_string: str) -> str:
+    """Returns the sha256 hex digest of the document"""
+    return hashlib.sha256(document_string.encode("utf-8")).hexdigest()
+
+
+def _invalid_document(errors, *args, **kwargs):
+    return ExecutionResult(errors=errors, invalid=True)
+
+
+def _operations(document_ast) -> list:
+    return [
+        definition for definition in document_ast.definitions
+        if isinstance(definition, ast.OperationDefinition)
+    ]
+
+
+def is_introspection(document_ast) -> bool:
+    """Returns whether the document only queries __schema and __type
+    at the root, their results only depend on the schema"""
+    operations = _operations(document_ast)
+    if not operations or any(op.operation != "query" for op in operations):
+        return False
+    names = set()
+    for operation in operations:
+        for selection in operation.selection_set.selections:
+            if not isinstance(selection, ast.Field):
+                return False
+            names.add(selection.name.value)
+    return bool(names & {"__schema", "__type"}) and names <= {
+        "__schema", "__type", "__typename"
+    }
+
+
+class IntrospectionExecution():
+    """Executes an introspection document once per operation
+    and returns the same result afterwards
+
+    results: known results by operation name, None for the only
+             operation of the document
+    """
+
+    def __init__(self, schema, document_ast, results=None):
+        self.schema = schema
+        self.document_ast = document_ast
+        self.results = dict(results or {})
+        operations = _operations(document_ast)
+        self._only_operation = operations[0].name.value if len(
+            operations) == 1 and operations[0].name else None
+
+    def __call__(self, root_value=None, context_value=None, **kwargs):
+        # the root value and the context do not change meta fields
+        if kwargs.get("variables") or kwargs.get("variable_values"):
+            return execute(self.schema, self.document_ast, root_value,
+                           context_value, **kwargs)
+
+        operation_name = kwargs.get("operation_name")
+        key = None if operation_name == self._only_operation \
+            else operation_name
+        data = self.results.get(key)
+        if data is None:
+            result = execute(
+                self.schema, self.document_ast, operation_name=operation_name)
+            if result.errors:
+                return self._result(result, kwargs)
+            data = result.data
+            self.results[key] = data
+        return self._result(ExecutionResult(data=data), kwargs)
+
+    def _result(self, result, kwargs):
+        return Promise.resolve(result) if kwargs.get("return_promise") \
+            else result
+
+
+def build_snapshot(schema) -> dict:
+    """Executes the SNAPSHOT_DOCUMENTS and returns their results by
+    document hash along with the id of the schema
+
+    Raises the first error of a document. The result of the
+    introspection query is checked by building a client schema.
+    """
+    results = {}
+    for document in SNAPSHOT_DOCUMENTS:
+        result = execute(schema, parse(document))
+        if result.errors:
+            raise result.errors[0]
+        results[document_hash(document)] = result.data
+    build_client_schema(results[document_hash(introspection_query)])
+    return {"schema_id": get_unique_schema_id(schema), "results": results}
+
+
+def load_snapshot(schema, path: str) -> dict:
+    """Returns the results of the snapshot by document hash, empty if
+    there is no snapshot or it belongs to another version of the
+    schema"""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as snapshot_file:
+        snapshot = json.load(snapshot_file)
+    if snapshot.get("schema_id") != get_unique_schema_id(schema):
+        LOGGER.warning(
+            "The schema snapshot %s is outdated, "
+            "run ./manage.py build_schema_snapshot", path)
+        return {}
+    return snapshot["results"]
+
+
+class CachedDocumentBackend(GraphQLBackend):
+    """A graphql backend which parses and validates every
+    document only once
+
+    Documents which fail validation are cached as well, executing
+    them returns the validation errors. Syntax errors are raised
+    and not cached.
+    """
+
+    def __init__(self, size: int, snapshot_path: str = None):
+        self.size = size
+        self.snapshot_path = snapshot_path
+        self.hits = 0
+        self.misses = 0
+        self._documents = collections.OrderedDict()
+        self._snapshots = {}
+        self._lock = threading.Lock()
+
+    def document_from_string(self, schema, document_string):
+        key = (get_unique_schema_id(schema), document_hash(document_string))
+
+        with self._lock:
+            document = self._documents.get(key)
+            if document is not None:
+                self.hits += 1
+                self._documents.move_to_end(key)
+                return document
+            self.misses += 1
+
+        document_ast = parse(document_string)
+        errors = validate(schema, document_ast)
+        if errors:
+            run = partial(_invalid_document, errors)
+        elif is_introspection(document_ast):
+            data = self._snapshot(schema, key[0]).get(key[1])
+            run = IntrospectionExecution(
+                schema, document_ast, None if data is None else {None: data})
+        else:
+            run = partial(execute, schema, document_ast)
+
+        document = GraphQLDocument(
+            schema=schema,
+            document_string=document_string,
+            document_ast=document_ast,
+            execute=run)
+
+        with self._lock:
+            self._documents[key] = document
+            while len(self._documents) > self.size:
+                self._documents.popitem(last=False)
+
+        return document
+
+    def _snapshot(self, schema, schema_id: str) -> dict:
+        # loaded on the first introspection request, most workers
+        # never receive one
+        with self._lock:
+            results = self._snapshots.get(schema_id)
+            if results is None:
+                results = load_snapshot(schema, self.snapshot_path)
+                self._snapshots[schema_id] = results
+            return results
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._documents),
+            }
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+DOCUMENT_CACHE = CachedDocumentBackend(
+    size=settings.GRAPHQL_DOCUMENT_CACHE["SIZE"],
+    snapshot_path=settings.GRAPHQL_DOCUMENT_CACHE["SNAPSHOT"])
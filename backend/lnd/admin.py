@@ -4,7 +4,9 @@ file, You can obtain one at http://mozilla.org/MPL/2.0/.
 """
 
 from django.contrib import admin
-from backend.lnd.models import LNDWallet, IPAddress
+from backend.lnd.models import IPAddress, LNDHost, LNDWallet, PortAllocation
 
 admin.site.register(LNDWallet)
 admin.site.register(IPAddress)
+admin.site.register(PortAllocation)
+admin.site.register(LNDHost)
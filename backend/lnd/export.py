@@ -0,0 +1,183 @@
+"""This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+Streaming exports of the payments, invoices and transactions of a
+wallet, e.g. for accounting.
+
+The GraphQL queries convert the whole history into dicts, graphene
+objects and finally one JSON document. The exports instead convert
+one message of the LND response at a time and write the rows as
+NDJSON or CSV in chunks of LND_EXPORT["CHUNK_SIZE"] bytes, see
+backend.lnd.views.export_view. The invoices are fetched in pages of
+LND_EXPORT["PAGE_SIZE"], ListPayments and GetTransactions have no
+paging and return the whole history in one message.
+
+A page failing after the first one can no longer change the status
+of the response. The failure is logged and NDJSON exports end with
+an object with the error_message instead of the remaining rows.
+
+The rows use the JSON mapping of the LND REST API: the proto field
+names, 64 bit integers as strings and bytes base64 encoded. Nested
+values of the CSV rows are JSON encoded.
+"""
+
+import collections
+import csv
+import itertools
+import json
+import logging
+
+import grpc
+from django.conf import settings
+from google.protobuf.json_format import MessageToDict
+
+from backend.error_responses import ServerError, WalletInstanceNotRunning
+from backend.lnd.rpc import ln
+from backend.lnd.rpc_client import WalletUnavailable
+
+LOGGER = logging.getLogger(__name__)
+
+Export = collections.namedtuple("Export", ["message", "pages"])
+
+Format = collections.namedtuple("Format",
+                                ["content_type", "render", "render_error"])
+
+
+def export_setting(name: str):
+    """Returns the value of the given LND_EXPORT setting"""
+    return settings.LND_EXPORT[name]
+
+
+def _payment_pages(client):
+    yield client.call(
+        "ListPayments", ln.ListPaymentsRequest(), memoize=False).payments
+
+
+def _invoice_pages(client):
+    index_offset = 0
+    while True:
+        response = client.call(
+            "ListInvoices",
+            ln.ListInvoiceRequest(
+                index_offset=index_offset,
+                num_max_invoices=export_setting("PAGE_SIZE")),
+            memoize=False)
+        if not response.invoices:
+            return
+        yield response.invoices
+        index_offset = response.last_index_offset
+
+
+def _transaction_pages(client):
+    yield client.call(
+        "GetTransactions", ln.GetTransactionsRequest(),
+        memoize=False).transactions
+
+
+EXPORTS = {
+    "payments": Export("Payment", _payment_pages),
+    "invoices": Export("Invoice", _invoice_pages),
+    "transactions": Export("Transaction", _transaction_pages),
+}
+
+
+def export_fields(kind: str) -> list:
+    """Returns the names of the fields of the exported messages"""
+    message = getattr(ln, EXPORTS[kind].message)
+    return [field.name for field in message.DESCRIPTOR.fields]
+
+
+def export_rows(client, kind: str):
+    """Returns an iterator over the exported messages as dicts
+
+    The first page is fetched right away, so a failing call raises
+    grpc.RpcError here and not while the response is streamed.
+    """
+    pages = EXPORTS[kind].pages(client)
+    first = next(pages, [])
+    return _dicts(itertools.chain([first], pages))
+
+
+def _dicts(pages):
+    for page in pages:
+        for message in page:
+            yield MessageToDict(
+                message,
+                preserving_proto_field_name=True,
+                including_default_value_fields=True)
+
+
+def render_ndjson(fields: list, rows):
+    """Yields one JSON object per row and line"""
+    for row in rows:
+        yield json.dumps(row) + "\n"
+
+
+def render_ndjson_error(error_message: str) -> str:
+    """Returns the line which ends a failed export"""
+    return json.dumps({"error_message": error_message}) + "\n"
+
+
+class _Echo():
+    """File-like object which returns what is written to it"""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def _cell(value):
+    return json.dumps(value) if isinstance(value, (dict, list)) else value
+
+
+def render_csv(fields: list, rows):
+    """Yields the header line and one line per row"""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow([_cell(row.get(name, "")) for name in fields])
+
+
+FORMATS = {
+    "ndjson": Format("application/x-ndjson", render_ndjson,
+                     render_ndjson_error),
+    # a CSV file has no place for the error
+    "csv": Format("text/csv", render_csv, None),
+}
+
+
+def render_export(export_format: Format, kind: str, rows):
+    """Yields the lines of the export in the given format
+
+    Failing calls for the later pages end the export, see above.
+    """
+    try:
+        yield from export_format.render(export_fields(kind), rows)
+    except WalletUnavailable:
+        error = WalletInstanceNotRunning()
+    except grpc.RpcError as exc:
+        # pylint: disable=E1101
+        error = ServerError.generic_rpc_error(exc.code(), exc.details())
+    else:
+        return
+
+    LOGGER.error("Export of %s failed: %s", kind, error.error_message)
+    if export_format.render_error is not None:
+        yield export_format.render_error(error.error_message)
+
+
+def chunks(lines, size: int):
+    """Encodes the lines as UTF-8 and joins them into chunks of at
+    least size bytes, the last chunk may be shorter"""
+    chunk = []
+    length = 0
+    for line in lines:
+        data = line.encode()
+        chunk.append(data)
+        length += len(data)
+        if length >= size:
+            yield b"".join(chunk)
+            chunk = []
+            length = 0
+    if chunk:
+        yield b"".join(chunk)
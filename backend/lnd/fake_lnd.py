@@ -0,0 +1,706 @@
+"""This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+A fake LND daemon for load tests and benchmarks.
+
+FakeLnd serves the Lightning and WalletUnlocker services over TLS
+just like a real daemon does, so the complete gRPC path of the API
+including the channel cache, macaroons and deadlines is exercised.
+The node serves a synthetic data set generated from a seed, i.e. the
+same options always produce the same channels, payments, invoices
+and transactions.
+
+Latency and errors can be injected into every call, see
+FakeLndOptions. Use ./manage.py fake_lnd to serve a wallet from the
+command line.
+"""
+
+import codecs
+import collections
+import hashlib
+import logging
+import os
+import random
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import grpc
+
+import backend.lnd.rpc_pb2 as ln
+import backend.lnd.rpc_pb2_grpc as lnrpc
+
+LOGGER = logging.getLogger(__name__)
+
+FakeLndOptions = collections.namedtuple(
+    "FakeLndOptions",
+    [
+        # size of the synthetic data set
+        "channels",
+        "peers",
+        "payments",
+        "invoices",
+        "transactions",
+        # seed of the data set and the injected errors
+        "seed",
+        # seconds every call takes and per method overrides,
+        # e.g. {"ListPayments": 0.5}, None for no overrides
+        "latency",
+        "method_latency",
+        # share of the calls which fail with error_code
+        "error_rate",
+        "error_code",
+        # whether the wallet has to be unlocked first and its password,
+        # None accepts every password
+        "locked",
+        "password",
+        # seconds between the settled invoices and transactions sent
+        # to the subscribers, 0 disables the events
+        "event_interval",
+        "max_workers",
+    ],
+    defaults=[
+        10, 10, 100, 100, 100, 0, 0.0, None, 0.0, "UNAVAILABLE", False,
+        None, 0.0, 16
+    ])
+
+# ListInvoices returns at most this many invoices if the request
+# doesn't limit them
+DEFAULT_MAX_INVOICES = 100
+
+# the event log keeps this many events for the subscribers
+EVENT_LOG_SIZE = 1000
+
+_WORDS = [
+    "abandon", "ability", "able", "about", "above", "absent", "absorb",
+    "abstract", "absurd", "abuse", "access", "accident", "account", "accuse",
+    "achieve", "acid", "acoustic", "acquire", "across", "act", "action",
+    "actor", "actress", "actual"
+]
+
+
+def _hex(rng: random.Random, num_bytes: int) -> str:
+    return "{:0{}x}".format(rng.getrandbits(num_bytes * 8), num_bytes * 2)
+
+
+def _pub_key(rng: random.Random) -> str:
+    return "02" + _hex(rng, 32)
+
+
+def payment_request(value: int, payment_hash: str) -> str:
+    """Returns the fake payment request of an invoice
+
+    DecodePayReq of the fake node understands only these.
+    """
+    return "lntb{}n1{}".format(value, payment_hash)
+
+
+def _decode_payment_request(pay_req: str):
+    """Returns the value and payment hash or None"""
+    if not pay_req.startswith("lntb"):
+        return None
+    value, sep, payment_hash = pay_req[4:].partition("n1")
+    if not sep or not value.isdigit() or len(payment_hash) != 64:
+        return None
+    return int(value), payment_hash
+
+
+class FakeLndData():
+    """The synthetic state of a fake node"""
+
+    def __init__(self, options: FakeLndOptions):
+        rng = random.Random(options.seed)
+        now = int(time.time())
+
+        self.identity_pubkey = _pub_key(rng)
+        self.block_height = 1400000 + rng.randrange(100000)
+        self.block_hash = _hex(rng, 32)
+        self.next_address = 0
+        self.settle_index = 0
+
+        self.peers = [
+            ln.Peer(
+                pub_key=_pub_key(rng),
+                address="10.{}.{}.{}:9735".format(
+                    rng.randrange(256), rng.randrange(256),
+                    rng.randrange(256)),
+                bytes_sent=rng.randrange(10**6),
+                bytes_recv=rng.randrange(10**6),
+                sat_sent=rng.randrange(10**6),
+                sat_recv=rng.randrange(10**6),
+                inbound=rng.random() < 0.5,
+                ping_time=rng.randrange(10**6))
+            for _ in range(options.peers)
+        ]
+
+        self.channels = []
+        for index in range(options.channels):
+            capacity = rng.randrange(20000, 16000000)
+            local_balance = rng.randrange(capacity)
+            remote_pubkey = self.peers[index % len(self.peers)].pub_key \
+                if self.peers else _pub_key(rng)
+            self.channels.append(
+                ln.Channel(
+                    active=rng.random() < 0.9,
+                    remote_pubkey=remote_pubkey,
+                    channel_point="{}:{}".format(
+                        _hex(rng, 32), rng.randrange(4)),
+                    chan_id=(self.block_height - index) << 40,
+                    capacity=capacity,
+                    local_balance=local_balance,
+                    remote_balance=capacity - local_balance - 9050,
+                    commit_fee=9050,
+                    commit_weight=724,
+                    fee_per_kw=12500,
+                    total_satoshis_sent=rng.randrange(capacity),
+                    total_satoshis_received=rng.randrange(capacity),
+                    num_updates=rng.randrange(1000),
+                    csv_delay=144))
+
+        self.payments = []
+        for index in range(options.payments):
+            value = rng.randrange(1, 4000000)
+            path = [
+                channel.remote_pubkey
+                for channel in rng.sample(self.channels,
+                                          min(len(self.channels), 3))
+            ]
+            self.payments.append(
+                ln.Payment(
+                    payment_hash=_hex(rng, 32),
+                    value=value,
+                    value_sat=value,
+                    value_msat=value * 1000,
+                    creation_date=now - (options.payments - index) * 60,
+                    path=path,
+                    fee=rng.randrange(100),
+                    payment_preimage=_hex(rng, 32)))
+
+        self.invoices = []
+        for index in range(options.invoices):
+            self.invoices.append(
+                self._invoice(rng, "invoice {}".format(index),
+                              rng.randrange(1, 4000000),
+                              now - (options.invoices - index) * 60,
+                              rng.random() < 0.7))
+
+        self.transactions = [
+            ln.Transaction(
+                tx_hash=_hex(rng, 32),
+                amount=rng.randrange(-5000000, 5000000),
+                num_confirmations=options.transactions - index,
+                block_hash=_hex(rng, 32),
+                block_height=self.block_height - options.transactions + index,
+                time_stamp=now - (options.transactions - index) * 600,
+                total_fees=rng.randrange(10000),
+                dest_addresses=["2N" + _hex(rng, 16)])
+            for index in range(options.transactions)
+        ]
+
+    def _invoice(self, rng, memo: str, value: int, creation_date: int,
+                 settled: bool) -> ln.Invoice:
+        r_hash = bytes.fromhex(_hex(rng, 32))
+        invoice = ln.Invoice(
+            memo=memo,
+            r_preimage=bytes.fromhex(_hex(rng, 32)),
+            r_hash=r_hash,
+            value=value,
+            creation_date=creation_date,
+            payment_request=payment_request(value, r_hash.hex()),
+            expiry=3600,
+            cltv_expiry=144,
+            add_index=len(self.invoices) + 1)
+        if settled:
+            self.settle(invoice, creation_date + 30)
+        return invoice
+
+    def add_invoice(self, rng, memo: str, value: int) -> ln.Invoice:
+        invoice = self._invoice(rng, memo, value, int(time.time()), False)
+        self.invoices.append(invoice)
+        return invoice
+
+    def settle(self, invoice: ln.Invoice, settle_date: int):
+        invoice.settled = True
+        invoice.settle_date = settle_date
+        self.settle_index += 1
+        invoice.settle_index = self.settle_index
+        invoice.amt_paid = invoice.value
+        invoice.amt_paid_sat = invoice.value
+        invoice.amt_paid_msat = invoice.value * 1000
+
+    def wallet_balance(self) -> int:
+        return sum(transaction.amount for transaction in self.transactions)
+
+
+class _EventLog():
+    """Events for the streaming RPCs, read by all subscribers
+
+    Only the last EVENT_LOG_SIZE events are kept, subscribers falling
+    further behind miss the older ones.
+    """
+
+    def __init__(self):
+        self.events = collections.deque(maxlen=EVENT_LOG_SIZE)
+        # number of events appended so far
+        self.appended = 0
+        self._condition = threading.Condition()
+
+    def append(self, event):
+        with self._condition:
+            self.events.append(event)
+            self.appended += 1
+            self._condition.notify_all()
+
+    def follow(self, context, kind):
+        """Yields the events of the kind appended from now on until
+        the call is cancelled"""
+        with self._condition:
+            position = self.appended
+
+        while context.is_active():
+            with self._condition:
+                if position == self.appended:
+                    self._condition.wait(0.5)
+                missed = min(self.appended - position, len(self.events))
+                new_events = list(self.events)[len(self.events) - missed:]
+                position = self.appended
+            for event_kind, event in new_events:
+                if event_kind == kind:
+                    yield event
+
+
+class FakeLightning(lnrpc.LightningServicer):
+    """Serves the Lightning service from the synthetic data set"""
+
+    def __init__(self, node: "FakeLnd"):
+        self.node = node
+
+    def _data(self, context) -> FakeLndData:
+        if self.node.locked:
+            # a locked daemon only serves the WalletUnlocker service
+            context.abort(grpc.StatusCode.UNIMPLEMENTED,
+                          "unknown service lnrpc.Lightning")
+        return self.node.data
+
+    def GetInfo(self, request, context):
+        data = self._data(context)
+        with self.node.lock:
+            active = sum(1 for channel in data.channels if channel.active)
+            return ln.GetInfoResponse(
+                identity_pubkey=data.identity_pubkey,
+                alias="fake-lnd",
+                num_active_channels=active,
+                num_inactive_channels=len(data.channels) - active,
+                num_peers=len(data.peers),
+                block_height=data.block_height,
+                block_hash=data.block_hash,
+                synced_to_chain=True,
+                testnet=True,
+                chains=["bitcoin"],
+                uris=[
+                    "{}@127.0.0.1:9735".format(data.identity_pubkey)
+                ],
+                best_header_timestamp=int(time.time()),
+                version="0.5.0-fake")
+
+    def WalletBalance(self, request, context):
+        data = self._data(context)
+        with self.node.lock:
+            balance = data.wallet_balance()
+        return ln.WalletBalanceResponse(
+            total_balance=balance, confirmed_balance=balance)
+
+    def ChannelBalance(self, request, context):
+        data = self._data(context)
+        with self.node.lock:
+            balance = sum(channel.local_balance for channel in data.channels)
+        return ln.ChannelBalanceResponse(balance=balance)
+
+    def GetTransactions(self, request, context):
+        data = self._data(context)
+        with self.node.lock:
+            return ln.TransactionDetails(transactions=data.transactions)
+
+    def ListChannels(self, request, context):
+        data = self._data(context)
+        with self.node.lock:
+            channels = data.channels
+            if request.active_only:
+                channels = [c for c in channels if c.active]
+            if request.inactive_only:
+                channels = [c for c in channels if not c.active]
+            return ln.ListChannelsResponse(channels=channels)
+
+    def ListPeers(self, request, context):
+        data = self._data(context)
+        with self.node.lock:
+            return ln.ListPeersResponse(peers=data.peers)
+
+    def ListPayments(self, request, context):
+        data = self._data(context)
+        with self.node.lock:
+            return ln.ListPaymentsResponse(payments=data.payments)
+
+    def ListInvoices(self, request, context):
+        data = self._data(context)
+        num_max = request.num_max_invoices or DEFAULT_MAX_INVOICES
+
+        with self.node.lock:
+            invoices = [
+                invoice for invoice in data.invoices
+                if not request.pending_only or not invoice.settled
+            ]
+            if request.reversed:
+                if request.index_offset:
+                    invoices = [
+                        invoice for invoice in invoices
+                        if invoice.add_index < request.index_offset
+                    ]
+                invoices = invoices[-num_max:]
+            else:
+                invoices = [
+                    invoice for invoice in invoices
+                    if invoice.add_index > request.index_offset
+                ][:num_max]
+
+            response = ln.ListInvoiceResponse(invoices=invoices)
+        if invoices:
+            response.first_index_offset = invoices[0].add_index
+            response.last_index_offset = invoices[-1].add_index
+        return response
+
+    def AddInvoice(self, request, context):
+        data = self._data(context)
+        with self.node.lock:
+            invoice = data.add_invoice(self.node.rng, request.memo,
+                                       request.value)
+        self.node.events.append(("invoice", invoice))
+        return ln.AddInvoiceResponse(
+            r_hash=invoice.r_hash,
+            payment_request=invoice.payment_request,
+            add_index=invoice.add_index)
+
+    def DecodePayReq(self, request, context):
+        self._data(context)
+        decoded = _decode_payment_request(request.pay_req)
+        if decoded is None:
+            context.abort(grpc.StatusCode.UNKNOWN,
+                          "invalid payment request")
+        value, payment_hash = decoded
+        return ln.PayReq(
+            destination=self.node.data.identity_pubkey,
+            payment_hash=payment_hash,
+            num_satoshis=value,
+            timestamp=int(time.time()),
+            expiry=3600,
+            cltv_expiry=144)
+
+    def SendPaymentSync(self, request, context):
+        data = self._data(context)
+        decoded = _decode_payment_request(request.payment_request)
+        if decoded is None:
+            return ln.SendResponse(payment_error="invalid payment request")
+
+        value, payment_hash = decoded
+        preimage = hashlib.sha256(payment_hash.encode()).digest()
+        with self.node.lock:
+            data.payments.append(
+                ln.Payment(
+                    payment_hash=payment_hash,
+                    value=value,
+                    value_sat=value,
+                    value_msat=value * 1000,
+                    creation_date=int(time.time()),
+                    payment_preimage=preimage.hex()))
+        return ln.SendResponse(
+            payment_preimage=preimage,
+            payment_hash=bytes.fromhex(payment_hash),
+            payment_route=ln.Route(total_amt=value))
+
+    def NewAddress(self, request, context):
+        data = self._data(context)
+        with self.node.lock:
+            data.next_address += 1
+            index = data.next_address
+        prefix = "tb1q" if request.type == ln.WITNESS_PUBKEY_HASH else "2N"
+        return ln.NewAddressResponse(address="{}{}{:08x}".format(
+            prefix, data.identity_pubkey[2:30], index))
+
+    def ConnectPeer(self, request, context):
+        data = self._data(context)
+        with self.node.lock:
+            if any(peer.pub_key == request.addr.pubkey
+                   for peer in data.peers):
+                context.abort(
+                    grpc.StatusCode.UNKNOWN, "already connected to peer: "
+                    "{}@{}".format(request.addr.pubkey, request.addr.host))
+            data.peers.append(
+                ln.Peer(pub_key=request.addr.pubkey,
+                        address=request.addr.host))
+        return ln.ConnectPeerResponse()
+
+    def DisconnectPeer(self, request, context):
+        data = self._data(context)
+        with self.node.lock:
+            peers = [p for p in data.peers if p.pub_key != request.pub_key]
+            if len(peers) == len(data.peers):
+                context.abort(grpc.StatusCode.UNKNOWN,
+                              "peer {} is not connected".format(
+                                  request.pub_key))
+            data.peers = peers
+        return ln.DisconnectPeerResponse()
+
+    def StopDaemon(self, request, context):
+        self._data(context)
+        # stop after the response has been sent
+        threading.Thread(target=self.node.stop, args=(1, )).start()
+        return ln.StopResponse()
+
+    def SubscribeInvoices(self, request, context):
+        self._data(context)
+        return self.node.events.follow(context, "invoice")
+
+    def SubscribeTransactions(self, request, context):
+        self._data(context)
+        return self.node.events.follow(context, "transaction")
+
+
+class FakeWalletUnlocker(lnrpc.WalletUnlockerServicer):
+    """Serves the WalletUnlocker service while the wallet is locked"""
+
+    def __init__(self, node: "FakeLnd"):
+        self.node = node
+
+    def _check_locked(self, context):
+        if not self.node.locked:
+            context.abort(grpc.StatusCode.UNIMPLEMENTED,
+                          "unknown service lnrpc.WalletUnlocker")
+
+    def GenSeed(self, request, context):
+        self._check_locked(context)
+        with self.node.lock:
+            mnemonic = [
+                self.node.rng.choice(_WORDS) for _ in range(24)
+            ]
+        return ln.GenSeedResponse(
+            cipher_seed_mnemonic=mnemonic,
+            enciphered_seed=hashlib.sha256(" ".join(mnemonic).encode())
+            .digest())
+
+    def InitWallet(self, request, context):
+        self._check_locked(context)
+        self.node.unlock(request.wallet_password)
+        return ln.InitWalletResponse()
+
+    def UnlockWallet(self, request, context):
+        self._check_locked(context)
+        if not self.node.unlock(request.wallet_password):
+            context.abort(grpc.StatusCode.UNKNOWN, "invalid passphrase")
+        return ln.UnlockWalletResponse()
+
+
+def _wrap_handler(handler, behaviour):
+    """Returns the handler with behaviour(request, context) in front
+    of its unary-unary or unary-stream implementation"""
+    if handler is None or handler.request_streaming:
+        return handler
+
+    if handler.response_streaming:
+
+        def unary_stream(request, context):
+            behaviour(request, context)
+            return handler.unary_stream(request, context)
+
+        return grpc.unary_stream_rpc_method_handler(
+            unary_stream,
+            request_deserializer=handler.request_deserializer,
+            response_serializer=handler.response_serializer)
+
+    def unary_unary(request, context):
+        behaviour(request, context)
+        return handler.unary_unary(request, context)
+
+    return grpc.unary_unary_rpc_method_handler(
+        unary_unary,
+        request_deserializer=handler.request_deserializer,
+        response_serializer=handler.response_serializer)
+
+
+class _FakeLndInterceptor(grpc.ServerInterceptor):
+    """Checks the macaroon and injects latency and errors"""
+
+    def __init__(self, node: "FakeLnd"):
+        self.node = node
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        service, _, method = handler_call_details.method[1:].partition("/")
+        metadata = dict(handler_call_details.invocation_metadata)
+
+        def behaviour(request, context):
+            # like LND the unlocker service works without macaroon
+            if service == "lnrpc.Lightning" and not self.node.locked and \
+                    metadata.get("macaroon") != self.node.macaroon_hex:
+                context.abort(grpc.StatusCode.UNAUTHENTICATED,
+                              "verification failed: invalid macaroon")
+            self.node.inject(method, context)
+
+        return _wrap_handler(handler, behaviour)
+
+
+def write_tls_cert(cert_path: str, key_path: str, host: str = "localhost"):
+    """Writes a self signed certificate for the host unless the
+    certificate exists already"""
+    if os.path.exists(cert_path) and os.path.exists(key_path):
+        return
+
+    alt_names = ["DNS:localhost", "IP:127.0.0.1", "IP:::1"]
+    if host not in ("localhost", "127.0.0.1", "::1"):
+        kind = "IP" if host.replace(".", "").isdigit() or ":" in host \
+            else "DNS"
+        alt_names.append("{}:{}".format(kind, host))
+
+    subprocess.check_output(
+        [
+            "openssl", "req", "-x509", "-nodes", "-newkey", "ec",
+            "-pkeyopt", "ec_paramgen_curve:prime256v1", "-days", "365",
+            "-subj", "/O=fake lnd/CN={}".format(host), "-addext",
+            "subjectAltName={}".format(",".join(alt_names)), "-keyout",
+            key_path, "-out", cert_path
+        ],
+        stderr=subprocess.STDOUT)
+
+
+class FakeLnd():
+    """A fake LND daemon
+
+    data_dir: where the TLS certificate and the macaroon are written,
+              the layout is the same as LND's: tls.cert, tls.key and
+              admin.macaroon
+    port: the RPC port, 0 picks a free one
+    """
+
+    def __init__(self,
+                 data_dir: str,
+                 port: int = 0,
+                 host: str = "localhost",
+                 options: FakeLndOptions = FakeLndOptions()):
+        self.data_dir = data_dir
+        self.host = host
+        self.options = options
+        self.port = port
+        self.tls_cert_path = os.path.join(data_dir, "tls.cert")
+        self.tls_key_path = os.path.join(data_dir, "tls.key")
+        self.admin_macaroon_path = os.path.join(data_dir, "admin.macaroon")
+
+        self.lock = threading.Lock()
+        self.rng = random.Random(options.seed)
+        self.data = FakeLndData(options)
+        self.events = _EventLog()
+        self.locked = options.locked
+        self.macaroon_hex = None
+        self.calls = collections.Counter()
+
+        self._server = None
+        self._stopped = threading.Event()
+
+    def start(self) -> int:
+        """Starts serving and returns the port"""
+        os.makedirs(self.data_dir, exist_ok=True)
+        write_tls_cert(self.tls_cert_path, self.tls_key_path, self.host)
+
+        if not os.path.exists(self.admin_macaroon_path):
+            with open(self.admin_macaroon_path, "wb") as macaroon_file:
+                macaroon_file.write(os.urandom(32))
+        with open(self.admin_macaroon_path, "rb") as macaroon_file:
+            # the API sends the macaroon hex encoded
+            self.macaroon_hex = codecs.encode(macaroon_file.read(),
+                                              "hex").decode()
+
+        with open(self.tls_key_path, "rb") as key_file, \
+                open(self.tls_cert_path, "rb") as cert_file:
+            credentials = grpc.ssl_server_credentials([(key_file.read(),
+                                                        cert_file.read())])
+
+        self._server = grpc.server(
+            ThreadPoolExecutor(
+                max_workers=self.options.max_workers,
+                thread_name_prefix="fake-lnd"),
+            interceptors=[_FakeLndInterceptor(self)])
+        lnrpc.add_LightningServicer_to_server(FakeLightning(self),
+                                              self._server)
+        lnrpc.add_WalletUnlockerServicer_to_server(
+            FakeWalletUnlocker(self), self._server)
+        self.port = self._server.add_secure_port(
+            "{}:{}".format(self.host, self.port), credentials)
+        self._server.start()
+        self._stopped.clear()
+
+        if self.options.event_interval > 0:
+            threading.Thread(
+                target=self._emit_events, name="fake-lnd-events",
+                daemon=True).start()
+
+        LOGGER.info("Fake LND listening on %s:%s", self.host, self.port)
+        return self.port
+
+    def stop(self, grace=None):
+        """Stops serving, running calls are cancelled after grace
+        seconds"""
+        self._stopped.set()
+        if self._server is not None:
+            self._server.stop(grace).wait()
+
+    def wait(self):
+        """Blocks until the server is stopped"""
+        self._stopped.wait()
+
+    def unlock(self, password: bytes) -> bool:
+        """Unlocks the wallet if the password matches"""
+        expected = self.options.password
+        if expected is not None and password != expected.encode():
+            return False
+        self.locked = False
+        return True
+
+    def inject(self, method: str, context):
+        """Delays the call and fails it at the configured rate"""
+        with self.lock:
+            self.calls[method] += 1
+            fail = self.rng.random() < self.options.error_rate
+
+        latency = (self.options.method_latency or {}).get(
+            method, self.options.latency)
+        if latency > 0:
+            time.sleep(latency)
+
+        if fail:
+            context.abort(
+                getattr(grpc.StatusCode, self.options.error_code),
+                "injected error")
+
+    def _emit_events(self):
+        while not self._stopped.wait(self.options.event_interval):
+            if self.locked:
+                continue
+
+            with self.lock:
+                data = self.data
+                pending = [i for i in data.invoices if not i.settled]
+                invoice = None
+                if pending:
+                    invoice = self.rng.choice(pending)
+                    data.settle(invoice, int(time.time()))
+                transaction = ln.Transaction(
+                    tx_hash=_hex(self.rng, 32),
+                    amount=self.rng.randrange(1000, 5000000),
+                    block_height=data.block_height,
+                    time_stamp=int(time.time()),
+                    dest_addresses=["2N" + _hex(self.rng, 16)])
+                data.transactions.append(transaction)
+
+            if invoice is not None:
+                self.events.append(("invoice", invoice))
+            self.events.append(("transaction", transaction))
@@ -0,0 +1,113 @@
+"""This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+Stops the daemons of idle wallets and wakes them up again.
+
+Every authenticated request and every subscription event counts
+as activity of the user's wallet. The LND supervisor stops the
+daemons of wallets which have been idle for longer than
+LND_HIBERNATION["IDLE_TIMEOUT"]. The next activity of the owner
+starts the daemon again.
+"""
+import datetime
+import logging
+
+import grpc
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from backend.lnd.models import LNDWallet
+from backend.lnd.ports import get_port_allocation, is_local_host
+from backend.lnd.rpc import ln, lnrpc
+from backend.lnd.utils import (LNDWalletConfig, build_grpc_channel_manual,
+                               build_lnd_wallet_config,
+                               lnd_instance_is_running, rpc_deadline,
+                               spawn_lnd_process)
+
+LOGGER = logging.getLogger(__name__)
+
+
+def hibernation_setting(name: str):
+    """Returns the value of the given LND_HIBERNATION setting"""
+    return settings.LND_HIBERNATION[name]
+
+
+def record_activity(user):
+    """Marks the wallets of the user as active and wakes them up
+
+    To keep the number of database writes low, the activity
+    of a user is stored at most once per ACTIVITY_RESOLUTION.
+    """
+    if not user.is_authenticated:
+        return
+
+    key = "lnd_activity_{}".format(user.pk)
+    if not cache.add(key, True, hibernation_setting("ACTIVITY_RESOLUTION")):
+        return
+
+    LNDWallet.objects.filter(owner=user).update(last_activity=timezone.now())
+    for wallet in LNDWallet.objects.filter(owner=user, hibernated=True):
+        wake_wallet(wallet)
+
+
+def wake_wallet(wallet: LNDWallet):
+    """Starts the daemon of a hibernated wallet
+
+    Daemons on this host are started right away, daemons on other
+    hosts are started by the supervisor of their host. Just like
+    after a reboot, the owner has to unlock the wallet again.
+    """
+    # only the first of several concurrent requests wakes the wallet
+    woken = LNDWallet.objects.filter(
+        pk=wallet.pk, hibernated=True).update(hibernated=False)
+    if not woken:
+        return
+
+    LOGGER.info("Waking up wallet %s", wallet.pk)
+    if not is_local_host(get_port_allocation(wallet.pk).host):
+        return
+
+    if not lnd_instance_is_running(build_lnd_wallet_config(wallet.pk)):
+        spawn_lnd_process(wallet.autopilot, wallet)
+
+
+def idle_wallets(wallets):
+    """Filters the given wallets QuerySet for idle, running wallets"""
+    if hibernation_setting("IDLE_TIMEOUT") is None:
+        return wallets.none()
+
+    cutoff = timezone.now() - datetime.timedelta(
+        seconds=hibernation_setting("IDLE_TIMEOUT"))
+    return wallets.filter(
+        last_activity__lt=cutoff, hibernated=False, stopped_by_owner=False)
+
+
+def stop_daemon(cfg: LNDWalletConfig) -> bool:
+    """Asks the daemon to shut down gracefully
+
+    Returns:
+        False if the daemon could not be reached or is still locked
+    """
+    channel_data = build_grpc_channel_manual(
+        rpc_server=cfg.rpc_server,
+        rpc_port=cfg.rpc_listen_port_ipv4,
+        cert_path=cfg.tls_cert_path,
+        macaroon_path=cfg.admin_macaroon_path)
+
+    if channel_data.error is not None:
+        return False
+
+    stub = lnrpc.LightningStub(channel_data.channel)
+    try:
+        stub.StopDaemon(
+            ln.StopRequest(),
+            metadata=[('macaroon', channel_data.macaroon)],
+            timeout=rpc_deadline("StopDaemon"))
+    except grpc.RpcError as exc:
+        # pylint: disable=E1101
+        LOGGER.info("StopDaemon failed: %s", exc.details())
+        return False
+
+    return True
@@ -5,15 +5,14 @@ import graphene
 from google.protobuf.json_format import MessageToJson
 from grpc import RpcError
 
-import backend.lnd.rpc_pb2 as ln
-import backend.lnd.rpc_pb2_grpc as lnrpc
 from backend.error_responses import (ServerError, Unauthenticated,
                                      WalletInstanceNotFound,
                                      WalletInstanceNotRunning)
-from backend.lnd.models import LNDWallet
+from backend.lnd.rpc import ln, rpc_description
+from backend.lnd.rpc_client import lnd_client
 from backend.lnd.types import LnAddInvoiceResponse
 from backend.lnd.utils import (build_grpc_channel_manual,
-                               build_lnd_wallet_config, process_lnd_doc_string)
+                               build_lnd_wallet_config, get_user_wallet)
 
 
 class AddInvoiceSuccess(graphene.ObjectType):
@@ -47,24 +46,24 @@ class AddInvoiceMutation(graphene.Mutation):
     @staticmethod
     def description():
         """Returns the description for this mutation. 
-        The String is fetched directly from the lnd grpc package
+        The String is taken from the docs of the lnd grpc package,
+        see backend.lnd.rpc_descriptions
         """
-        return process_lnd_doc_string(
-            lnrpc.LightningServicer.AddInvoice.__doc__)
+        return rpc_description("Lightning.AddInvoice")
 
     def mutate(self, info, value, memo: str = ""):
         if not info.context.user.is_authenticated:
             return AddInvoiceMutation(result=Unauthenticated())
 
-        res = LNDWallet.objects.filter(owner=info.context.user)
+        wallet = get_user_wallet(info.context)
 
-        if not res:
+        if wallet is None:
             return AddInvoiceMutation(result=WalletInstanceNotFound())
 
-        cfg = build_lnd_wallet_config(res.first().pk)
+        cfg = build_lnd_wallet_config(wallet.pk)
 
         channel_data = build_grpc_channel_manual(
-            rpc_server="127.0.0.1",
+            rpc_server=cfg.rpc_server,
             rpc_port=cfg.rpc_listen_port_ipv4,
             cert_path=cfg.tls_cert_path,
             macaroon_path=cfg.admin_macaroon_path,
@@ -72,7 +71,7 @@ class AddInvoiceMutation(graphene.Mutation):
         if channel_data.error is not None:
             return AddInvoiceMutation(result=channel_data.error)
 
-        stub = lnrpc.LightningStub(channel_data.channel)
+        client = lnd_client(info.context, wallet.pk, channel_data)
         request = ln.Invoice(
             value=value,
             memo=memo,
@@ -80,8 +79,7 @@ class AddInvoiceMutation(graphene.Mutation):
         )
 
         try:
-            response = stub.AddInvoice(
-                request, metadata=[('macaroon', channel_data.macaroon)])
+            response = client.call("AddInvoice", request)
         except RpcError as exc:
             # pylint: disable=E1101
             print(exc)
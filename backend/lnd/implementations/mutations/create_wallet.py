@@ -1,14 +1,14 @@
 """Implementation for the create wallet mutation"""
 import collections
-import os
-import subprocess
 
 import graphene
 
 from backend.error_responses import Unauthenticated
 from backend.lnd import models
+from backend.lnd.placement import place_wallet
+from backend.lnd.ports import PortAllocationError, is_local_host
 from backend.lnd.types import WalletType
-from backend.lnd.utils import build_lnd_startup_args
+from backend.lnd.utils import spawn_lnd_process
 
 CreateWalletMutationData = collections.namedtuple('CreateWalletMutationData',
                                                   ['lnd_wallet', 'status'])
@@ -22,9 +22,15 @@ class CreateWalletExistsError(graphene.ObjectType):
     error_message = graphene.String(default_value="Max wallet limit reached")
 
 
+class CreateWalletNoCapacityError(graphene.ObjectType):
+    error_message = graphene.String(
+        default_value="The server can't host any more wallets")
+
+
 class CreateWalletPayload(graphene.Union):
     class Meta:
-        types = (Unauthenticated, CreateWalletExistsError, CreateWalletSuccess)
+        types = (Unauthenticated, CreateWalletExistsError,
+                 CreateWalletNoCapacityError, CreateWalletSuccess)
 
 
 class CreateLightningWalletMutation(graphene.Mutation):
@@ -77,17 +83,18 @@ def create_wallet_mutation(autopilot: bool, name: str, public_alias: str,
     wallet.name = name
     wallet.testnet = True
     wallet.initialized = False
+    wallet.autopilot = autopilot
     wallet.save()
 
-    args = build_lnd_startup_args(autopilot, wallet)
-
-    if not os.path.exists(args["data_dir"]):
-        os.makedirs(args["data_dir"])
+    try:
+        allocation = place_wallet(wallet)
+    except PortAllocationError:
+        wallet.delete()
+        return CreateWalletNoCapacityError()
 
-    # Start LND instance
-    subprocess.Popen(
-        args["args"],
-        cwd=r'{}'.format(args["data_dir"]),
-        preexec_fn=os.setpgrp)
+    # Start LND instance. Daemons placed on another
+    # host are started by the supervisor of that host.
+    if is_local_host(allocation.host):
+        spawn_lnd_process(autopilot, wallet)
 
     return CreateWalletSuccess(wallet=wallet)
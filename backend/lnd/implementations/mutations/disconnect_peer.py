@@ -1,15 +1,13 @@
 import graphene
 import grpc
-from django.db.models import QuerySet
 
-import backend.lnd.rpc_pb2 as ln
-import backend.lnd.rpc_pb2_grpc as lnrpc
 from backend.error_responses import (ServerError, Unauthenticated,
                                      WalletInstanceNotFound,
                                      WalletInstanceNotRunning)
-from backend.lnd.models import LNDWallet
+from backend.lnd.rpc import ln, rpc_description
+from backend.lnd.rpc_client import lnd_client
 from backend.lnd.utils import (LNDWalletConfig, build_grpc_channel_manual,
-                               build_lnd_wallet_config, process_lnd_doc_string)
+                               build_lnd_wallet_config, get_user_wallet)
 
 
 class DisconnectPeerSuccess(graphene.ObjectType):
@@ -39,10 +37,10 @@ class DisconnectPeerMutation(graphene.Mutation):
     @staticmethod
     def description():
         """Returns the description for this mutation. 
-        The String is fetched directly from the lnd grpc package
+        The String is taken from the docs of the lnd grpc package,
+        see backend.lnd.rpc_descriptions
         """
-        return process_lnd_doc_string(
-            lnrpc.LightningServicer.DisconnectPeer.__doc__)
+        return rpc_description("Lightning.DisconnectPeer")
 
     Output = DisconnectPeerPayload
 
@@ -52,17 +50,15 @@ class DisconnectPeerMutation(graphene.Mutation):
         if not info.context.user.is_authenticated:
             return Unauthenticated()
 
-        res: QuerySet = LNDWallet.objects.filter(owner=info.context.user)
+        wallet = get_user_wallet(info.context)
 
-        if not res:
+        if wallet is None:
             return WalletInstanceNotFound()
 
-        wallet: LNDWallet = res.first()
-
         cfg: LNDWalletConfig = build_lnd_wallet_config(wallet.pk)
 
         channel_data = build_grpc_channel_manual(
-            rpc_server="127.0.0.1",
+            rpc_server=cfg.rpc_server,
             rpc_port=cfg.rpc_listen_port_ipv4,
             cert_path=cfg.tls_cert_path,
             macaroon_path=cfg.admin_macaroon_path,
@@ -71,11 +67,10 @@ class DisconnectPeerMutation(graphene.Mutation):
         if channel_data.error is not None:
             return channel_data.error
 
-        stub = lnrpc.LightningStub(channel_data.channel)
+        client = lnd_client(info.context, wallet.pk, channel_data)
         request = ln.DisconnectPeerRequest(pub_key=pubkey)
         try:
-            stub.DisconnectPeer(
-                request, metadata=[('macaroon', channel_data.macaroon)])
+            client.call("DisconnectPeer", request)
         except grpc.RpcError as exc:
             # pylint: disable=E1101
             print(exc)
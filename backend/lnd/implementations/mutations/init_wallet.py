@@ -1,18 +1,17 @@
 """Implementation for the init wallet mutation"""
 import json
-import pathlib
-import time
 
 import graphene
 import grpc
-from django.db.models import QuerySet
+from django.conf import settings
 
-import backend.lnd.rpc_pb2 as ln
-import backend.lnd.rpc_pb2_grpc as lnrpc
 from backend.error_responses import ServerError, Unauthenticated
 from backend.lnd.models import LNDWallet
+from backend.lnd.readiness import wait_for_file
+from backend.lnd.rpc import ln, lnrpc, rpc_description
+from backend.lnd.rpc_client import lnd_client
 from backend.lnd.utils import (build_grpc_channel_manual,
-                               build_lnd_wallet_config, process_lnd_doc_string)
+                               build_lnd_wallet_config, get_user_wallet)
 
 
 class InitWalletSuccess(graphene.ObjectType):
@@ -76,10 +75,10 @@ class InitWalletMutation(graphene.Mutation):
     @staticmethod
     def description():
         """Returns the description for this mutation. 
-        The String is fetched directly from the lnd grpc package
+        The String is taken from the docs of the lnd grpc package,
+        see backend.lnd.rpc_descriptions
         """
-        return process_lnd_doc_string(
-            lnrpc.WalletUnlockerServicer.InitWallet.__doc__)
+        return rpc_description("WalletUnlocker.InitWallet")
 
     def mutate(self,
                info,
@@ -95,16 +94,15 @@ class InitWalletMutation(graphene.Mutation):
         if len(wallet_password) < 8:
             return InitWalletPasswordToShortError()
 
-        res: QuerySet = LNDWallet.objects.filter(owner=info.context.user)
+        wallet = get_user_wallet(info.context)
 
-        if not res:
+        if wallet is None:
             return InitWalletInstanceNotFound()
 
-        wallet: LNDWallet = res.first()
         if wallet.initialized:
             return InitWalletIsInitialized()
 
-        res = init_wallet_mutation(wallet, wallet_password,
+        res = init_wallet_mutation(info, wallet, wallet_password,
                                    cipher_seed_mnemonic, aezeed_passphrase,
                                    recovery_window)
 
@@ -115,13 +113,13 @@ class InitWalletMutation(graphene.Mutation):
         return res
 
 
-def init_wallet_mutation(wallet: LNDWallet, wallet_password: str,
+def init_wallet_mutation(info, wallet: LNDWallet, wallet_password: str,
                          cipher_seed_mnemonic: [], aezeed_passphrase: str,
                          recovery_window: int):
     cfg = build_lnd_wallet_config(wallet.pk)
 
     channel_data = build_grpc_channel_manual(
-        rpc_server="127.0.0.1",
+        rpc_server=cfg.rpc_server,
         rpc_port=cfg.rpc_listen_port_ipv4,
         cert_path=cfg.tls_cert_path,
     )
@@ -130,7 +128,7 @@ def init_wallet_mutation(wallet: LNDWallet, wallet_password: str,
         return channel_data.error
 
     # init wallet
-    stub = lnrpc.WalletUnlockerStub(channel_data.channel)
+    client = lnd_client(info.context, wallet.pk, channel_data)
     request = ln.InitWalletRequest(
         wallet_password=wallet_password.encode(),
         cipher_seed_mnemonic=cipher_seed_mnemonic,
@@ -138,21 +136,19 @@ def init_wallet_mutation(wallet: LNDWallet, wallet_password: str,
         if aezeed_passphrase is not None else None,
         recovery_window=recovery_window)
     try:
-        response = stub.InitWallet(
-            request, metadata=[('macaroon', channel_data.macaroon)])
-
-        # LND requires some time seconds to startup.
-        # So, check until the macaroon files exist and then return
-        # TODO: find a better solution to this
-        file = pathlib.Path(cfg.admin_macaroon_path)
-        while 1:
-            if file.is_file():
-                break
-            time.sleep(2)
-        time.sleep(5)
+        response = client.call(
+            "InitWallet", request, stub=lnrpc.WalletUnlockerStub)
     except grpc.RpcError as exc:
         # pylint: disable=E1101
         print(exc)
         return ServerError.generic_rpc_error(exc.code(), exc.details())
 
+    # LND creates the macaroons once the wallet is
+    # initialized and then starts the Lightning service
+    timeout = settings.LND_STARTUP["TIMEOUT"]
+    if not wait_for_file(cfg.admin_macaroon_path, timeout):
+        return InitWalletError(
+            error_message="LND did not create the macaroons within {} seconds"
+            .format(timeout))
+
     return InitWalletSuccess(status="OK")
@@ -1,22 +1,23 @@
 """Implementation of the start daemon query"""
 import json
-import os
-import subprocess
 import time
 
 import graphene
 import grpc
-from django.db.models import QuerySet
+from django.conf import settings
 from google.protobuf.json_format import MessageToJson
 
-import backend.lnd.rpc_pb2 as ln
-import backend.lnd.rpc_pb2_grpc as lnrpc
 from backend.error_responses import ServerError, Unauthenticated
 from backend.lnd.models import LNDWallet
+from backend.lnd.ports import is_local_host
+from backend.lnd.readiness import POLL_INTERVAL, wait_for_file, wait_for_port
+from backend.lnd.rpc import ln, lnrpc
+from backend.lnd.rpc_client import lnd_client
 from backend.lnd.types import LnInfoType
 from backend.lnd.utils import (build_grpc_channel_manual,
-                               build_lnd_startup_args, build_lnd_wallet_config,
-                               lnd_instance_is_running)
+                               build_lnd_wallet_config, get_user_wallet,
+                               lnd_instance_is_running, lnd_wallet_is_locked,
+                               spawn_lnd_process)
 
 
 class StartDaemonSuccess(graphene.ObjectType):
@@ -82,47 +83,72 @@ class StartDaemonMutation(graphene.Mutation):
         if not info.context.user.is_authenticated:
             return Unauthenticated()
 
-        res: QuerySet = LNDWallet.objects.filter(owner=info.context.user)
+        wallet = get_user_wallet(info.context)
 
-        if not res:
+        if wallet is None:
             return StartDaemonInstanceNotFound()
 
-        wallet: LNDWallet = res.first()
-
         return start_daemon_mutation(
+            info,
             wallet,
             autopilot,
             wallet_password,
         )
 
 
-def start_daemon_mutation(wallet: LNDWallet,
+def start_daemon_mutation(info,
+                          wallet: LNDWallet,
                           autopilot: bool,
                           wallet_password: str,
                           recovery_window: int = 0) -> LnInfoType:
     cfg = build_lnd_wallet_config(wallet.pk)
 
     if lnd_instance_is_running(cfg):
-        return StartDaemonInstanceIsAlreadyRunning()
-
-    try:
-        args = build_lnd_startup_args(autopilot, wallet)
-        # Start LND instance
-        subprocess.Popen(
-            args["args"],
-            cwd=r'{}'.format(args["data_dir"]),
-            preexec_fn=os.setpgrp)
-
-        time.sleep(2)
-    except grpc.RpcError as exc:
-        # pylint: disable=E1101
-        print(exc)
-        return ServerError.generic_rpc_error(exc.code(), exc.details())
+        # The supervisor (re)starts daemons without unlocking them.
+        # Only a daemon which is already unlocked is really running.
+        if not lnd_wallet_is_locked(cfg):
+            return StartDaemonInstanceIsAlreadyRunning()
+    elif is_local_host(cfg.rpc_server):
+        # daemons restarted by the supervisor keep the autopilot setting
+        if wallet.autopilot != autopilot:
+            wallet.autopilot = autopilot
+            wallet.save()
+        try:
+            # Start LND instance
+            spawn_lnd_process(autopilot, wallet)
+        except grpc.RpcError as exc:
+            # pylint: disable=E1101
+            print(exc)
+            return ServerError.generic_rpc_error(exc.code(), exc.details())
+    else:
+        # Daemons placed on another host are started by the
+        # supervisor of that host once the wallet may run again
+        wallet.autopilot = autopilot
+        wallet.stopped_by_owner = False
+        wallet.hibernated = False
+        wallet.save()
+
+    # A daemon which was just started or woken up needs a moment
+    # until it has created its TLS certificate and opened its RPC port
+    timeout = settings.LND_STARTUP["TIMEOUT"]
+    deadline = time.time() + timeout
+    if not wait_for_file(cfg.tls_cert_path, timeout) or not wait_for_port(
+            cfg.rpc_listen_port_ipv4,
+            deadline - time.time(),
+            host=cfg.rpc_server):
+        return StartDaemonError(
+            error_message="LND did not start within {} seconds".format(
+                timeout))
+
+    if wallet.stopped_by_owner or wallet.hibernated:
+        wallet.stopped_by_owner = False
+        wallet.hibernated = False
+        wallet.save()
 
     # build the channel to the newly started daemon
 
     channel_data = build_grpc_channel_manual(
-        rpc_server="127.0.0.1",
+        rpc_server=cfg.rpc_server,
         rpc_port=cfg.rpc_listen_port_ipv4,
         cert_path=cfg.tls_cert_path,
         macaroon_path=cfg.admin_macaroon_path)
@@ -130,20 +156,18 @@ def start_daemon_mutation(wallet: LNDWallet,
     if channel_data.error is not None:
         return channel_data.error
 
-    # unlock the wallet
-    stub = lnrpc.WalletUnlockerStub(channel_data.channel)
+    # unlock the wallet. The daemon was just started, so earlier
+    # failures must not trip the circuit breaker of the wallet.
+    client = lnd_client(
+        info.context, wallet.pk, channel_data, breaker=False)
     request = ln.UnlockWalletRequest(
         wallet_password=wallet_password.encode(),
         recovery_window=recovery_window)
-    stub.UnlockWallet(request)
-
-    # LND requires a few seconds after unlocking until
-    # it's fully operational
-    time.sleep(5)
+    client.call("UnlockWallet", request, stub=lnrpc.WalletUnlockerStub)
 
     # Unlocking the wallet requires a rebuild of the channel
     channel_data = build_grpc_channel_manual(
-        rpc_server="127.0.0.1",
+        rpc_server=cfg.rpc_server,
         rpc_port=cfg.rpc_listen_port_ipv4,
         cert_path=cfg.tls_cert_path,
         macaroon_path=cfg.admin_macaroon_path,
@@ -152,17 +176,26 @@ def start_daemon_mutation(wallet: LNDWallet,
     if channel_data.error is not None:
         return channel_data.error
 
-    # get the latest info
-    stub = lnrpc.LightningStub(channel_data.channel)
+    # get the latest info. LND needs a moment after unlocking until
+    # it serves the Lightning service, retry until the deadline.
+    client = lnd_client(
+        info.context, wallet.pk, channel_data, breaker=False)
     request = ln.GetInfoRequest()
-
-    try:
-        response = stub.GetInfo(
-            request, metadata=[('macaroon', channel_data.macaroon)])
-    except grpc.RpcError as exc:
-        # pylint: disable=E1101
-        print(exc)
-        return ServerError.generic_rpc_error(exc.code(), exc.details())
+    deadline = time.time() + settings.LND_STARTUP["UNLOCK_TIMEOUT"]
+
+    while True:
+        try:
+            response = client.call("GetInfo", request)
+            break
+        except grpc.RpcError as exc:
+            # pylint: disable=E1101
+            starting = exc.code() in (grpc.StatusCode.UNIMPLEMENTED,
+                                      grpc.StatusCode.UNAVAILABLE)
+            if not starting or time.time() >= deadline:
+                print(exc)
+                return ServerError.generic_rpc_error(exc.code(),
+                                                     exc.details())
+        time.sleep(POLL_INTERVAL)
 
     json_data = json.loads(
         MessageToJson(
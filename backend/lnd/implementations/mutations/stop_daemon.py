@@ -3,18 +3,16 @@ import time
 
 import graphene
 import grpc
-from django.db.models import QuerySet
 
-import backend.lnd.rpc_pb2 as ln
-import backend.lnd.rpc_pb2_grpc as lnrpc
 from backend.error_responses import (ServerError, Unauthenticated,
                                      WalletInstanceNotFound,
                                      WalletInstanceNotRunning)
-from backend.lnd.models import LNDWallet
+from backend.lnd.rpc import ln, rpc_description
+from backend.lnd.rpc_client import lnd_client
 from backend.lnd.types import LnInfoType
 from backend.lnd.utils import (LNDWalletConfig, build_grpc_channel_manual,
-                               build_lnd_wallet_config,
-                               lnd_instance_is_running, process_lnd_doc_string)
+                               build_lnd_wallet_config, get_user_wallet,
+                               lnd_instance_is_running)
 
 
 class StopDaemonSuccess(graphene.ObjectType):
@@ -37,10 +35,10 @@ class StopDaemonMutation(graphene.Mutation):
     @staticmethod
     def description():
         """Returns the description for this mutation. 
-        The String is fetched directly from the lnd grpc package
+        The String is taken from the docs of the lnd grpc package,
+        see backend.lnd.rpc_descriptions
         """
-        return process_lnd_doc_string(
-            lnrpc.LightningServicer.StopDaemon.__doc__)
+        return rpc_description("Lightning.StopDaemon")
 
     def mutate(
             self,
@@ -51,17 +49,15 @@ class StopDaemonMutation(graphene.Mutation):
         if not info.context.user.is_authenticated:
             return Unauthenticated()
 
-        res: QuerySet = LNDWallet.objects.filter(owner=info.context.user)
+        wallet = get_user_wallet(info.context)
 
-        if not res:
+        if wallet is None:
             return WalletInstanceNotFound()
 
-        wallet: LNDWallet = res.first()
-
         cfg: LNDWalletConfig = build_lnd_wallet_config(wallet.pk)
 
         channel_data = build_grpc_channel_manual(
-            rpc_server="127.0.0.1",
+            rpc_server=cfg.rpc_server,
             rpc_port=cfg.rpc_listen_port_ipv4,
             cert_path=cfg.tls_cert_path,
             macaroon_path=cfg.admin_macaroon_path,
@@ -70,15 +66,20 @@ class StopDaemonMutation(graphene.Mutation):
         if channel_data.error is not None:
             return channel_data.error
 
+        # tell the supervisor that this daemon must not be restarted
+        wallet.stopped_by_owner = True
+        wallet.save()
+
         # stop daemon
-        stub = lnrpc.LightningStub(channel_data.channel)
+        client = lnd_client(info.context, wallet.pk, channel_data)
         request = ln.StopRequest()
         try:
-            response = stub.StopDaemon(
-                request, metadata=[('macaroon', channel_data.macaroon)])
+            response = client.call("StopDaemon", request)
         except grpc.RpcError as exc:
             # pylint: disable=E1101
             print(exc)
+            wallet.stopped_by_owner = False
+            wallet.save()
             return ServerError.generic_rpc_error(exc.code(), exc.details())
 
         start = time.time()
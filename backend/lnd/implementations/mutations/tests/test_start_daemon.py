@@ -8,8 +8,10 @@ import backend
 from backend.error_responses import Unauthenticated
 from backend.lnd.implementations import StartDaemonMutation
 from backend.lnd.implementations.mutations.start_daemon import (
-    StartDaemonInstanceIsAlreadyRunning, StartDaemonInstanceNotFound)
+    StartDaemonError, StartDaemonInstanceIsAlreadyRunning,
+    StartDaemonInstanceNotFound)
 from backend.lnd.models import LNDWallet
+from backend.lnd.ports import allocate_ports
 from backend.lnd.utils import ChannelData
 from backend.test_utils import utils
 
@@ -18,11 +20,10 @@ pytestmark = pytest.mark.django_db
 
 
 def test_start_daemon(monkeypatch: MonkeyPatch):
-    # patch the Popen function to avoid starting a
+    # patch the spawn function to avoid starting a
     # new LND instance everytime the test runs
-    monkeypatch.setattr(
-        backend.lnd.implementations.mutations.start_daemon.subprocess, "Popen",
-        lambda *args, **kwargs: None)
+    monkeypatch.setattr(backend.lnd.implementations.mutations.start_daemon,
+                        "spawn_lnd_process", lambda *args, **kwargs: None)
 
     channel_data = ChannelData(
         channel=object(), macaroon="macaroon_data".encode(), error=None)
@@ -68,3 +69,36 @@ def test_start_daemon(monkeypatch: MonkeyPatch):
     # For the rest of the test we'll assume the wallet is not running
     monkeypatch.setattr(backend.lnd.implementations.mutations.start_daemon,
                         "lnd_instance_is_running", lambda cfg: False)
+
+
+def test_start_daemon_on_other_host(monkeypatch: MonkeyPatch, settings):
+    start_daemon = backend.lnd.implementations.mutations.start_daemon
+    spawned = []
+    monkeypatch.setattr(start_daemon, "spawn_lnd_process",
+                        lambda *args: spawned.append(args))
+    monkeypatch.setattr(start_daemon, "lnd_instance_is_running",
+                        lambda cfg: False)
+    waited = []
+
+    def wait_for_port(port, timeout, host):
+        waited.append(host)
+        return False
+
+    monkeypatch.setattr(start_daemon, "wait_for_file", lambda *args: True)
+    monkeypatch.setattr(start_daemon, "wait_for_port", wait_for_port)
+
+    req = RequestFactory().get("/")
+    req.user = mixer.blend("auth.User")
+    wallet = mixer.blend(
+        LNDWallet, owner=req.user, stopped_by_owner=True, autopilot=False)
+    allocate_ports(wallet, hosts=["10.0.0.2"])
+
+    ret = StartDaemonMutation().mutate(
+        utils.mock_resolve_info(req), True, "secure_pw", 0)
+
+    assert isinstance(ret, StartDaemonError)
+    assert spawned == [], "Should leave the start to the supervisor"
+    assert waited == ["10.0.0.2"]
+    wallet.refresh_from_db()
+    assert not wallet.stopped_by_owner
+    assert wallet.autopilot
@@ -6,14 +6,14 @@ import graphene
 import grpc
 from google.protobuf.json_format import MessageToJson
 
-import backend.lnd.rpc_pb2 as ln
-import backend.lnd.rpc_pb2_grpc as lnrpc
 from backend.error_responses import (ServerError, Unauthenticated,
                                      WalletInstanceNotRunning)
 from backend.lnd.models import LNDWallet
+from backend.lnd.rpc import ln, lnrpc
+from backend.lnd.rpc_client import lnd_client
 from backend.lnd.types import LnGenSeedResponse
 from backend.lnd.utils import (build_grpc_channel_manual,
-                               build_lnd_wallet_config)
+                               build_lnd_wallet_config, get_user_wallet)
 
 
 class GenSeedWalletInstanceNotFound(graphene.ObjectType):
@@ -61,20 +61,22 @@ class GenSeedQuery(graphene.ObjectType):
         if not info.context.user.is_authenticated:
             return Unauthenticated()
 
-        res = LNDWallet.objects.filter(owner=info.context.user)
+        wallet = get_user_wallet(info.context)
 
-        if not res:
+        if wallet is None:
             return GenSeedWalletInstanceNotFound()
 
         # we currently only allow one wallet per user anyway,
         # so just get the first one
         return gen_seed_query(
-            res.first(),
+            info,
+            wallet,
             aezeed_passphrase=aezeed_passphrase,
             seed_entropy=seed_entropy)
 
 
 def gen_seed_query(
+        info,
         wallet: LNDWallet,
         aezeed_passphrase: str,
         seed_entropy: str,
@@ -82,7 +84,7 @@ def gen_seed_query(
     cfg = build_lnd_wallet_config(wallet.pk)
 
     channel_data = build_grpc_channel_manual(
-        rpc_server="127.0.0.1",
+        rpc_server=cfg.rpc_server,
         rpc_port=cfg.rpc_listen_port_ipv4,
         cert_path=cfg.tls_cert_path,
     )
@@ -90,11 +92,12 @@ def gen_seed_query(
     if channel_data.error is not None:
         return channel_data.error
 
-    stub = lnrpc.WalletUnlockerStub(channel_data.channel)
+    client = lnd_client(info.context, wallet.pk, channel_data)
     request = ln.GenSeedRequest(
         aezeed_passphrase=aezeed_passphrase, seed_entropy=seed_entropy)
     try:
-        response = stub.GenSeed(request)
+        response = client.call(
+            "GenSeed", request, stub=lnrpc.WalletUnlockerStub)
     except grpc.RpcError as exc:
         # pylint: disable=E1101
         print(exc)
@@ -4,15 +4,14 @@ import graphene
 import grpc
 from google.protobuf.json_format import MessageToJson
 
-import backend.lnd.rpc_pb2 as ln
-import backend.lnd.rpc_pb2_grpc as lnrpc
 from backend.error_responses import (ServerError, Unauthenticated,
                                      WalletInstanceNotFound,
                                      WalletInstanceNotRunning)
-from backend.lnd.models import LNDWallet
+from backend.lnd.rpc import ln
+from backend.lnd.rpc_client import lnd_client
 from backend.lnd.types import LnChannelBalance
 from backend.lnd.utils import (build_grpc_channel_manual,
-                               build_lnd_wallet_config)
+                               build_lnd_wallet_config, get_user_wallet)
 
 
 class GetChannelBalanceError(graphene.ObjectType):
@@ -44,27 +43,26 @@ class GetChannelBalanceQuery(graphene.ObjectType):
         if not info.context.user.is_authenticated:
             return Unauthenticated()
 
-        res = LNDWallet.objects.filter(owner=info.context.user)
+        wallet = get_user_wallet(info.context)
 
-        if not res:
+        if wallet is None:
             return WalletInstanceNotFound()
 
-        cfg = build_lnd_wallet_config(res.first().pk)
+        cfg = build_lnd_wallet_config(wallet.pk)
 
         channel_data = build_grpc_channel_manual(
-            rpc_server="127.0.0.1",
+            rpc_server=cfg.rpc_server,
             rpc_port=cfg.rpc_listen_port_ipv4,
             cert_path=cfg.tls_cert_path,
             macaroon_path=cfg.admin_macaroon_path)
         if channel_data.error is not None:
             return channel_data.error
 
-        stub = lnrpc.LightningStub(channel_data.channel)
+        client = lnd_client(info.context, wallet.pk, channel_data)
         request = ln.ChannelBalanceRequest()
 
         try:
-            response = stub.ChannelBalance(
-                request, metadata=[('macaroon', channel_data.macaroon)])
+            response = client.call("ChannelBalance", request)
         except grpc.RpcError as exc:
             # pylint: disable=E1101
             print(exc)
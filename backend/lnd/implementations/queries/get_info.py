@@ -5,15 +5,15 @@ import graphene
 import grpc
 from google.protobuf.json_format import MessageToJson
 
-import backend.lnd.rpc_pb2 as ln
-import backend.lnd.rpc_pb2_grpc as lnrpc
 from backend.error_responses import (ServerError, Unauthenticated,
                                      WalletInstanceNotFound,
                                      WalletInstanceNotRunning)
 from backend.lnd.models import IPAddress, LNDWallet
+from backend.lnd.rpc import ln
+from backend.lnd.rpc_client import lnd_client
 from backend.lnd.types import LnInfoType
 from backend.lnd.utils import (build_grpc_channel_manual,
-                               build_lnd_wallet_config)
+                               build_lnd_wallet_config, get_user_wallet)
 
 
 class GetInfoError(graphene.ObjectType):
@@ -41,19 +41,19 @@ class GetInfoQuery(graphene.ObjectType):
         if not info.context.user.is_authenticated:
             return Unauthenticated()
 
-        res = LNDWallet.objects.filter(owner=info.context.user)
+        wallet = get_user_wallet(info.context)
 
-        if not res:
+        if wallet is None:
             return WalletInstanceNotFound()
 
-        return get_info_query(res.first())
+        return get_info_query(info, wallet)
 
 
-def get_info_query(wallet: LNDWallet) -> LnInfoType:
+def get_info_query(info, wallet: LNDWallet) -> LnInfoType:
     cfg = build_lnd_wallet_config(wallet.pk)
 
     channel_data = build_grpc_channel_manual(
-        rpc_server="127.0.0.1",
+        rpc_server=cfg.rpc_server,
         rpc_port=cfg.rpc_listen_port_ipv4,
         cert_path=cfg.tls_cert_path,
         macaroon_path=cfg.admin_macaroon_path)
@@ -61,12 +61,11 @@ def get_info_query(wallet: LNDWallet) -> LnInfoType:
     if channel_data.error is not None:
         return channel_data.error
 
-    stub = lnrpc.LightningStub(channel_data.channel)
+    client = lnd_client(info.context, wallet.pk, channel_data)
     request = ln.GetInfoRequest()
 
     try:
-        response = stub.GetInfo(
-            request, metadata=[('macaroon', channel_data.macaroon)])
+        response = client.call("GetInfo", request)
     except grpc.RpcError as exc:
         # pylint: disable=E1101
         return ServerError.generic_rpc_error(exc.code(), exc.details())
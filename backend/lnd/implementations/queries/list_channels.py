@@ -4,15 +4,15 @@ import graphene
 import grpc
 from google.protobuf.json_format import MessageToJson
 
-import backend.lnd.rpc_pb2 as ln
-import backend.lnd.rpc_pb2_grpc as lnrpc
 from backend.error_responses import (ServerError, Unauthenticated,
                                      WalletInstanceNotFound,
                                      WalletInstanceNotRunning)
 from backend.lnd.models import LNDWallet
-from backend.lnd.types import LnChannel
+from backend.lnd.rpc import ln, rpc_description
+from backend.lnd.rpc_client import lnd_client
+from backend.lnd.types import LnChannel, LnChannelRow
 from backend.lnd.utils import (build_grpc_channel_manual,
-                               build_lnd_wallet_config, process_lnd_doc_string)
+                               build_lnd_wallet_config, get_user_wallet)
 
 
 class ListChannelsError(graphene.ObjectType):
@@ -33,26 +33,25 @@ class ListChannelsPayload(graphene.Union):
 class ListChannelsQuery(graphene.ObjectType):
     ln_list_channels = graphene.Field(
         ListChannelsPayload,
-        description=process_lnd_doc_string(
-            lnrpc.LightningServicer.ListChannels.__doc__))
+        description=rpc_description("Lightning.ListChannels"))
 
     def resolve_ln_list_channels(self, info, **kwargs):
         if not info.context.user.is_authenticated:
             return Unauthenticated()
 
-        res = LNDWallet.objects.filter(owner=info.context.user)
+        wallet = get_user_wallet(info.context)
 
-        if not res:
+        if wallet is None:
             return WalletInstanceNotFound()
 
-        return list_channels_query(res.first())
+        return list_channels_query(info, wallet)
 
 
-def list_channels_query(wallet: LNDWallet):
+def list_channels_query(info, wallet: LNDWallet):
     cfg = build_lnd_wallet_config(wallet.pk)
 
     channel_data = build_grpc_channel_manual(
-        rpc_server="127.0.0.1",
+        rpc_server=cfg.rpc_server,
         rpc_port=cfg.rpc_listen_port_ipv4,
         cert_path=cfg.tls_cert_path,
         macaroon_path=cfg.admin_macaroon_path)
@@ -60,12 +59,11 @@ def list_channels_query(wallet: LNDWallet):
     if channel_data.error is not None:
         return channel_data.error
 
-    stub = lnrpc.LightningStub(channel_data.channel)
+    client = lnd_client(info.context, wallet.pk, channel_data)
     request = ln.ListChannelsRequest()
 
     try:
-        response = stub.ListChannels(
-            request, metadata=[('macaroon', channel_data.macaroon)])
+        response = client.call("ListChannels", request)
     except grpc.RpcError as exc:
         print(exc)
         raise exc
@@ -76,7 +74,5 @@ def list_channels_query(wallet: LNDWallet):
             preserving_proto_field_name=True,
             including_default_value_fields=True,
         ))
-    channel_list = []
-    for c in json_data["channels"]:
-        channel_list.append(LnChannel(c))
-    return ListChannelsSuccess(channel_list)
+    return ListChannelsSuccess(
+        [LnChannelRow.from_dict(c) for c in json_data["channels"]])
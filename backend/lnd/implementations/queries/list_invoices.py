@@ -4,15 +4,14 @@ import graphene
 import grpc
 from google.protobuf.json_format import MessageToJson
 
-import backend.lnd.rpc_pb2 as ln
-import backend.lnd.rpc_pb2_grpc as lnrpc
 from backend.error_responses import (ServerError, Unauthenticated,
                                      WalletInstanceNotFound,
                                      WalletInstanceNotRunning)
-from backend.lnd.models import LNDWallet
-from backend.lnd.types import LnInvoice
+from backend.lnd.rpc import ln, rpc_description
+from backend.lnd.rpc_client import lnd_client
+from backend.lnd.types import LnInvoice, LnInvoiceRow
 from backend.lnd.utils import (build_grpc_channel_manual,
-                               build_lnd_wallet_config, process_lnd_doc_string)
+                               build_lnd_wallet_config, get_user_wallet)
 
 
 class ListInvoicesError(graphene.ObjectType):
@@ -22,12 +21,12 @@ class ListInvoicesError(graphene.ObjectType):
 class ListInvoicesSuccess(graphene.ObjectType):
     def __init__(self, data: dict):
         super().__init__()
-        self.invoices = []
+        self.invoices = [
+            LnInvoiceRow.from_dict(invoice)
+            for invoice in data.get("invoices", [])
+        ]
         self.first_index_offset = int(data["first_index_offset"])
         self.last_index_offset = int(data["last_index_offset"])
-        if "invoices" in data:
-            for invoice in data["invoices"]:
-                self.invoices.append(LnInvoice(invoice))
 
     invoices = graphene.List(
         LnInvoice,
@@ -54,8 +53,7 @@ class ListInvoicesResponse(graphene.Union):
 class ListInvoicesQuery(graphene.ObjectType):
     ln_list_invoices = graphene.Field(
         ListInvoicesResponse,
-        description=process_lnd_doc_string(
-            lnrpc.LightningServicer.ListInvoices.__doc__),
+        description=rpc_description("Lightning.ListInvoices"),
         pending_only=graphene.Boolean(
             default_value=False,
             description=
@@ -85,22 +83,22 @@ class ListInvoicesQuery(graphene.ObjectType):
         if not info.context.user.is_authenticated:
             return Unauthenticated()
 
-        res = LNDWallet.objects.filter(owner=info.context.user)
+        wallet = get_user_wallet(info.context)
 
-        if not res:
+        if wallet is None:
             return WalletInstanceNotFound()
 
-        cfg = build_lnd_wallet_config(res.first().pk)
+        cfg = build_lnd_wallet_config(wallet.pk)
 
         channel_data = build_grpc_channel_manual(
-            rpc_server="127.0.0.1",
+            rpc_server=cfg.rpc_server,
             rpc_port=cfg.rpc_listen_port_ipv4,
             cert_path=cfg.tls_cert_path,
             macaroon_path=cfg.admin_macaroon_path)
         if channel_data.error is not None:
             return channel_data.error
 
-        stub = lnrpc.LightningStub(channel_data.channel)
+        client = lnd_client(info.context, wallet.pk, channel_data)
         request = ln.ListInvoiceRequest(
             pending_only=pending_only,
             index_offset=index_offset,
@@ -109,8 +107,7 @@ class ListInvoicesQuery(graphene.ObjectType):
         )
 
         try:
-            response = stub.ListInvoices(
-                request, metadata=[('macaroon', channel_data.macaroon)])
+            response = client.call("ListInvoices", request)
         except grpc.RpcError as exc:
             # pylint: disable=E1101
             print(exc)
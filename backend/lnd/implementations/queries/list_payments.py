@@ -4,15 +4,14 @@ import graphene
 import grpc
 from google.protobuf.json_format import MessageToJson
 
-import backend.lnd.rpc_pb2 as ln
-import backend.lnd.rpc_pb2_grpc as lnrpc
 from backend.error_responses import (ServerError, Unauthenticated,
                                      WalletInstanceNotFound,
                                      WalletInstanceNotRunning)
-from backend.lnd.models import LNDWallet
-from backend.lnd.types import LnPayment
+from backend.lnd.rpc import ln, rpc_description
+from backend.lnd.rpc_client import lnd_client
+from backend.lnd.types import LnPayment, LnPaymentRow
 from backend.lnd.utils import (build_grpc_channel_manual,
-                               build_lnd_wallet_config, process_lnd_doc_string)
+                               build_lnd_wallet_config, get_user_wallet)
 
 
 class ListPaymentsError(graphene.ObjectType):
@@ -22,11 +21,11 @@ class ListPaymentsError(graphene.ObjectType):
 class ListPaymentsSuccess(graphene.ObjectType):
     def __init__(self, first_index_offset, last_index_offset, payments):
         super().__init__()
-        self.payments = []
+        self.payments = [
+            LnPaymentRow.from_dict(payment) for payment in payments
+        ]
         self.first_index_offset = first_index_offset
         self.last_index_offset = last_index_offset
-        for payment in payments:
-            self.payments.append(LnPayment(payment))
 
     payments = graphene.List(
         LnPayment,
@@ -53,8 +52,7 @@ class ListPaymentsResponse(graphene.Union):
 class ListPaymentsQuery(graphene.ObjectType):
     ln_list_payments = graphene.Field(
         ListPaymentsResponse,
-        description=process_lnd_doc_string(
-            lnrpc.LightningServicer.ListPayments.__doc__),
+        description=rpc_description("Lightning.ListPayments"),
         index_offset=graphene.Int(
             default_value=0,
             description=
@@ -85,27 +83,26 @@ class ListPaymentsQuery(graphene.ObjectType):
         if not info.context.user.is_authenticated:
             return Unauthenticated()
 
-        res = LNDWallet.objects.filter(owner=info.context.user)
+        wallet = get_user_wallet(info.context)
 
-        if not res:
+        if wallet is None:
             return WalletInstanceNotFound()
 
-        cfg = build_lnd_wallet_config(res.first().pk)
+        cfg = build_lnd_wallet_config(wallet.pk)
 
         channel_data = build_grpc_channel_manual(
-            rpc_server="127.0.0.1",
+            rpc_server=cfg.rpc_server,
             rpc_port=cfg.rpc_listen_port_ipv4,
             cert_path=cfg.tls_cert_path,
             macaroon_path=cfg.admin_macaroon_path)
         if channel_data.error is not None:
             return channel_data.error
 
-        stub = lnrpc.LightningStub(channel_data.channel)
+        client = lnd_client(info.context, wallet.pk, channel_data)
         request = ln.ListPaymentsRequest()
 
         try:
-            response = stub.ListPayments(
-                request, metadata=[('macaroon', channel_data.macaroon)])
+            response = client.call("ListPayments", request)
         except grpc.RpcError as exc:
             # pylint: disable=E1101
             print(exc)
@@ -4,15 +4,15 @@ import graphene
 import grpc
 from google.protobuf.json_format import MessageToJson
 
-import backend.lnd.rpc_pb2 as ln
-import backend.lnd.rpc_pb2_grpc as lnrpc
 from backend.error_responses import (ServerError, Unauthenticated,
                                      WalletInstanceNotFound,
                                      WalletInstanceNotRunning)
 from backend.lnd.models import LNDWallet
+from backend.lnd.rpc import ln, rpc_description
+from backend.lnd.rpc_client import lnd_client
 from backend.lnd.types import LnPeer
 from backend.lnd.utils import (build_grpc_channel_manual,
-                               build_lnd_wallet_config, process_lnd_doc_string)
+                               build_lnd_wallet_config, get_user_wallet)
 
 
 class ListPeersError(graphene.ObjectType):
@@ -32,29 +32,37 @@ class ListPeersPayload(graphene.Union):
 class ListPeersQuery(graphene.ObjectType):
     ln_list_peers = graphene.Field(
         ListPeersPayload,
-        description=process_lnd_doc_string(
-            lnrpc.LightningServicer.ListPeers.__doc__))
+        description=rpc_description("Lightning.ListPeers"))
 
     def resolve_ln_list_peers(self, info, **kwargs):
         """https://api.lightning.community/#listpeers"""
         if not info.context.user.is_authenticated:
             return Unauthenticated()
 
-        res = LNDWallet.objects.filter(owner=info.context.user)
+        wallet = get_user_wallet(info.context)
 
-        if not res:
+        if wallet is None:
             return WalletInstanceNotFound()
 
-        return list_peers_query(info, res.first())
+        return list_peers_query(info, wallet)
 
 
-def get_peer_has_channel(channel_data, peer_list):
-    stub = lnrpc.LightningStub(channel_data.channel)
+def selects_has_channel(info) -> bool:
+    for selection in info.field_asts[0].selection_set.selections:
+        if hasattr(selection, "type_condition"):
+            if selection.type_condition.name.value == "ListPeersSuccess":
+                for field in selection.selection_set.selections[
+                        0].selection_set.selections:
+                    if field.name.value == "hasChannel":
+                        return True
+    return False
+
+
+def get_peer_has_channel(client, peer_list):
     request = ln.ListChannelsRequest()
 
     try:
-        response = stub.ListChannels(
-            request, metadata=[('macaroon', channel_data.macaroon)])
+        response = client.call("ListChannels", request)
     except grpc.RpcError as exc:
         print(exc)
         raise exc
@@ -80,7 +88,7 @@ def list_peers_query(info, wallet: LNDWallet):
     cfg = build_lnd_wallet_config(wallet.pk)
 
     channel_data = build_grpc_channel_manual(
-        rpc_server="127.0.0.1",
+        rpc_server=cfg.rpc_server,
         rpc_port=cfg.rpc_listen_port_ipv4,
         cert_path=cfg.tls_cert_path,
         macaroon_path=cfg.admin_macaroon_path)
@@ -88,12 +96,17 @@ def list_peers_query(info, wallet: LNDWallet):
     if channel_data.error is not None:
         return channel_data.error
 
-    stub = lnrpc.LightningStub(channel_data.channel)
+    client = lnd_client(info.context, wallet.pk, channel_data)
+
+    # fetch the channels while waiting for the peers
+    has_channel = selects_has_channel(info)
+    if has_channel:
+        client.prefetch("ListChannels", ln.ListChannelsRequest())
+
     request = ln.ListPeersRequest()
 
     try:
-        response = stub.ListPeers(
-            request, metadata=[('macaroon', channel_data.macaroon)])
+        response = client.call("ListPeers", request)
     except grpc.RpcError as exc:
         print(exc)
         raise exc
@@ -108,13 +121,7 @@ def list_peers_query(info, wallet: LNDWallet):
     for c in json_data["peers"]:
         peer_list.append(LnPeer(c))
 
-    for selection in info.field_asts[0].selection_set.selections:
-        if hasattr(selection, "type_condition"):
-            if selection.type_condition.name.value == "ListPeersSuccess":
-                for field in selection.selection_set.selections[
-                        0].selection_set.selections:
-                    if field.name.value == "hasChannel":
-                        get_peer_has_channel(channel_data, peer_list)
-                        break
+    if has_channel:
+        get_peer_has_channel(client, peer_list)
 
     return ListPeersSuccess(peer_list)
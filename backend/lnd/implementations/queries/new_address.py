@@ -4,14 +4,14 @@ import graphene
 import grpc
 from google.protobuf.json_format import MessageToJson
 
-import backend.lnd.rpc_pb2 as ln
-import backend.lnd.rpc_pb2_grpc as lnrpc
 from backend.error_responses import (ServerError, Unauthenticated,
                                      WalletInstanceNotFound,
                                      WalletInstanceNotRunning)
 from backend.lnd.models import LNDWallet
+from backend.lnd.rpc import ln, rpc_description
+from backend.lnd.rpc_client import lnd_client
 from backend.lnd.utils import (build_grpc_channel_manual,
-                               build_lnd_wallet_config, process_lnd_doc_string)
+                               build_lnd_wallet_config, get_user_wallet)
 
 
 class NewAddressError(graphene.ObjectType):
@@ -31,8 +31,7 @@ class NewAddressPayload(graphene.Union):
 class NewAddressQuery(graphene.ObjectType):
     ln_new_address = graphene.Field(
         NewAddressPayload,
-        description=process_lnd_doc_string(
-            lnrpc.LightningServicer.NewAddress.__doc__),
+        description=rpc_description("Lightning.NewAddress"),
         address_type=graphene.String(
             default_value="np2wkh",
             description="""
@@ -44,19 +43,19 @@ class NewAddressQuery(graphene.ObjectType):
         if not info.context.user.is_authenticated:
             return Unauthenticated()
 
-        res = LNDWallet.objects.filter(owner=info.context.user)
+        wallet = get_user_wallet(info.context)
 
-        if not res:
+        if wallet is None:
             return WalletInstanceNotFound()
 
-        return get_info_query(res.first(), address_type)
+        return get_info_query(info, wallet, address_type)
 
 
-def get_info_query(wallet: LNDWallet, address_type: str) -> str:
+def get_info_query(info, wallet: LNDWallet, address_type: str) -> str:
     cfg = build_lnd_wallet_config(wallet.pk)
 
     channel_data = build_grpc_channel_manual(
-        rpc_server="127.0.0.1",
+        rpc_server=cfg.rpc_server,
         rpc_port=cfg.rpc_listen_port_ipv4,
         cert_path=cfg.tls_cert_path,
         macaroon_path=cfg.admin_macaroon_path)
@@ -64,7 +63,7 @@ def get_info_query(wallet: LNDWallet, address_type: str) -> str:
     if channel_data.error is not None:
         return channel_data.error
 
-    stub = lnrpc.LightningStub(channel_data.channel)
+    client = lnd_client(info.context, wallet.pk, channel_data)
 
     if address_type == "p2wkh":
         request = ln.NewAddressRequest(type="WITNESS_PUBKEY_HASH")
@@ -74,8 +73,7 @@ def get_info_query(wallet: LNDWallet, address_type: str) -> str:
         return NewAddressError(error_message="Unknown address type")
 
     try:
-        response = stub.NewAddress(
-            request, metadata=[('macaroon', channel_data.macaroon)])
+        response = client.call("NewAddress", request)
     except grpc.RpcError as exc:
         print(exc)
         raise exc
@@ -84,6 +84,9 @@ def test_get_ln_wallet_status(monkeypatch: MonkeyPatch):
     wallet.initialized = True
     wallet.save()
 
+    # the wallet is cached per request, start a new one
+    del req.request_cache
+
     # Test build channel failure
     monkeypatch.setattr(
         backend.lnd.implementations.queries.get_ln_wallet_status,
@@ -101,7 +104,7 @@ def test_get_ln_wallet_status(monkeypatch: MonkeyPatch):
         lambda *args, **kwargs: utils.fake_build_grpc_channel_manual())
 
     monkeypatch.setattr(
-        backend.lnd.implementations.queries.get_ln_wallet_status.lnrpc,
+        backend.lnd.rpc_client.lnrpc,
         "LightningStub", FakeLightningStubUnimplemented)
 
     monkeypatch.setattr(
@@ -113,7 +116,7 @@ def test_get_ln_wallet_status(monkeypatch: MonkeyPatch):
                       ), "Should be an instance of GetLnWalletStatusLocked"
 
     monkeypatch.setattr(
-        backend.lnd.implementations.queries.get_ln_wallet_status.lnrpc,
+        backend.lnd.rpc_client.lnrpc,
         "LightningStub", FakeLightningStubNoError)
 
     ret = query.resolve_get_ln_wallet_status(resolve_info)
@@ -1,18 +1,19 @@
 import json
 
 import graphene
+from channels.db import database_sync_to_async
 from google.protobuf.json_format import MessageToJson
 from grpc import RpcError
 
-import backend.lnd.rpc_pb2 as ln
-import backend.lnd.rpc_pb2_grpc as lnrpc
 from backend.error_responses import (ServerError, Unauthenticated,
                                      WalletInstanceNotFound,
                                      WalletInstanceNotRunning)
 from backend.lnd.models import LNDWallet
+from backend.lnd.rpc import ln, lnrpc, rpc_description
+from backend.lnd.rpc_client import INVOICE_SETTLED, invalidate_shared_responses
 from backend.lnd.types import LnInvoice
 from backend.lnd.utils import (build_grpc_channel_manual,
-                               build_lnd_wallet_config, process_lnd_doc_string)
+                               build_lnd_wallet_config)
 
 
 class InvoiceSubSuccess(graphene.ObjectType):
@@ -34,8 +35,7 @@ class InvoiceSubPayload(graphene.Union):
 class InvoiceSubscription(graphene.ObjectType):
     invoice_subscription = graphene.Field(
         InvoiceSubPayload,
-        description=process_lnd_doc_string(
-            lnrpc.LightningServicer.SubscribeInvoices.__doc__),
+        description=rpc_description("Lightning.SubscribeInvoices"),
         add_index=graphene.Int(),
         settle_index=graphene.Int())
 
@@ -56,10 +56,11 @@ class InvoiceSubscription(graphene.ObjectType):
         if not res:
             yield WalletInstanceNotFound()
 
-        cfg = build_lnd_wallet_config(res.first().pk)
+        wallet_pk = res.first().pk
+        cfg = build_lnd_wallet_config(wallet_pk)
 
         channel_data = build_grpc_channel_manual(
-            rpc_server="127.0.0.1",
+            rpc_server=cfg.rpc_server,
             rpc_port=cfg.rpc_listen_port_ipv4,
             cert_path=cfg.tls_cert_path,
             macaroon_path=cfg.admin_macaroon_path,
@@ -81,6 +82,10 @@ class InvoiceSubscription(graphene.ObjectType):
         try:
             async for response in stub.SubscribeInvoices(
                     request, metadata=[('macaroon', channel_data.macaroon)]):
+                # a settled invoice changes the channel balances
+                if response.settled:
+                    await database_sync_to_async(invalidate_shared_responses)(
+                        wallet_pk, INVOICE_SETTLED)
                 if not info.context["user"].is_authenticated:
                     yield Unauthenticated()
                 else:
@@ -1,17 +1,18 @@
 import json
 
 import graphene
+from channels.db import database_sync_to_async
 from google.protobuf.json_format import MessageToJson
 
-import backend.lnd.rpc_pb2 as ln
-import backend.lnd.rpc_pb2_grpc as lnrpc
 from backend.error_responses import (ServerError, Unauthenticated,
                                      WalletInstanceNotFound,
                                      WalletInstanceNotRunning)
 from backend.lnd.models import LNDWallet
+from backend.lnd.rpc import ln, lnrpc, rpc_description
+from backend.lnd.rpc_client import TRANSACTION, invalidate_shared_responses
 from backend.lnd.types import LnTransaction
 from backend.lnd.utils import (build_grpc_channel_manual,
-                               build_lnd_wallet_config, process_lnd_doc_string)
+                               build_lnd_wallet_config)
 
 
 class TransactionSubSuccess(graphene.ObjectType):
@@ -33,8 +34,7 @@ class TransactionSubPayload(graphene.Union):
 class TransactionSubscription(graphene.ObjectType):
     transaction_subscription = graphene.Field(
         TransactionSubPayload,
-        description=process_lnd_doc_string(
-            lnrpc.LightningServicer.SubscribeTransactions.__doc__))
+        description=rpc_description("Lightning.SubscribeTransactions"))
 
     async def resolve_transaction_subscription(
             self,
@@ -53,10 +53,11 @@ class TransactionSubscription(graphene.ObjectType):
         if not res:
             yield WalletInstanceNotFound()
 
-        cfg = build_lnd_wallet_config(res.first().pk)
+        wallet_pk = res.first().pk
+        cfg = build_lnd_wallet_config(wallet_pk)
 
         channel_data = build_grpc_channel_manual(
-            rpc_server="127.0.0.1",
+            rpc_server=cfg.rpc_server,
             rpc_port=cfg.rpc_listen_port_ipv4,
             cert_path=cfg.tls_cert_path,
             macaroon_path=cfg.admin_macaroon_path,
@@ -75,6 +76,8 @@ class TransactionSubscription(graphene.ObjectType):
         try:
             async for response in stub.SubscribeTransactions(
                     request, metadata=[('macaroon', channel_data.macaroon)]):
+                await database_sync_to_async(invalidate_shared_responses)(
+                    wallet_pk, TRANSACTION)
                 if not info.context["user"].is_authenticated:
                     yield Unauthenticated()
                 else:
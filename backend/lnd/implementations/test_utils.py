@@ -23,4 +23,5 @@ def fake_build_wallet_cfg(pk):
         rpc_listen_port_ipv6=default_rpc_port + pk * 2,
         rpc_listen_port_ipv4=default_rpc_port + pk * 2 - 1,
         rest_port_ipv6=default_rest_port + pk * 2,
-        rest_port_ipv4=default_rest_port + pk * 2 - 1)
+        rest_port_ipv4=default_rest_port + pk * 2 - 1,
+        rpc_server="127.0.0.1")
@@ -0,0 +1,148 @@
+"""This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.benchmark import WORKLOADS, Benchmark
+from backend.lnd.fake_lnd import FakeLnd, FakeLndOptions
+from backend.lnd.models import LNDWallet
+from backend.lnd.utils import build_lnd_wallet_config
+from backend.subscriptions.routing import session_application
+
+
+class Command(BaseCommand):
+    help = "Benchmarks the GraphQL API with representative workloads"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "username", help="The requests are sent as this user, "
+            "who must own a wallet")
+        parser.add_argument(
+            "--workload",
+            choices=list(WORKLOADS) + ["all"],
+            default="all")
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=10,
+            help="Requests in flight, or subscribers for the "
+            "subscribers workload")
+        parser.add_argument("--warmup", type=int, default=10)
+        parser.add_argument(
+            "--duration",
+            type=float,
+            default=10,
+            help="Seconds the subscribers listen for events")
+        parser.add_argument(
+            "--output", default=None, help="Write the results as JSON")
+        parser.add_argument(
+            "--real-lnd",
+            action="store_true",
+            help="Use the running daemon of the wallet instead "
+            "of a fake one, gRPC calls are not counted")
+        parser.add_argument("--channels", type=int, default=50)
+        parser.add_argument("--payments", type=int, default=1000)
+        parser.add_argument("--invoices", type=int, default=1000)
+        parser.add_argument("--transactions", type=int, default=500)
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=0.0,
+            help="Seconds every call of the fake daemon takes")
+        parser.add_argument(
+            "--event-interval",
+            type=float,
+            default=0.5,
+            help="Seconds between the events of the fake daemon")
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(
+                username=options["username"])
+        except get_user_model().DoesNotExist:
+            raise CommandError("Unknown user {}".format(options["username"]))
+
+        wallet = LNDWallet.objects.filter(owner=user).first()
+        if wallet is None:
+            raise CommandError("{} has no wallet".format(user.username))
+
+        node = None
+        grpc_calls = None
+        if not options["real_lnd"]:
+            cfg = build_lnd_wallet_config(wallet.pk)
+            node = FakeLnd(
+                cfg.data_dir,
+                port=cfg.rpc_listen_port_ipv4,
+                host=cfg.rpc_server,
+                options=FakeLndOptions(
+                    channels=options["channels"],
+                    payments=options["payments"],
+                    invoices=options["invoices"],
+                    transactions=options["transactions"],
+                    latency=options["latency"],
+                    event_interval=options["event_interval"]))
+            node.start()
+            grpc_calls = lambda: node.calls
+
+        workloads = list(WORKLOADS.values())
+        if options["workload"] != "all":
+            workloads = [WORKLOADS[options["workload"]]]
+
+        benchmark = Benchmark(session_application, user, grpc_calls)
+        results = []
+        try:
+            for workload in workloads:
+                self.stdout.write("{}: {}".format(workload.name,
+                                                  workload.description))
+                result = benchmark.run(
+                    workload,
+                    requests=options["requests"],
+                    concurrency=options["concurrency"],
+                    warmup=options["warmup"],
+                    duration=options["duration"])
+                self.write_summary(result)
+                results.append(result)
+        finally:
+            if node is not None:
+                node.stop()
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write("Results written to {}".format(
+                options["output"]))
+
+    def write_summary(self, result: dict):
+        for name, stats in result["operations"].items():
+            self.stdout.write(
+                "  {:<24} p50 {} p95 {} p99 {} ms, {} errors".format(
+                    name, *[
+                        "{:8.1f}".format(stats[key])
+                        if stats[key] is not None else "       -"
+                        for key in ("p50_ms", "p95_ms", "p99_ms")
+                    ], stats["errors"]))
+            if "db_queries" in stats:
+                grpc_calls = stats["grpc_calls"]
+                self.stdout.write(
+                    "  {:<24} {:.1f} queries, {} gRPC calls per request".
+                    format(
+                        "", stats["db_queries"], "-" if grpc_calls is None
+                        else "{:.1f}".format(grpc_calls["total"])))
+
+        total = result["total"]
+        if "throughput_rps" in total:
+            self.stdout.write(
+                "  total {} requests in {:.1f} s, {:.1f} requests/s".format(
+                    total["requests"], total["duration_s"],
+                    total["throughput_rps"]))
+        else:
+            self.stdout.write(
+                "  total {} subscribers received {} events in {:.1f} s".
+                format(total["subscribers"], total["events"],
+                       total["duration_s"]))
@@ -0,0 +1,67 @@
+"""This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.startup_benchmark import TARGETS, benchmark_startup
+
+
+class Command(BaseCommand):
+    help = "Benchmarks the startup of the web, ASGI and Celery workers"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--target",
+            dest="targets",
+            action="append",
+            choices=list(TARGETS),
+            help="Benchmark only this worker, can be repeated")
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=5,
+            help="Fresh interpreters started per worker")
+        parser.add_argument(
+            "--max-seconds",
+            type=float,
+            default=None,
+            help="Fail if the median startup of a worker takes longer")
+        parser.add_argument(
+            "--output", default=None, help="Write the results as JSON")
+
+    def handle(self, *args, **options):
+        results = {}
+        failures = []
+        for target in options["targets"] or TARGETS:
+            self.stderr.write("{} x {}...".format(target, options["repeat"]))
+            result = benchmark_startup(target, options["repeat"])
+            results[target] = result
+
+            self.stdout.write(
+                "{:<7} {:8.1f} ms {:8.1f} MiB {:5} modules".format(
+                    target, result["seconds"] * 1000,
+                    result["maxrss_kb"] / 1024, result["modules"]))
+            for name, times in result["slowest_imports"].items():
+                self.stdout.write("  {:<50} {:8.1f} ms".format(
+                    name, times["self_ms"]))
+
+            if result["lazy_modules_imported"]:
+                failures.append("{} imports {}".format(
+                    target, ", ".join(result["lazy_modules_imported"])))
+            if options["max_seconds"] is not None and \
+                    result["seconds"] > options["max_seconds"]:
+                failures.append("{} takes {:.3f} s".format(
+                    target, result["seconds"]))
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write("Results written to {}".format(
+                options["output"]))
+
+        if failures:
+            raise CommandError("; ".join(failures))
@@ -0,0 +1,55 @@
+"""This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+import json
+
+from django.core.management.base import BaseCommand
+
+from backend.lnd.type_benchmark import CONVERSIONS, SIZES, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = "Benchmarks the conversion of LND responses into graphene types"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--type",
+            dest="types",
+            action="append",
+            choices=list(CONVERSIONS),
+            help="Benchmark only this conversion, can be repeated")
+        parser.add_argument(
+            "--sizes",
+            type=int,
+            nargs="+",
+            default=list(SIZES),
+            help="Number of items of the synthetic responses")
+        parser.add_argument(
+            "--output", default=None, help="Write the results as JSON")
+
+    def handle(self, *args, **options):
+        results = run_benchmarks(
+            options["types"],
+            options["sizes"],
+            progress=lambda name, size: self.stderr.write(
+                "{} x {}...".format(name, size)))
+
+        for name, sizes in results.items():
+            self.stdout.write(name)
+            for size, stages in sizes.items():
+                for stage, stats in stages.items():
+                    self.stdout.write(
+                        "  {:>7} {:<12} {:10.1f} us/item {:12.1f} ms "
+                        "peak {:8.1f} KiB retained {:8.1f} B/item".format(
+                            size, stage, stats["per_item_us"],
+                            stats["seconds"] * 1000,
+                            stats["peak_bytes"] / 1024,
+                            stats["retained_per_item_bytes"]))
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write("Results written to {}".format(
+                options["output"]))
@@ -0,0 +1,46 @@
+"""This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from graphene_django.settings import graphene_settings
+from graphql.backend.cache import get_unique_schema_id
+
+from backend.graphql_backend import build_snapshot, load_snapshot
+
+
+class Command(BaseCommand):
+    help = ("Builds and validates the introspection results of the schema "
+            "once, the workers load them instead of executing the "
+            "introspection queries")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output",
+            default=settings.GRAPHQL_DOCUMENT_CACHE["SNAPSHOT"],
+            help="Write the snapshot to this file")
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Fail if the snapshot belongs to another version of "
+            "the schema instead of writing it")
+
+    def handle(self, *args, **options):
+        schema = graphene_settings.SCHEMA
+
+        if options["check"]:
+            if not load_snapshot(schema, options["output"]):
+                raise CommandError("{} is missing or outdated".format(
+                    options["output"]))
+            self.stdout.write("{} is up to date".format(options["output"]))
+            return
+
+        snapshot = build_snapshot(schema)
+        with open(options["output"], "w") as output:
+            json.dump(snapshot, output, separators=(",", ":"))
+        self.stdout.write("Snapshot of schema {} written to {}".format(
+            get_unique_schema_id(schema), options["output"]))
@@ -0,0 +1,114 @@
+"""This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.lnd.fake_lnd import FakeLnd, FakeLndOptions
+from backend.lnd.utils import build_lnd_wallet_config
+
+
+def method_latency(value: str):
+    """Parses METHOD=SECONDS"""
+    method, _, seconds = value.partition("=")
+    try:
+        return method, float(seconds)
+    except ValueError:
+        raise CommandError(
+            "Expected METHOD=SECONDS, got '{}'".format(value))
+
+
+class Command(BaseCommand):
+    help = "Serves a fake LND daemon with a synthetic data set " \
+        "for load tests and benchmarks"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--wallet",
+            type=int,
+            default=None,
+            help="Serve the daemon of this wallet, i.e. on its RPC port "
+            "and with the certificate and macaroon in its data directory")
+        parser.add_argument(
+            "--data-dir",
+            default=None,
+            help="Directory of the certificate and macaroon "
+            "if no wallet is given")
+        parser.add_argument("--host", default="localhost")
+        parser.add_argument(
+            "--port", type=int, default=10009, help="RPC port")
+        defaults = FakeLndOptions()
+        for name in ("channels", "peers", "payments", "invoices",
+                     "transactions", "seed"):
+            parser.add_argument(
+                "--" + name, type=int, default=getattr(defaults, name))
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=defaults.latency,
+            help="Seconds every call takes")
+        parser.add_argument(
+            "--method-latency",
+            type=method_latency,
+            action="append",
+            default=[],
+            help="METHOD=SECONDS, overrides --latency for the method")
+        parser.add_argument(
+            "--error-rate",
+            type=float,
+            default=defaults.error_rate,
+            help="Share of the calls which fail, e.g. 0.01")
+        parser.add_argument(
+            "--error-code",
+            default=defaults.error_code,
+            help="gRPC status code of the failing calls")
+        parser.add_argument(
+            "--locked",
+            action="store_true",
+            help="Start locked, the wallet has to be unlocked first")
+        parser.add_argument(
+            "--password",
+            default=defaults.password,
+            help="Password of the wallet, default accepts any password")
+        parser.add_argument(
+            "--event-interval",
+            type=float,
+            default=defaults.event_interval,
+            help="Seconds between the invoice and transaction events "
+            "sent to subscribers, 0 disables them")
+
+    def handle(self, *args, **options):
+        host, port, data_dir = options["host"], options["port"], options[
+            "data_dir"]
+        if options["wallet"] is not None:
+            cfg = build_lnd_wallet_config(options["wallet"])
+            host, port, data_dir = cfg.rpc_server, \
+                cfg.rpc_listen_port_ipv4, cfg.data_dir
+        if data_dir is None:
+            raise CommandError("Either --wallet or --data-dir is required")
+
+        fake_options = FakeLndOptions(
+            channels=options["channels"],
+            peers=options["peers"],
+            payments=options["payments"],
+            invoices=options["invoices"],
+            transactions=options["transactions"],
+            seed=options["seed"],
+            latency=options["latency"],
+            method_latency=dict(options["method_latency"]),
+            error_rate=options["error_rate"],
+            error_code=options["error_code"].upper(),
+            locked=options["locked"],
+            password=options["password"],
+            event_interval=options["event_interval"])
+
+        node = FakeLnd(data_dir, port=port, host=host, options=fake_options)
+        node.start()
+        self.stdout.write("Fake LND listening on {}:{}, data in {}".format(
+            host, node.port, data_dir))
+
+        try:
+            node.wait()
+        except KeyboardInterrupt:
+            node.stop(1)
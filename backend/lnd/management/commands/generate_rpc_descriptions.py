@@ -0,0 +1,70 @@
+"""This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+import backend.lnd.rpc_descriptions as rpc_descriptions
+from backend.lnd.rpc import ln, lnrpc
+from backend.lnd.utils import process_lnd_doc_string
+
+
+def build_descriptions() -> dict:
+    """Returns the descriptions of all RPCs, taken from the docstrings
+    of the generated servicers"""
+    descriptions = {}
+    for service in ln.DESCRIPTOR.services_by_name.values():
+        servicer = getattr(lnrpc, service.name + "Servicer")
+        for method in service.methods:
+            doc = getattr(servicer, method.name).__doc__ or ""
+            descriptions[service.name + "." + method.name] = \
+                process_lnd_doc_string(doc)
+    return descriptions
+
+
+def render_descriptions(descriptions: dict) -> str:
+    """Returns the source of the backend.lnd.rpc_descriptions module"""
+    lines = [
+        '"""Descriptions of the LND RPCs for the GraphQL schema.',
+        '',
+        'Generated by ./manage.py generate_rpc_descriptions from the',
+        'docstrings of the servicers in rpc_pb2_grpc. DO NOT EDIT!',
+        '"""',
+        '',
+        'DESCRIPTIONS = {',
+    ]
+    for name in sorted(descriptions):
+        lines.append("    {!r}:".format(name))
+        lines.append("    {!r},".format(descriptions[name]))
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+class Command(BaseCommand):
+    help = ("Regenerates backend/lnd/rpc_descriptions.py after "
+            "rpc_pb2_grpc.py was updated")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Fail if the module is out of date instead of writing it")
+
+    def handle(self, *args, **options):
+        source = render_descriptions(build_descriptions())
+        path = os.path.splitext(rpc_descriptions.__file__)[0] + ".py"
+        with open(path) as current:
+            up_to_date = current.read() == source
+
+        if options["check"]:
+            if not up_to_date:
+                raise CommandError("{} is out of date".format(path))
+            self.stdout.write("{} is up to date".format(path))
+            return
+
+        with open(path, "w") as output:
+            output.write(source)
+        self.stdout.write("Descriptions written to {}".format(path))
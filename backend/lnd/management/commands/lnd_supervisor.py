@@ -0,0 +1,50 @@
+"""This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+from django.core.management.base import BaseCommand
+
+from backend.lnd.supervisor import LNDSupervisor
+
+
+class Command(BaseCommand):
+    help = "Boots and supervises all LND daemons hosted on this machine"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--parallelism",
+            type=int,
+            default=None,
+            help="Number of daemons to boot at the same time")
+        parser.add_argument(
+            "--host",
+            default=None,
+            help="Address of this host in the LND fleet "
+            "(default: settings.LND_HOST_ADDRESS)")
+        parser.add_argument(
+            "--no-boot",
+            action="store_true",
+            help="Only supervise daemons which are already running")
+        parser.add_argument(
+            "--status",
+            action="store_true",
+            help="Print CPU and memory usage of all daemons and exit")
+
+    def handle(self, *args, **options):
+        supervisor = LNDSupervisor(
+            parallelism=options["parallelism"], host_address=options["host"])
+
+        if options["status"]:
+            supervisor.adopt_new_daemons()
+            for stat in supervisor.stats():
+                self.stdout.write(
+                    "wallet {} pid {}: cpu {:.1f}% rss {:.1f} MiB".format(
+                        stat.wallet_id, stat.pid, stat.cpu_percent,
+                        stat.rss / 1024 / 1024))
+            return
+
+        try:
+            supervisor.run(boot=not options["no_boot"])
+        except KeyboardInterrupt:
+            self.stdout.write("Supervisor stopped, daemons keep running")
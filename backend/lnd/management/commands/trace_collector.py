@@ -0,0 +1,49 @@
+"""This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+import json
+import threading
+
+from django.core.management.base import BaseCommand
+
+from backend.tracing import TraceCollector
+
+
+class Command(BaseCommand):
+    help = ("Runs a stand-in OTLP/HTTP collector which appends "
+            "the received spans to a file")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--host", default="localhost", help="Address to listen on")
+        parser.add_argument(
+            "--port", type=int, default=4318, help="Port to listen on")
+        parser.add_argument(
+            "--output",
+            default="traces.jsonl",
+            help="Append the batches to this file, one per line")
+
+    def handle(self, *args, **options):
+        lock = threading.Lock()
+
+        def receive(payload):
+            spans = sum(
+                len(scope["spans"])
+                for resource in payload.get("resourceSpans", [])
+                for scope in resource.get("scopeSpans", []))
+            with lock, open(options["output"], "a") as output:
+                output.write(json.dumps(payload) + "\n")
+            self.stdout.write("Received {} spans".format(spans))
+
+        collector = TraceCollector((options["host"], options["port"]),
+                                   receive)
+        self.stdout.write("Collecting traces at http://{}:{}/v1/traces".format(
+            options["host"], options["port"]))
+        try:
+            collector.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            collector.server_close()
@@ -0,0 +1,18 @@
+# Generated by Django 2.1.7 on 2026-10-19 17:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lnd', '0002_ipaddress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lndwallet',
+            name='stopped_by_owner',
+            field=models.BooleanField(default=False),
+        ),
+    ]
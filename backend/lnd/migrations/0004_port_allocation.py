@@ -0,0 +1,50 @@
+# Generated by Django 2.1.7 on 2026-10-19 17:42
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def keep_existing_ports(apps, schema_editor):
+    """Existing daemons keep the ports they had with the old pk * 2 layout
+    if the pk is a valid slot, the other wallets get the lowest free
+    slot and their daemons have to be restarted"""
+    LNDWallet = apps.get_model('lnd', 'LNDWallet')
+    PortAllocation = apps.get_model('lnd', 'PortAllocation')
+    slots = settings.LND_PORTS['SLOTS_PER_HOST']
+    wallets = list(LNDWallet.objects.order_by('pk'))
+    used = {wallet.pk for wallet in wallets if wallet.pk <= slots}
+    free = (slot for slot in range(1, slots + 1) if slot not in used)
+    for wallet in wallets:
+        slot = wallet.pk if wallet.pk <= slots else next(free, None)
+        if slot is None:
+            raise RuntimeError(
+                'No free LND slot left for wallet {}, increase '
+                'LND_PORTS["SLOTS_PER_HOST"]'.format(wallet.pk))
+        PortAllocation.objects.create(
+            wallet=wallet, host='127.0.0.1', slot=slot)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lnd', '0003_wallet_stopped_by_owner'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PortAllocation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('host', models.CharField(default='127.0.0.1', max_length=255)),
+                ('slot', models.PositiveIntegerField()),
+                ('wallet', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='port_allocation', to='lnd.LNDWallet')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='portallocation',
+            unique_together={('host', 'slot')},
+        ),
+        migrations.RunPython(keep_existing_ports,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 2.1.7 on 2026-10-19 17:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lnd', '0004_port_allocation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LNDHost',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('address', models.CharField(max_length=255, unique=True)),
+                ('enabled', models.BooleanField(default=True)),
+                ('running_daemons', models.PositiveIntegerField(default=0)),
+                ('cpu_percent', models.FloatField(default=0)),
+                ('memory_percent', models.FloatField(default=0)),
+                ('last_heartbeat', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 2.1.7 on 2026-10-19 17:47
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lnd', '0005_lnd_host'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lndwallet',
+            name='hibernated',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='lndwallet',
+            name='last_activity',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
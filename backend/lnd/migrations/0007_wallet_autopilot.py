@@ -0,0 +1,18 @@
+# Generated by Django 2.1.7 on 2026-10-20 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lnd', '0006_wallet_hibernation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lndwallet',
+            name='autopilot',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -5,6 +5,7 @@ file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 
 class LNDWallet(models.Model):
@@ -14,6 +15,47 @@ class LNDWallet(models.Model):
     name = models.CharField(max_length=100)
     testnet = models.BooleanField(default=False)
     initialized = models.BooleanField(default=False)
+    stopped_by_owner = models.BooleanField(default=False)
+    # last GraphQL request or subscription event of the owner
+    last_activity = models.DateTimeField(default=timezone.now)
+    # the daemon was stopped because the wallet was idle
+    hibernated = models.BooleanField(default=False)
+    # the autopilot setting of the last start by the owner, daemons
+    # (re)started by the supervisor are started with it as well
+    autopilot = models.BooleanField(default=False)
+
+
+class LNDHost(models.Model):
+    """A machine of the fleet which runs LND daemons.
+
+    Hosts register themselves and report their load when
+    the LND supervisor is running on them.
+    """
+    address = models.CharField(max_length=255, unique=True)
+    enabled = models.BooleanField(default=True)
+    running_daemons = models.PositiveIntegerField(default=0)
+    cpu_percent = models.FloatField(default=0)
+    memory_percent = models.FloatField(default=0)
+    last_heartbeat = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.address
+
+
+class PortAllocation(models.Model):
+    """The host and port slot of a wallet's LND daemon.
+
+    The host is the address of the LNDHost running the daemon. The
+    ports of the daemon are derived from the slot, see
+    backend.lnd.ports. Deleting the wallet frees the slot again.
+    """
+    wallet = models.OneToOneField(
+        LNDWallet, on_delete=models.CASCADE, related_name="port_allocation")
+    host = models.CharField(max_length=255, default="127.0.0.1")
+    slot = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = (("host", "slot"), )
 
 
 class IPAddress(models.Model):
@@ -0,0 +1,83 @@
+"""This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+Places new wallets on the least loaded host of the LND fleet.
+
+The LND supervisor of every host reports the number of running
+daemons and the CPU and memory usage of its host. New wallets are
+placed on the host with the lowest weighted load.
+"""
+import datetime
+
+from django.conf import settings
+from django.db.models import Count
+from django.utils import timezone
+
+from backend.lnd.models import LNDHost, LNDWallet, PortAllocation
+from backend.lnd.ports import allocate_ports, port_setting
+
+
+def placement_setting(name: str):
+    """Returns the value of the given LND_PLACEMENT setting"""
+    return settings.LND_PLACEMENT[name]
+
+
+def host_score(host: LNDHost, wallets: int) -> float:
+    """Returns the load score of the host, lower is better
+
+    host: the host to score
+    wallets: number of wallets assigned to the host
+    """
+    daemons = max(host.running_daemons, wallets)
+    daemon_load = 100.0 * daemons / port_setting("SLOTS_PER_HOST")
+    return (placement_setting("DAEMON_WEIGHT") * daemon_load +
+            placement_setting("CPU_WEIGHT") * host.cpu_percent +
+            placement_setting("MEMORY_WEIGHT") * host.memory_percent)
+
+
+def ranked_hosts() -> list:
+    """Returns the addresses of all usable hosts, least loaded first
+
+    Hosts are usable if they are enabled, have sent a heartbeat
+    recently and have a free slot. If no host is registered at all
+    the LND_PORTS["HOSTS"] setting is used.
+    """
+    if not LNDHost.objects.exists():
+        return list(port_setting("HOSTS"))
+
+    cutoff = timezone.now() - datetime.timedelta(
+        seconds=placement_setting("HEARTBEAT_TIMEOUT"))
+    hosts = LNDHost.objects.filter(enabled=True, last_heartbeat__gte=cutoff)
+
+    wallets = dict(
+        PortAllocation.objects.values_list("host").annotate(Count("id")))
+
+    scored = []
+    for host in hosts:
+        count = wallets.get(host.address, 0)
+        if count < port_setting("SLOTS_PER_HOST"):
+            scored.append((host_score(host, count), host.address))
+
+    return [address for _, address in sorted(scored)]
+
+
+def place_wallet(wallet: LNDWallet) -> PortAllocation:
+    """Assigns the wallet to the least loaded host
+
+    Raises:
+        backend.lnd.ports.PortAllocationError if no host has capacity
+    """
+    return allocate_ports(wallet, hosts=ranked_hosts())
+
+
+def report_host_load(address: str, running_daemons: int, cpu_percent: float,
+                     memory_percent: float) -> LNDHost:
+    """Stores the current load of a host, registering it if necessary"""
+    host, _ = LNDHost.objects.get_or_create(address=address)
+    host.running_daemons = running_daemons
+    host.cpu_percent = cpu_percent
+    host.memory_percent = memory_percent
+    host.last_heartbeat = timezone.now()
+    host.save()
+    return host
@@ -0,0 +1,192 @@
+"""This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+Allocates the listen, RPC and REST ports of the hosted LND daemons.
+
+Every wallet gets a slot on a host. The ports are derived from the
+slot, so the number of wallets a host can serve only depends on the
+configured port ranges and not on the primary keys of the wallets.
+Slots of deleted wallets are reused.
+
+The allocations never change once assigned, but deleted wallets free
+their slot. Every process keeps the allocations in memory for
+LND_PORTS["CACHE_TTL"] seconds after a lookup, see
+get_port_allocation().
+"""
+import collections
+import socket
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, transaction
+from django.db.models.signals import post_delete, post_save
+
+from backend.lnd.models import LNDWallet, PortAllocation
+
+LOCAL_HOSTS = ("127.0.0.1", "localhost", "::1")
+
+SlotPorts = collections.namedtuple('SlotPorts', [
+    "listen_port_ipv4",
+    "listen_port_ipv6",
+    "rpc_listen_port_ipv4",
+    "rpc_listen_port_ipv6",
+    "rest_port_ipv4",
+    "rest_port_ipv6",
+])
+
+
+# (allocation, expiry time) by wallet id
+_ALLOCATIONS = {}
+
+
+class PortAllocationError(Exception):
+    """Raised when no host has a free slot left"""
+
+
+def port_setting(name: str):
+    """Returns the value of the given LND_PORTS setting"""
+    return settings.LND_PORTS[name]
+
+
+def validate_port_ranges():
+    """Checks that the port ranges neither overlap nor exceed 65535
+
+    Raises:
+        ImproperlyConfigured if the LND_PORTS setting is invalid
+    """
+    slots = port_setting("SLOTS_PER_HOST")
+    ranges = sorted(
+        (port_setting(name), port_setting(name) + slots * 2, name)
+        for name in ("LISTEN_BASE", "RPC_BASE", "REST_BASE"))
+
+    for (_, end, name), (start, _, next_name) in zip(ranges, ranges[1:]):
+        if end >= start:
+            raise ImproperlyConfigured(
+                "LND_PORTS: {} range overlaps with the {} range".format(
+                    name, next_name))
+
+    if ranges[-1][1] > 65535:
+        raise ImproperlyConfigured(
+            "LND_PORTS: {} range exceeds port 65535".format(ranges[-1][2]))
+
+
+def slot_ports(slot: int) -> SlotPorts:
+    """Returns the ports belonging to the given slot"""
+    listen = port_setting("LISTEN_BASE")
+    rpc = port_setting("RPC_BASE")
+    rest = port_setting("REST_BASE")
+    return SlotPorts(
+        listen_port_ipv4=listen + slot * 2 - 1,
+        listen_port_ipv6=listen + slot * 2,
+        rpc_listen_port_ipv4=rpc + slot * 2 - 1,
+        rpc_listen_port_ipv6=rpc + slot * 2,
+        rest_port_ipv4=rest + slot * 2 - 1,
+        rest_port_ipv6=rest + slot * 2)
+
+
+def is_local_host(host: str) -> bool:
+    """Checks if the daemons of the host run on this machine"""
+    return host in LOCAL_HOSTS or host == settings.LND_HOST_ADDRESS
+
+
+def port_is_free(port: int) -> bool:
+    """Checks if the port can be bound on this machine"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        try:
+            sock.bind(("0.0.0.0", port))
+        except OSError:
+            return False
+    return True
+
+
+def slot_is_available(host: str, slot: int) -> bool:
+    """Checks that no other service uses a port of the slot
+
+    This can only be checked for the local host. Slots on
+    other hosts are considered to be available.
+    """
+    if not is_local_host(host):
+        return True
+    return all(port_is_free(port) for port in slot_ports(slot))
+
+
+def find_free_slot(host: str):
+    """Returns the lowest unassigned and available slot of the host
+    or None if the host is full"""
+    used = set(
+        PortAllocation.objects.filter(host=host).values_list(
+            "slot", flat=True))
+    for slot in range(1, port_setting("SLOTS_PER_HOST") + 1):
+        if slot not in used and slot_is_available(host, slot):
+            return slot
+    return None
+
+
+def allocate_ports(wallet: LNDWallet, hosts: list = None) -> PortAllocation:
+    """Assigns a slot to the wallet
+
+    The slot is taken from the first of the given hosts (default:
+    LND_PORTS["HOSTS"]) with a free slot. If the wallet already owns
+    a slot, the existing allocation is returned.
+
+    Raises:
+        PortAllocationError if all hosts are full
+    """
+    existing = PortAllocation.objects.filter(wallet=wallet).first()
+    if existing is not None:
+        return existing
+
+    validate_port_ranges()
+
+    if hosts is None:
+        hosts = port_setting("HOSTS")
+
+    for host in hosts:
+        # Another process might grab the same slot concurrently.
+        # The unique constraint catches this, just try again.
+        for _ in range(3):
+            slot = find_free_slot(host)
+            if slot is None:
+                break
+            try:
+                with transaction.atomic():
+                    return PortAllocation.objects.create(
+                        wallet=wallet, host=host, slot=slot)
+            except IntegrityError:
+                continue
+
+    raise PortAllocationError("No free LND slot left on any host")
+
+
+def get_port_allocation(wallet_id: int) -> PortAllocation:
+    """Returns the allocation of the wallet, allocating one if missing
+
+    The config of a wallet is built by most resolvers, often several
+    times per request, so the allocation is kept for
+    LND_PORTS["CACHE_TTL"] seconds. Changes made by this process are
+    seen right away, the other processes (web workers, supervisor,
+    Celery) see them once the cached allocation expires.
+    """
+    now = time.time()
+    allocation, expires = _ALLOCATIONS.get(wallet_id, (None, 0))
+    if allocation is None or expires <= now:
+        allocation = PortAllocation.objects.filter(
+            wallet_id=wallet_id).first()
+        if allocation is None:
+            allocation = allocate_ports(LNDWallet.objects.get(pk=wallet_id))
+        _ALLOCATIONS[wallet_id] = (allocation,
+                                   now + port_setting("CACHE_TTL"))
+    return allocation
+
+
+def _forget_allocation(sender, instance, **kwargs):
+    wallet_id = instance.pk if sender is LNDWallet else instance.wallet_id
+    _ALLOCATIONS.pop(wallet_id, None)
+
+
+# a new wallet might reuse the id of a deleted one
+post_save.connect(_forget_allocation, sender=LNDWallet)
+post_save.connect(_forget_allocation, sender=PortAllocation)
+post_delete.connect(_forget_allocation, sender=PortAllocation)
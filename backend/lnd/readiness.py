@@ -0,0 +1,137 @@
+"""This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+Waits for files and ports of a starting LND daemon.
+
+wait_for_file uses inotify on Linux, so the wait ends as soon as
+the file is written. On other systems, or if inotify is not
+available, the file is polled. All waits have a deadline.
+"""
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import socket
+import time
+
+LOGGER = logging.getLogger(__name__)
+
+POLL_INTERVAL = 0.5
+
+# from <sys/inotify.h>
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+
+def _load_libc():
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        libc.inotify_init1  # pylint: disable=W0104
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+LIBC = _load_libc()
+
+
+def file_is_ready(path: str) -> bool:
+    """Checks if the file exists and is not empty"""
+    try:
+        return os.stat(path).st_size > 0
+    except OSError:
+        return False
+
+
+def _existing_ancestor(path: str) -> str:
+    """Returns the closest directory of the path which already exists"""
+    directory = os.path.dirname(os.path.abspath(path))
+    while not os.path.isdir(directory):
+        directory = os.path.dirname(directory)
+    return directory
+
+
+def _poll_for_file(path: str, deadline: float) -> bool:
+    while not file_is_ready(path):
+        if time.time() >= deadline:
+            return False
+        time.sleep(POLL_INTERVAL)
+    return True
+
+
+def _inotify_wait_for_file(path: str, deadline: float) -> bool:
+    fd = LIBC.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+    if fd < 0:
+        raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    try:
+        watched = {}
+        while True:
+            # The directories of a new daemon are created while we wait,
+            # so always watch the closest existing directory of the path.
+            directory = _existing_ancestor(path)
+            if directory not in watched:
+                wd = LIBC.inotify_add_watch(fd, directory.encode(),
+                                            WATCH_MASK)
+                if wd < 0:
+                    raise OSError(ctypes.get_errno(),
+                                  "inotify_add_watch failed")
+                watched[directory] = wd
+
+            # check after adding the watch to not miss a write in between
+            if file_is_ready(path):
+                return True
+
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+
+            readable, _, _ = select.select([fd], [], [], remaining)
+            if readable:
+                try:
+                    # the events themselves don't matter, just drain them
+                    os.read(fd, 4096)
+                except OSError as exc:
+                    if exc.errno != errno.EAGAIN:
+                        raise
+    finally:
+        os.close(fd)
+
+
+def wait_for_file(path: str, timeout: float) -> bool:
+    """Waits until the file exists and has content
+
+    Returns:
+        True if the file is ready within the timeout
+    """
+    deadline = time.time() + timeout
+    if LIBC is not None:
+        try:
+            return _inotify_wait_for_file(path, deadline)
+        except OSError as exc:
+            LOGGER.warning("inotify unavailable, polling %s: %s", path, exc)
+    return _poll_for_file(path, deadline)
+
+
+def wait_for_port(port: int, timeout: float, host: str = "127.0.0.1") -> bool:
+    """Waits until the given port accepts TCP connections
+
+    Returns:
+        True if the port opened within the timeout
+    """
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(POLL_INTERVAL)
+    return False
@@ -0,0 +1,47 @@
+"""This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+Lazy access to the generated gRPC modules of LND.
+
+Importing rpc_pb2 builds the descriptors of the whole LND API, which
+is a noticeable share of the startup of every web, ASGI and Celery
+worker, even of the ones which never talk to LND. The modules here
+stand in for the generated modules and import them on the first
+attribute access:
+
+    from backend.lnd.rpc import ln, lnrpc
+
+    request = ln.GetInfoRequest()  # imports rpc_pb2
+
+The descriptions of the RPCs used in the schema are precomputed in
+backend.lnd.rpc_descriptions, see rpc_description().
+"""
+
+import importlib
+import types
+
+from backend.lnd.rpc_descriptions import DESCRIPTIONS
+
+
+class LazyModule(types.ModuleType):
+    """Imports the named module on the first attribute access"""
+
+    def __getattr__(self, name: str):
+        # the attributes are looked up on the module every time,
+        # so patching the module in tests works as usual
+        return getattr(importlib.import_module(self.__name__), name)
+
+    def __repr__(self):
+        return "<lazy module {!r}>".format(self.__name__)
+
+
+ln = LazyModule("backend.lnd.rpc_pb2")
+lnrpc = LazyModule("backend.lnd.rpc_pb2_grpc")
+
+
+def rpc_description(name: str) -> str:
+    """Returns the description of an RPC, e.g. Lightning.ListPayments,
+    without importing the generated modules"""
+    return DESCRIPTIONS[name]
+
@@ -0,0 +1,417 @@
+"""This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+All unary gRPC calls to LND go through the LndClient.
+
+Within one GraphQL request the same RPC is often issued more than
+once, e.g. lnListPeers calls ListChannels to compute hasChannel and
+the query might select lnListChannels as well. The client memoizes
+the responses of read only RPCs per request, keyed by wallet, method
+and the serialized request. Calls which change the state of the
+node are never memoized and drop the memoized responses of the
+wallet.
+
+The responses of frequently polled RPCs like GetInfo are shared
+across requests in the Django cache for a few seconds, see
+LND_RPC["SHARED_CACHE_TTL"]. Calls which change the state of the
+node and the events of the subscriptions invalidate them.
+
+Each wallet has a WalletGateway which limits the number of calls in
+flight, applies per method deadlines and stops calling a daemon
+that keeps failing for a cooldown (circuit breaker). The deadlines
+are shortened to the remaining LND time budget of the GraphQL
+request, see start_request_budget().
+"""
+
+import hashlib
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import grpc
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+
+from backend.lnd.rpc import ln, lnrpc
+from backend.lnd.utils import ChannelData, rpc_deadline
+from backend.request_cache import RequestCache, request_cache
+from backend.slow_log import OperationLog, operation_log
+from backend.tracing import wrap
+
+# RPCs without side effects, their responses may be shared
+READ_ONLY_METHODS = frozenset([
+    "ChannelBalance",
+    "DecodePayReq",
+    "GetInfo",
+    "GetTransactions",
+    "ListChannels",
+    "ListInvoices",
+    "ListPayments",
+    "ListPeers",
+    "WalletBalance",
+])
+
+_PREFETCH_EXECUTOR = ThreadPoolExecutor(
+    max_workers=settings.LND_RPC["PREFETCH_WORKERS"],
+    thread_name_prefix="lnd-prefetch")
+
+# Shared responses outdated by the events of the subscriptions
+INVOICE_SETTLED = ("ChannelBalance", "ListChannels")
+CHANNEL_UPDATE = ("ChannelBalance", "GetInfo", "ListChannels",
+                  "WalletBalance")
+TRANSACTION = ("WalletBalance", )
+
+# Shared responses which are currently fetched by this process.
+# Concurrent requests for the same response wait for the first one.
+_IN_FLIGHT = RequestCache()
+
+# Errors which count as a failure of the daemon
+BREAKER_CODES = (grpc.StatusCode.UNAVAILABLE,
+                 grpc.StatusCode.DEADLINE_EXCEEDED)
+
+_GATEWAYS = {}
+_GATEWAYS_LOCK = threading.Lock()
+
+
+class RequestBudgetExceeded(grpc.RpcError):
+    """Raised instead of calling LND when the request has no time left
+
+    Behaves like a call which failed with DEADLINE_EXCEEDED, so the
+    resolvers report it like any other failed call.
+    """
+
+    def code(self):
+        return grpc.StatusCode.DEADLINE_EXCEEDED
+
+    def details(self):
+        return "Time budget of the request exceeded"
+
+
+class WalletUnavailable(Exception):
+    """Raised instead of calling a daemon which failed repeatedly
+    or is busy with too many calls
+
+    The graphene middleware WalletUnavailableMiddleware turns it
+    into a WalletInstanceNotRunning response.
+    """
+
+
+def rpc_setting(name: str):
+    """Returns the value of the given LND_RPC setting"""
+    return settings.LND_RPC[name]
+
+
+def start_request_budget(context):
+    """Starts the LND time budget of the GraphQL request
+
+    All calls issued with the context must finish within
+    LND_RPC["REQUEST_BUDGET"] seconds from now.
+    """
+    context.lnd_deadline = time.time() + rpc_setting("REQUEST_BUDGET")
+
+
+class WalletGateway():
+    """Guards the gRPC calls to the daemon of one wallet
+
+    At most MAX_IN_FLIGHT calls run at the same time, further calls
+    wait up to QUEUE_TIMEOUT seconds for a free slot. After
+    BREAKER_THRESHOLD consecutive UNAVAILABLE or DEADLINE_EXCEEDED
+    errors the breaker opens and calls fail immediately for
+    BREAKER_COOLDOWN seconds. After the cooldown a single call
+    probes the daemon while the others still fail, if the probe
+    fails the breaker opens again.
+    """
+
+    def __init__(self, max_in_flight: int):
+        self.failures = 0
+        self.open_until = 0.0
+        self.probing = False
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+
+    def is_open(self) -> bool:
+        return time.time() < self.open_until
+
+    def _admit(self) -> bool:
+        """Returns whether the call is the probe of the daemon
+
+        Raises:
+            WalletUnavailable if the breaker refuses the call
+        """
+        with self._lock:
+            if self.open_until == 0.0:
+                return False
+            if self.probing or time.time() < self.open_until:
+                raise WalletUnavailable()
+            self.probing = True
+            return True
+
+    def _end_probe(self):
+        with self._lock:
+            self.probing = False
+
+    def call(self,
+             rpc,
+             method: str,
+             request,
+             metadata,
+             timeout: float = None,
+             breaker=True):
+        """Calls the rpc with the deadline of the method
+
+        timeout: shorter deadline in seconds, e.g. the remaining time
+                 of the request. A call running into it is not
+                 counted as a failure of the daemon.
+        breaker: whether failures count towards the circuit breaker
+                 and calls are refused while it is open
+
+        Raises:
+            WalletUnavailable, grpc.RpcError
+        """
+        probe = breaker and self._admit()
+        try:
+            return self._call(rpc, method, request, metadata, timeout,
+                              breaker)
+        finally:
+            if probe:
+                self._end_probe()
+
+    def _call(self, rpc, method, request, metadata, timeout, breaker):
+        if not self._slots.acquire(timeout=rpc_setting("QUEUE_TIMEOUT")):
+            raise WalletUnavailable()
+
+        deadline = rpc_deadline(method)
+        if timeout is None or timeout > deadline:
+            timeout = deadline
+
+        try:
+            response = rpc(request, metadata=metadata, timeout=timeout)
+        except grpc.RpcError as exc:
+            code = exc.code() if callable(getattr(exc, "code", None)) else None
+            if timeout < deadline and \
+                    code == grpc.StatusCode.DEADLINE_EXCEEDED:
+                # the request ran out of time, not the daemon
+                code = None
+            if breaker and code in BREAKER_CODES:
+                self._record_failure()
+            raise
+        finally:
+            self._slots.release()
+
+        self._record_success()
+        return response
+
+    def _record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= rpc_setting("BREAKER_THRESHOLD"):
+                self.open_until = time.time() + rpc_setting(
+                    "BREAKER_COOLDOWN")
+
+    def _record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.open_until = 0.0
+
+
+def wallet_gateway(wallet_pk: int) -> WalletGateway:
+    """Returns the gateway of the wallet"""
+    with _GATEWAYS_LOCK:
+        gateway = _GATEWAYS.get(wallet_pk)
+        if gateway is None:
+            gateway = WalletGateway(rpc_setting("MAX_IN_FLIGHT"))
+            _GATEWAYS[wallet_pk] = gateway
+        return gateway
+
+
+def request_key(request):
+    """Returns the serialized request or None if the
+    request is not a protobuf message"""
+    try:
+        return request.SerializeToString(deterministic=True)
+    except (AttributeError, TypeError):
+        return None
+
+
+def _shared_ttl(method: str):
+    return settings.LND_RPC["SHARED_CACHE_TTL"].get(method)
+
+
+def _version_key(wallet_pk: int, method: str) -> str:
+    return "lnd_rpc_version_{}_{}".format(wallet_pk, method)
+
+
+def _response_class(method: str):
+    service = ln.DESCRIPTOR.services_by_name["Lightning"]
+    return getattr(ln, service.methods_by_name[method].output_type.name)
+
+
+def shared_cache_key(wallet_pk: int, method: str, key: bytes) -> str:
+    """Returns the Django cache key of a shared response
+
+    Every wallet and method has a random version which is replaced
+    when the responses are invalidated.
+    """
+    version = cache.get_or_set(
+        _version_key(wallet_pk, method), lambda: uuid.uuid4().hex, None)
+    return "lnd_rpc_{}_{}_{}_{}".format(wallet_pk, method, version,
+                                        hashlib.sha256(key).hexdigest())
+
+
+def invalidate_shared_responses(wallet_pk: int, methods=None):
+    """Drops the shared responses of the wallet
+
+    methods: the RPCs to invalidate, defaults to all shared RPCs
+    """
+    if methods is None:
+        methods = settings.LND_RPC["SHARED_CACHE_TTL"].keys()
+    cache.set_many(
+        {
+            _version_key(wallet_pk, method): uuid.uuid4().hex
+            for method in methods
+        }, None)
+
+
+class LndClient():
+    """Issues the gRPC calls of one request to one wallet
+
+    Use lnd_client() to get an instance.
+    """
+
+    def __init__(self,
+                 memo: RequestCache,
+                 wallet_pk: int,
+                 channel_data: ChannelData,
+                 breaker: bool = True,
+                 deadline: float = None,
+                 log: OperationLog = None):
+        self.memo = memo
+        self.wallet_pk = wallet_pk
+        self.channel_data = channel_data
+        self.breaker = breaker
+        self.deadline = deadline
+        self.log = log
+
+    def call(self, method: str, request, stub=None, memoize: bool = True):
+        """Calls the RPC and returns the response
+
+        method: name of the RPC, e.g. "GetInfo"
+        request: the request message
+        stub: the stub class, defaults to the LightningStub
+        memoize: False for large responses which are used only once,
+                 e.g. the pages of an export
+
+        Raises:
+            grpc.RpcError just like the stub does,
+                RequestBudgetExceeded if the request has no time left
+            WalletUnavailable if the daemon is not called at all
+        """
+        stub = stub or lnrpc.LightningStub
+        key = request_key(request)
+
+        if method not in READ_ONLY_METHODS or key is None or not memoize:
+            try:
+                return self._invoke(stub, method, request)
+            finally:
+                if method not in READ_ONLY_METHODS:
+                    self.forget()
+
+        return self.memo.get_or_compute(
+            ("rpc", self.wallet_pk, stub.__name__, method, key),
+            lambda: self._shared_call(stub, method, request, key))
+
+    def prefetch(self, method: str, request, stub=None) -> Future:
+        """Starts the call in the background
+
+        A later call() with the same arguments waits for the
+        prefetched response instead of issuing the RPC again.
+        """
+        return _PREFETCH_EXECUTOR.submit(
+            wrap(self._prefetched_call), method, request, stub)
+
+    def _prefetched_call(self, method: str, request, stub):
+        try:
+            return self.call(method, request, stub)
+        finally:
+            # the pool threads outlive the requests, so nothing else
+            # closes their database connections
+            close_old_connections()
+
+    def forget(self):
+        """Drops all memoized and shared responses of the wallet"""
+        self.memo.discard(lambda key: key[:2] == ("rpc", self.wallet_pk))
+        invalidate_shared_responses(self.wallet_pk)
+
+    def _shared_call(self, stub, method: str, request, key: bytes):
+        ttl = _shared_ttl(method)
+        if ttl is None or stub is not lnrpc.LightningStub:
+            return self._invoke(stub, method, request)
+
+        cache_key = shared_cache_key(self.wallet_pk, method, key)
+        data = cache.get(cache_key)
+        if data is None:
+            data = _IN_FLIGHT.get_or_compute(
+                cache_key,
+                lambda: self._fetch_shared(stub, method, request, cache_key,
+                                           ttl),
+                cache_if=lambda data: False)
+        return _response_class(method).FromString(data)
+
+    def _fetch_shared(self, stub, method: str, request, cache_key: str,
+                      ttl) -> bytes:
+        data = self._invoke(stub, method, request).SerializeToString()
+        cache.set(cache_key, data, ttl)
+        return data
+
+    def _invoke(self, stub, method: str, request):
+        timeout = None
+        if self.deadline is not None:
+            timeout = self.deadline - time.time()
+            if timeout <= 0:
+                raise RequestBudgetExceeded()
+
+        metadata = None
+        if self.channel_data.macaroon:
+            metadata = [("macaroon", self.channel_data.macaroon)]
+        rpc = getattr(stub(self.channel_data.channel), method)
+        if self.log is None:
+            return wallet_gateway(self.wallet_pk).call(
+                rpc, method, request, metadata, timeout, breaker=self.breaker)
+
+        start = time.perf_counter()
+        code = "OK"
+        try:
+            return wallet_gateway(self.wallet_pk).call(
+                rpc, method, request, metadata, timeout, breaker=self.breaker)
+        except WalletUnavailable:
+            code = "WALLET_UNAVAILABLE"
+            raise
+        except grpc.RpcError as exc:
+            code = exc.code().name if callable(getattr(
+                exc, "code", None)) else "UNKNOWN"
+            raise
+        finally:
+            self.log.add_rpc(self.wallet_pk, method, code, start)
+
+
+def lnd_client(context,
+               wallet_pk: int,
+               channel_data: ChannelData,
+               breaker: bool = True) -> LndClient:
+    """Returns a client for the wallet
+
+    context: the GraphQL context, responses are shared by all
+             resolvers of the request. Without a context nothing
+             is shared. The calls share the time budget of the
+             context if one was started and are added to its
+             operation log.
+    breaker: False for calls which expect the daemon to be
+             unavailable for a while, e.g. right after its start
+    """
+    memo = RequestCache() if context is None else request_cache(context)
+    deadline = getattr(context, "lnd_deadline", None)
+    return LndClient(memo, wallet_pk, channel_data, breaker, deadline,
+                     operation_log(context))
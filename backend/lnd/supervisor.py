@@ -0,0 +1,321 @@
+"""This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+Supervises all LND daemons hosted on this machine.
+
+The supervisor boots the daemons of all initialized wallets,
+restarts crashed daemons with an exponential backoff, stops the
+daemons of idle wallets and reports the resource usage of every
+daemon. Run it with
+./manage.py lnd_supervisor
+"""
+import collections
+import logging
+import os
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import psutil
+from django.conf import settings
+from django.db import close_old_connections
+
+from backend.lnd.hibernation import (hibernation_setting, idle_wallets,
+                                     stop_daemon)
+from backend.lnd.models import LNDWallet
+from backend.lnd.placement import report_host_load
+from backend.lnd.ports import LOCAL_HOSTS, is_local_host
+from backend.lnd.readiness import wait_for_port
+from backend.lnd.utils import (build_lnd_wallet_config, find_lnd_process,
+                               lnd_processes, spawn_lnd_process)
+
+LOGGER = logging.getLogger(__name__)
+
+DaemonStats = collections.namedtuple(
+    'DaemonStats', ['wallet_id', 'pid', 'cpu_percent', 'rss', 'restarts'])
+
+
+def supervisor_setting(name: str):
+    """Returns the value of the given LND_SUPERVISOR setting"""
+    return settings.LND_SUPERVISOR[name]
+
+
+def restart_backoff(failures: int) -> float:
+    """Returns the number of seconds to wait before the next restart
+
+    failures: number of restarts since the daemon was last stable
+    """
+    base = supervisor_setting("RESTART_BACKOFF_BASE")
+    maximum = supervisor_setting("RESTART_BACKOFF_MAX")
+    return min(base * (2**failures), maximum)
+
+
+class ManagedDaemon():
+    """Bookkeeping for a single LND daemon
+
+    The process is either a child of the supervisor (a subprocess.Popen)
+    or a daemon started by another process which has been adopted.
+    """
+
+    def __init__(self, wallet_id: int, process, args=None, cwd=None):
+        self.wallet_id = wallet_id
+        self.args = args
+        self.cwd = cwd
+        self.restarts = 0
+        self.failures = 0
+        self.started_at = time.time()
+        self.restart_at = None
+        self._set_process(process)
+
+    def _set_process(self, process):
+        self.popen = process if isinstance(process, subprocess.Popen) else None
+        self.process = psutil.Process(process.pid)
+        if self.args is None:
+            self.args = self.process.cmdline()
+            self.cwd = self.process.cwd()
+        # prime the cpu counter, the first call always returns 0.0
+        self.process.cpu_percent(interval=None)
+
+    def is_alive(self) -> bool:
+        if self.popen is not None:
+            # poll() also reaps the zombie of an exited child
+            return self.popen.poll() is None
+        try:
+            return self.process.is_running(
+            ) and self.process.status() != psutil.STATUS_ZOMBIE
+        except psutil.NoSuchProcess:
+            return False
+
+    def respawn(self):
+        process = subprocess.Popen(
+            self.args, cwd=self.cwd, preexec_fn=os.setpgrp)
+        self.restarts += 1
+        self.restart_at = None
+        self.started_at = time.time()
+        self._set_process(process)
+
+    def adopt(self, process):
+        """Replaces the crashed process with one started by someone else"""
+        self.restart_at = None
+        self.started_at = time.time()
+        self._set_process(process)
+
+    def shutdown(self, graceful: bool, timeout: float):
+        """Waits for the daemon to exit
+
+        graceful: the daemon was already asked to shut down, otherwise
+                  it is terminated. Killed if still alive after timeout.
+        """
+        try:
+            if not graceful:
+                self.process.terminate()
+            self.process.wait(timeout=timeout)
+        except psutil.TimeoutExpired:
+            self.process.kill()
+        except psutil.NoSuchProcess:
+            pass
+
+    def stats(self) -> DaemonStats:
+        try:
+            with self.process.oneshot():
+                cpu = self.process.cpu_percent(interval=None)
+                rss = self.process.memory_info().rss
+        except psutil.NoSuchProcess:
+            cpu, rss = 0.0, 0
+        return DaemonStats(
+            wallet_id=self.wallet_id,
+            pid=self.process.pid,
+            cpu_percent=cpu,
+            rss=rss,
+            restarts=self.restarts)
+
+
+class LNDSupervisor():
+    """Owns all LND daemons of this host
+
+    host_address: the address of this host in the LND fleet
+                  (default: settings.LND_HOST_ADDRESS)
+    """
+
+    def __init__(self, parallelism: int = None, host_address: str = None):
+        self.parallelism = parallelism or supervisor_setting(
+            "BOOT_PARALLELISM")
+        self.host_address = host_address or settings.LND_HOST_ADDRESS
+        self.daemons = {}
+
+    def host_wallets(self):
+        """Returns the wallets placed on this host"""
+        addresses = {self.host_address}
+        if is_local_host(self.host_address):
+            addresses.update(LOCAL_HOSTS)
+        return LNDWallet.objects.filter(port_allocation__host__in=addresses)
+
+    def boot(self):
+        """Starts the daemons of all initialized wallets
+
+        At most self.parallelism daemons are booted at the same time.
+        A boot is finished once the daemon accepts RPC connections.
+        """
+        wallets = list(self.host_wallets().filter(
+            initialized=True, stopped_by_owner=False, hibernated=False))
+
+        LOGGER.info("Booting %s LND daemons, %s at a time", len(wallets),
+                    self.parallelism)
+        with ThreadPoolExecutor(max_workers=self.parallelism) as executor:
+            list(executor.map(self._boot_wallet, wallets))
+
+    def _boot_wallet(self, wallet: LNDWallet):
+        try:
+            cfg = build_lnd_wallet_config(wallet.pk)
+            proc = find_lnd_process(cfg)
+            if proc is not None:
+                LOGGER.info("Adopting running daemon of wallet %s (pid %s)",
+                            wallet.pk, proc.pid)
+                self.daemons[wallet.pk] = ManagedDaemon(wallet.pk, proc)
+                return
+
+            self.daemons[wallet.pk] = ManagedDaemon(
+                wallet.pk, spawn_lnd_process(wallet.autopilot, wallet))
+            if not wait_for_port(cfg.rpc_listen_port_ipv4,
+                                 supervisor_setting("BOOT_TIMEOUT"),
+                                 host=cfg.rpc_server):
+                LOGGER.warning("Daemon of wallet %s did not open its RPC port",
+                               wallet.pk)
+        except Exception as exc:
+            LOGGER.exception("Unable to boot daemon of wallet %s: %s",
+                             wallet.pk, exc)
+        finally:
+            close_old_connections()
+
+    def adopt_new_daemons(self, start_new_wallets: bool = False):
+        """Picks up daemons which were started outside of the supervisor,
+        for example by the startDaemon mutation
+
+        start_new_wallets: also start the daemons of new and woken up
+                           wallets which are not running yet, for
+                           example if they were placed on this host or
+                           woken up by another machine
+        """
+        processes = lnd_processes()
+        wallets = self.host_wallets().exclude(
+            pk__in=list(self.daemons.keys()))
+        for wallet in wallets:
+            proc = processes.get(build_lnd_wallet_config(wallet.pk).data_dir)
+            if proc is not None:
+                LOGGER.info("Adopting daemon of wallet %s (pid %s)",
+                            wallet.pk, proc.pid)
+                self.daemons[wallet.pk] = ManagedDaemon(wallet.pk, proc)
+            elif (start_new_wallets and not wallet.stopped_by_owner
+                  and not wallet.hibernated):
+                LOGGER.info("Starting daemon of wallet %s", wallet.pk)
+                try:
+                    self.daemons[wallet.pk] = ManagedDaemon(
+                        wallet.pk, spawn_lnd_process(wallet.autopilot, wallet))
+                except OSError as exc:
+                    LOGGER.exception("Unable to start daemon of wallet %s: %s",
+                                     wallet.pk, exc)
+
+    def check(self):
+        """Restarts crashed daemons and forgets the intentionally stopped"""
+        now = time.time()
+        for wallet_id, daemon in list(self.daemons.items()):
+            if daemon.is_alive():
+                if now - daemon.started_at >= supervisor_setting(
+                        "STABLE_AFTER"):
+                    daemon.failures = 0
+                continue
+
+            wallet = LNDWallet.objects.filter(pk=wallet_id).first()
+            if wallet is None or wallet.stopped_by_owner or wallet.hibernated:
+                LOGGER.info("Daemon of wallet %s was stopped", wallet_id)
+                del self.daemons[wallet_id]
+                continue
+
+            # a woken up wallet might have been started by the API server
+            proc = find_lnd_process(build_lnd_wallet_config(wallet_id))
+            if proc is not None:
+                LOGGER.info("Adopting daemon of wallet %s (pid %s)",
+                            wallet_id, proc.pid)
+                daemon.adopt(proc)
+                continue
+
+            if daemon.restart_at is None:
+                delay = restart_backoff(daemon.failures)
+                daemon.restart_at = now + delay
+                LOGGER.warning(
+                    "Daemon of wallet %s crashed, restarting in %s seconds",
+                    wallet_id, delay)
+            elif now >= daemon.restart_at:
+                daemon.failures += 1
+                try:
+                    daemon.respawn()
+                except OSError as exc:
+                    LOGGER.exception(
+                        "Unable to restart daemon of wallet %s: %s",
+                        wallet_id, exc)
+                    daemon.restart_at = None
+
+    def hibernate_idle(self):
+        """Stops the daemons of all idle wallets gracefully"""
+        wallets = idle_wallets(
+            LNDWallet.objects.filter(pk__in=list(self.daemons.keys())))
+        for wallet in wallets:
+            # skip the wallet if it became active in the meantime
+            if not idle_wallets(LNDWallet.objects.filter(pk=wallet.pk)).update(
+                    hibernated=True):
+                continue
+
+            LOGGER.info("Wallet %s is idle, stopping its daemon", wallet.pk)
+            daemon = self.daemons.pop(wallet.pk)
+            # locked daemons don't serve StopDaemon, they get terminated
+            graceful = stop_daemon(build_lnd_wallet_config(wallet.pk))
+            daemon.shutdown(graceful, hibernation_setting("STOP_TIMEOUT"))
+
+    def stats(self) -> list:
+        """Returns the DaemonStats of all running daemons"""
+        return [
+            daemon.stats() for daemon in self.daemons.values()
+            if daemon.is_alive()
+        ]
+
+    def log_stats(self):
+        for stat in self.stats():
+            LOGGER.info("wallet %s pid %s: cpu %.1f%% rss %.1f MiB "
+                        "restarts %s", stat.wallet_id, stat.pid,
+                        stat.cpu_percent, stat.rss / 1024 / 1024,
+                        stat.restarts)
+
+    def report_load(self):
+        """Reports the load of this host for the placement of new wallets"""
+        report_host_load(
+            self.host_address,
+            running_daemons=len(self.stats()),
+            cpu_percent=psutil.cpu_percent(interval=None),
+            memory_percent=psutil.virtual_memory().percent)
+
+    def run(self, boot: bool = True):
+        """Runs the supervisor until it is interrupted"""
+        if boot:
+            self.boot()
+
+        interval = supervisor_setting("POLL_INTERVAL")
+        stats_interval = supervisor_setting("STATS_INTERVAL")
+        last_stats = 0
+        while True:
+            # a database error or a daemon exiting in the middle of an
+            # iteration must not end the supervision of all daemons
+            try:
+                self.adopt_new_daemons(start_new_wallets=True)
+                self.check()
+                self.hibernate_idle()
+                if time.time() - last_stats >= stats_interval:
+                    self.log_stats()
+                    self.report_load()
+                    last_stats = time.time()
+            except Exception as exc:
+                LOGGER.exception("Supervision failed, retrying in %s "
+                                 "seconds: %s", interval, exc)
+            close_old_connections()
+            time.sleep(interval)
+
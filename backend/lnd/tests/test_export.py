@@ -0,0 +1,171 @@
+"""This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+# pylint: skip-file
+import csv
+import io
+import json
+import logging
+
+import pytest
+from mixer.backend.django import mixer
+
+from backend.lnd import export, rpc_client, utils, views
+from backend.lnd.export import (chunks, export_fields, export_rows,
+                                render_csv, render_ndjson)
+from backend.lnd.fake_lnd import FakeLnd, FakeLndOptions
+from backend.lnd.models import LNDWallet
+from backend.lnd.rpc_client import lnd_client
+from backend.lnd.utils import build_grpc_channel_manual
+
+
+@pytest.fixture(autouse=True)
+def lnd_export(settings):
+    settings.LND_RPC = dict(settings.LND_RPC, SHARED_CACHE_TTL={})
+    settings.LND_EXPORT = dict(settings.LND_EXPORT, PAGE_SIZE=10)
+    rpc_client._GATEWAYS.clear()
+    yield
+    rpc_client._GATEWAYS.clear()
+
+
+@pytest.fixture
+def node(tmp_path):
+    node = FakeLnd(
+        str(tmp_path),
+        options=FakeLndOptions(
+            channels=0, peers=0, payments=25, invoices=25, transactions=7))
+    node.start()
+    channel_data = build_grpc_channel_manual(
+        "localhost", node.port, node.tls_cert_path, node.admin_macaroon_path)
+    yield node, channel_data
+    channel_data.channel.close()
+    node.stop()
+    # grpc fails to collect channels left over at exit
+    utils.CHANNEL_CACHE._cache.clear()
+
+
+def test_export_rows(node, monkeypatch):
+    node, channel_data = node
+    client = lnd_client(None, 1, channel_data)
+    calls = []
+    call = client.call
+
+    def counting_call(method, request, **kwargs):
+        calls.append(method)
+        return call(method, request, **kwargs)
+
+    monkeypatch.setattr(client, "call", counting_call)
+
+    rows = export_rows(client, "invoices")
+    # the first page is fetched right away
+    assert calls == ["ListInvoices"]
+    invoices = list(rows)
+    assert [int(invoice["add_index"]) for invoice in invoices] == \
+        list(range(1, 26))
+    assert calls == ["ListInvoices"] * 4
+
+    payments = list(export_rows(client, "payments"))
+    assert len(payments) == 25
+    assert set(payments[0]) == set(export_fields("payments"))
+    assert len(list(export_rows(client, "transactions"))) == 7
+
+    # the pages are not memoized
+    assert len(client.memo._values) == 0
+
+
+def test_render():
+    fields = ["memo", "value", "route_hints"]
+    rows = [{
+        "memo": "a, b",
+        "value": "1",
+        "route_hints": [{
+            "hop_hints": []
+        }]
+    }, {
+        "memo": "c"
+    }]
+
+    lines = list(render_ndjson(fields, rows))
+    assert [json.loads(line) for line in lines] == rows
+
+    lines = list(render_csv(fields, rows))
+    assert len(lines) == 3
+    assert list(csv.reader(io.StringIO("".join(lines)))) == [
+        fields, ["a, b", "1", '[{"hop_hints": []}]'], ["c", "", ""]
+    ]
+
+    assert list(chunks(["ab", "c", "de", "f"], 3)) == [b"abc", b"def"]
+    assert list(chunks(["ab", "cd", "e"], 3)) == [b"abcd", b"e"]
+    # the size is measured after encoding
+    assert list(chunks(["\u00e4", "b", "c"], 3)) == [b"\xc3\xa4b", b"c"]
+
+
+def test_view(client, db, node, monkeypatch):
+    node, channel_data = node
+    assert client.get("/export/payments/").status_code == 401
+
+    user = mixer.blend("auth.User")
+    client.force_login(user)
+    assert client.get("/export/payments/").status_code == 404
+    mixer.blend(LNDWallet, owner=user)
+    monkeypatch.setattr(views, "build_grpc_channel_manual",
+                        lambda **kwargs: channel_data)
+
+    response = client.get("/export/invoices/")
+    assert response.status_code == 200
+    assert response["Content-Type"] == "application/x-ndjson"
+    lines = b"".join(response.streaming_content).decode().splitlines()
+    assert len(lines) == 25
+    assert json.loads(lines[0])["add_index"] == "1"
+
+    response = client.get("/export/transactions/", {"format": "csv"})
+    assert response["Content-Disposition"] == \
+        "attachment; filename=transactions.csv"
+    rows = list(
+        csv.reader(
+            io.StringIO(b"".join(response.streaming_content).decode())))
+    assert rows[0] == export_fields("transactions")
+    assert len(rows) == 8
+
+    assert client.get("/export/peers/").status_code == 404
+    assert client.get("/export/payments/", {
+        "format": "xml"
+    }).status_code == 400
+
+    node.options = node.options._replace(
+        error_rate=1.0, error_code="INTERNAL")
+    response = client.get("/export/payments/")
+    assert response.status_code == 502
+    assert "INTERNAL" in response.json()["error_message"]
+
+
+def test_view_reports_failing_pages(client, db, node, monkeypatch, caplog):
+    node, channel_data = node
+    user = mixer.blend("auth.User")
+    client.force_login(user)
+    mixer.blend(LNDWallet, owner=user)
+    monkeypatch.setattr(views, "build_grpc_channel_manual",
+                        lambda **kwargs: channel_data)
+    monkeypatch.setattr(export, "LOGGER", logging.getLogger("test_export"))
+
+    def fail_later_pages(path, params=None):
+        node.options = node.options._replace(error_rate=0.0)
+        response = client.get(path, params)
+        assert response.status_code == 200
+        # the first page is fetched, the second one fails
+        node.options = node.options._replace(
+            error_rate=1.0, error_code="INTERNAL")
+        return b"".join(response.streaming_content).decode()
+
+    lines = fail_later_pages("/export/invoices/").splitlines()
+    assert len(lines) == 11
+    assert json.loads(lines[9])["add_index"] == "10"
+    assert "INTERNAL" in json.loads(lines[-1])["error_message"]
+    assert "Export of invoices failed" in caplog.text
+
+    rows = list(
+        csv.reader(
+            io.StringIO(
+                fail_later_pages("/export/invoices/", {"format": "csv"}))))
+    assert len(rows) == 11
@@ -0,0 +1,190 @@
+"""This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+# pylint: skip-file
+import time
+from types import SimpleNamespace
+
+import grpc
+import pytest
+
+import backend.lnd.rpc_pb2 as ln
+import backend.lnd.rpc_pb2_grpc as lnrpc
+from backend.lnd import fake_lnd, rpc_client, utils
+from backend.lnd.fake_lnd import FakeLnd, FakeLndData, FakeLndOptions
+from backend.lnd.rpc_client import lnd_client
+from backend.lnd.utils import ChannelData, build_grpc_channel_manual
+
+
+@pytest.fixture(autouse=True)
+def lnd_rpc(settings):
+    settings.LND_RPC = dict(settings.LND_RPC, SHARED_CACHE_TTL={})
+    rpc_client._GATEWAYS.clear()
+    yield
+    rpc_client._GATEWAYS.clear()
+
+
+@pytest.fixture
+def start_node(tmp_path):
+    nodes = []
+
+    def start(**options):
+        node = FakeLnd(str(tmp_path), options=FakeLndOptions(**options))
+        node.start()
+        channel_data = build_grpc_channel_manual(
+            "localhost", node.port, node.tls_cert_path,
+            node.admin_macaroon_path)
+        assert channel_data.error is None
+        nodes.append((node, channel_data.channel))
+        return node, channel_data
+
+    yield start
+
+    for node, channel in nodes:
+        channel.close()
+        node.stop()
+    # grpc fails to collect channels left over at exit
+    utils.CHANNEL_CACHE._cache.clear()
+
+
+def test_serves_synthetic_data(start_node):
+    node, channel_data = start_node(
+        channels=5, peers=3, payments=250, invoices=30, transactions=7)
+    client = lnd_client(None, 1, channel_data)
+
+    info = client.call("GetInfo", ln.GetInfoRequest())
+    assert info.identity_pubkey == node.data.identity_pubkey
+    assert info.num_active_channels + info.num_inactive_channels == 5
+    assert info.num_peers == 3
+
+    assert len(client.call("ListChannels",
+                           ln.ListChannelsRequest()).channels) == 5
+    assert len(client.call("ListPayments",
+                           ln.ListPaymentsRequest()).payments) == 250
+    assert len(client.call("GetTransactions",
+                           ln.GetTransactionsRequest()).transactions) == 7
+
+    page = client.call(
+        "ListInvoices",
+        ln.ListInvoiceRequest(num_max_invoices=10, index_offset=5))
+    assert [i.add_index for i in page.invoices] == list(range(6, 16))
+    page = client.call(
+        "ListInvoices",
+        ln.ListInvoiceRequest(num_max_invoices=10, reversed=True))
+    assert [i.add_index for i in page.invoices] == list(range(21, 31))
+
+    added = client.call("AddInvoice", ln.Invoice(memo="test", value=1000))
+    decoded = client.call("DecodePayReq",
+                          ln.PayReqString(pay_req=added.payment_request))
+    assert decoded.num_satoshis == 1000
+    assert decoded.payment_hash == added.r_hash.hex()
+
+    # the same seed generates the same data set
+    assert FakeLnd("unused").data.identity_pubkey == \
+        FakeLnd("unused").data.identity_pubkey
+
+
+def test_checks_tls_and_macaroon(start_node, tmp_path):
+    node, channel_data = start_node()
+
+    bad_macaroon = ChannelData(
+        channel=channel_data.channel, macaroon=b"00", error=None)
+    with pytest.raises(grpc.RpcError) as exc:
+        lnd_client(None, 1, bad_macaroon).call("GetInfo",
+                                               ln.GetInfoRequest())
+    assert exc.value.code() == grpc.StatusCode.UNAUTHENTICATED
+
+    other = FakeLnd(str(tmp_path / "other"))
+    other.start()
+    try:
+        # the certificate of the other node is not trusted
+        channel = grpc.secure_channel(
+            "localhost:{}".format(node.port),
+            grpc.ssl_channel_credentials(
+                open(other.tls_cert_path, "rb").read()))
+        with pytest.raises(grpc.RpcError) as exc:
+            lnrpc.LightningStub(channel).GetInfo(
+                ln.GetInfoRequest(),
+                metadata=[("macaroon", node.macaroon_hex)],
+                timeout=5)
+        assert exc.value.code() == grpc.StatusCode.UNAVAILABLE
+        channel.close()
+    finally:
+        other.stop()
+
+
+def test_injects_latency_and_errors(start_node):
+    node, channel_data = start_node(
+        method_latency={"ListPeers": 0.2}, error_rate=1.0,
+        error_code="RESOURCE_EXHAUSTED")
+    client = lnd_client(None, 1, channel_data)
+
+    start = time.time()
+    with pytest.raises(grpc.RpcError) as exc:
+        client.call("ListPeers", ln.ListPeersRequest())
+    assert exc.value.code() == grpc.StatusCode.RESOURCE_EXHAUSTED
+    assert time.time() - start >= 0.2
+    assert node.calls["ListPeers"] == 1
+
+
+def test_wallet_has_to_be_unlocked(start_node):
+    node, channel_data = start_node(locked=True, password="secret")
+    client = lnd_client(None, 1, channel_data, breaker=False)
+
+    with pytest.raises(grpc.RpcError) as exc:
+        client.call("GetInfo", ln.GetInfoRequest())
+    assert exc.value.code() == grpc.StatusCode.UNIMPLEMENTED
+
+    with pytest.raises(grpc.RpcError):
+        client.call(
+            "UnlockWallet",
+            ln.UnlockWalletRequest(wallet_password=b"wrong"),
+            stub=lnrpc.WalletUnlockerStub)
+    assert node.locked
+
+    client.call(
+        "UnlockWallet",
+        ln.UnlockWalletRequest(wallet_password=b"secret"),
+        stub=lnrpc.WalletUnlockerStub)
+    assert client.call("GetInfo", ln.GetInfoRequest()).synced_to_chain
+
+
+def test_sends_events_to_subscribers(start_node):
+    _, channel_data = start_node(invoices=0, event_interval=0.05)
+    stub = lnrpc.LightningStub(channel_data.channel)
+    metadata = [("macaroon", channel_data.macaroon)]
+
+    events = stub.SubscribeTransactions(
+        ln.GetTransactionsRequest(), metadata=metadata, timeout=5)
+    assert next(events).amount > 0
+    events.cancel()
+
+
+def test_settle_indexes_are_consecutive():
+    data = FakeLndData(FakeLndOptions(invoices=50))
+    settled = [invoice for invoice in data.invoices if invoice.settled]
+    assert [invoice.settle_index for invoice in settled] == \
+        list(range(1, len(settled) + 1))
+
+    pending = next(invoice for invoice in data.invoices
+                   if not invoice.settled)
+    data.settle(pending, int(time.time()))
+    assert pending.settle_index == len(settled) + 1
+
+
+def test_event_log_is_bounded(monkeypatch):
+    monkeypatch.setattr(fake_lnd, "EVENT_LOG_SIZE", 3)
+    log = fake_lnd._EventLog()
+    backlog = [("invoice", index) for index in range(6)]
+
+    def is_active():
+        # the events arrive after the subscriber started following
+        while backlog:
+            log.append(backlog.pop(0))
+        return True
+
+    events = log.follow(SimpleNamespace(is_active=is_active), "invoice")
+    # a subscriber falling behind misses the dropped events
+    assert [next(events) for _ in range(3)] == [3, 4, 5]
+    assert len(log.events) == 3 and log.appended == 6
@@ -0,0 +1,95 @@
+"""This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+# pylint: skip-file
+import datetime
+import subprocess
+
+import pytest
+from django.core.cache import cache
+from django.utils import timezone
+from mixer.backend.django import mixer
+
+from backend.lnd import hibernation, supervisor
+from backend.lnd.models import LNDWallet
+from backend.lnd.ports import allocate_ports
+from backend.lnd.tests.test_supervisor import SLEEP_ARGS
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+def idle_since(days):
+    return timezone.now() - datetime.timedelta(days=days)
+
+
+def test_record_activity_wakes_wallet(monkeypatch):
+    started = []
+    monkeypatch.setattr(hibernation, "lnd_instance_is_running",
+                        lambda cfg: False)
+    monkeypatch.setattr(hibernation, "spawn_lnd_process",
+                        lambda autopilot, wallet: started.append(wallet.pk))
+
+    wallet = mixer.blend(
+        LNDWallet, hibernated=True, last_activity=idle_since(10))
+    allocate_ports(wallet)
+
+    hibernation.record_activity(wallet.owner)
+
+    wallet.refresh_from_db()
+    assert not wallet.hibernated, "Should have woken the wallet"
+    assert started == [wallet.pk], "Should start the local daemon"
+    assert wallet.last_activity > idle_since(1)
+
+    # activity is only written once per resolution
+    LNDWallet.objects.filter(pk=wallet.pk).update(
+        last_activity=idle_since(10))
+    hibernation.record_activity(wallet.owner)
+    wallet.refresh_from_db()
+    assert wallet.last_activity < idle_since(1)
+
+
+def test_remote_wallets_are_woken_by_their_supervisor(monkeypatch):
+    monkeypatch.setattr(hibernation, "spawn_lnd_process", None)
+
+    wallet = mixer.blend(LNDWallet, hibernated=True)
+    allocate_ports(wallet, hosts=["10.0.0.2"])
+
+    hibernation.wake_wallet(wallet)
+
+    wallet.refresh_from_db()
+    assert not wallet.hibernated
+
+
+def test_hibernate_idle(monkeypatch):
+    active = mixer.blend(LNDWallet, initialized=True)
+    idle = mixer.blend(
+        LNDWallet, initialized=True, last_activity=idle_since(10))
+    monkeypatch.setattr(supervisor, "stop_daemon", lambda cfg: False)
+
+    sup = supervisor.LNDSupervisor(parallelism=1)
+    processes = {}
+    for wallet in (active, idle):
+        processes[wallet.pk] = subprocess.Popen(SLEEP_ARGS)
+        sup.daemons[wallet.pk] = supervisor.ManagedDaemon(
+            wallet.pk, processes[wallet.pk], args=SLEEP_ARGS, cwd=".")
+
+    try:
+        sup.hibernate_idle()
+
+        assert list(sup.daemons.keys()) == [active.pk]
+        assert processes[idle.pk].poll() is not None, \
+            "Should terminate the daemon if StopDaemon fails"
+        idle.refresh_from_db()
+        assert idle.hibernated
+    finally:
+        for proc in processes.values():
+            proc.kill()
+            proc.wait()
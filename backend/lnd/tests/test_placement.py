@@ -0,0 +1,55 @@
+"""This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+# pylint: skip-file
+import datetime
+
+import pytest
+from django.utils import timezone
+from mixer.backend.django import mixer
+
+from backend.lnd import placement
+from backend.lnd.models import LNDHost, LNDWallet
+from backend.lnd.ports import PortAllocationError
+
+pytestmark = pytest.mark.django_db
+
+
+def test_falls_back_to_configured_hosts(settings):
+    settings.LND_PORTS = dict(settings.LND_PORTS, HOSTS=["10.0.0.9"])
+    assert placement.ranked_hosts() == ["10.0.0.9"]
+
+    allocation = placement.place_wallet(mixer.blend(LNDWallet))
+    assert allocation.host == "10.0.0.9"
+
+
+def test_picks_least_loaded_host():
+    placement.report_host_load("10.0.0.1", 10, 80.0, 70.0)
+    placement.report_host_load("10.0.0.2", 2, 10.0, 20.0)
+    placement.report_host_load("10.0.0.3", 1, 5.0, 90.0)
+
+    assert placement.ranked_hosts()[0] == "10.0.0.2"
+
+    allocation = placement.place_wallet(mixer.blend(LNDWallet))
+    assert allocation.host == "10.0.0.2"
+
+    from backend.lnd.utils import build_lnd_wallet_config
+    cfg = build_lnd_wallet_config(allocation.wallet.pk)
+    assert cfg.rpc_server == "10.0.0.2", "Should route gRPC to the host"
+
+
+def test_skips_unusable_hosts():
+    placement.report_host_load("10.0.0.1", 0, 0.0, 0.0)
+    disabled = placement.report_host_load("10.0.0.2", 0, 0.0, 0.0)
+    disabled.enabled = False
+    disabled.save()
+    stale = placement.report_host_load("10.0.0.3", 0, 0.0, 0.0)
+    LNDHost.objects.filter(pk=stale.pk).update(
+        last_heartbeat=timezone.now() - datetime.timedelta(hours=1))
+
+    assert placement.ranked_hosts() == ["10.0.0.1"]
+
+    LNDHost.objects.filter(address="10.0.0.1").update(enabled=False)
+    with pytest.raises(PortAllocationError):
+        placement.place_wallet(mixer.blend(LNDWallet))
@@ -0,0 +1,122 @@
+"""This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+# pylint: skip-file
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+from mixer.backend.django import mixer
+
+from backend.lnd import ports
+from backend.lnd.models import LNDWallet, PortAllocation
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def small_hosts(settings):
+    settings.LND_PORTS = dict(
+        settings.LND_PORTS, HOSTS=["10.0.0.1", "10.0.0.2"], SLOTS_PER_HOST=2)
+
+
+def test_validate_port_ranges(settings):
+    ports.validate_port_ranges()
+
+    settings.LND_PORTS = dict(settings.LND_PORTS, SLOTS_PER_HOST=5000)
+    with pytest.raises(ImproperlyConfigured):
+        ports.validate_port_ranges()
+
+    settings.LND_PORTS = dict(
+        settings.LND_PORTS, SLOTS_PER_HOST=100, LISTEN_BASE=65500)
+    with pytest.raises(ImproperlyConfigured):
+        ports.validate_port_ranges()
+
+
+def test_slot_ports():
+    slot = ports.slot_ports(1)
+    assert slot.listen_port_ipv4 == 19740
+    assert slot.listen_port_ipv6 == 19741
+    assert slot.rpc_listen_port_ipv4 == 12010
+    assert slot.rest_port_ipv6 == 8081
+
+
+def test_allocation_is_independent_of_pk(small_hosts):
+    for _ in range(5):
+        mixer.blend(LNDWallet)
+    wallet = mixer.blend(LNDWallet)
+    assert wallet.pk > 5
+
+    allocation = ports.allocate_ports(wallet)
+    assert allocation.host == "10.0.0.1"
+    assert allocation.slot == 1, "Should use the lowest free slot"
+    assert ports.allocate_ports(wallet) == allocation, \
+        "Should return the existing allocation"
+
+
+def test_allocation_spreads_and_recycles(small_hosts):
+    wallets = [mixer.blend(LNDWallet) for _ in range(4)]
+    allocations = [ports.allocate_ports(w) for w in wallets]
+    assert [(a.host, a.slot) for a in allocations] == [
+        ("10.0.0.1", 1),
+        ("10.0.0.1", 2),
+        ("10.0.0.2", 1),
+        ("10.0.0.2", 2),
+    ]
+
+    with pytest.raises(ports.PortAllocationError):
+        ports.allocate_ports(mixer.blend(LNDWallet))
+
+    # deleting a wallet frees its slot for the next one
+    wallets[1].delete()
+    allocation = ports.allocate_ports(mixer.blend(LNDWallet))
+    assert (allocation.host, allocation.slot) == ("10.0.0.1", 2)
+
+
+def test_allocation_skips_ports_in_use(settings, monkeypatch):
+    settings.LND_PORTS = dict(settings.LND_PORTS, HOSTS=["127.0.0.1"])
+    busy = ports.slot_ports(1).rpc_listen_port_ipv4
+    monkeypatch.setattr(ports, "port_is_free", lambda port: port != busy)
+
+    allocation = ports.allocate_ports(mixer.blend(LNDWallet))
+    assert allocation.slot == 2, "Slot 1 uses a busy port"
+
+
+def test_allocation_is_looked_up_once(small_hosts, django_assert_num_queries,
+                                      monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ports.time, "time", lambda: now[0])
+    wallet = mixer.blend(LNDWallet)
+    allocation = ports.get_port_allocation(wallet.pk)
+
+    with django_assert_num_queries(0):
+        assert ports.get_port_allocation(wallet.pk) == allocation
+
+    # changes of other processes are seen after the TTL
+    PortAllocation.objects.filter(pk=allocation.pk).update(slot=7)
+    assert ports.get_port_allocation(wallet.pk).slot == allocation.slot
+    now[0] += ports.port_setting("CACHE_TTL")
+    with django_assert_num_queries(1):
+        assert ports.get_port_allocation(wallet.pk).slot == 7
+
+    # deleted wallets are forgotten
+    wallet.delete()
+    assert wallet.pk not in ports._ALLOCATIONS
+
+
+def test_migration_assigns_valid_slots(settings):
+    from django.apps import apps
+    from importlib import import_module
+    migration = import_module("backend.lnd.migrations.0004_port_allocation")
+
+    settings.LND_PORTS = dict(settings.LND_PORTS, SLOTS_PER_HOST=3)
+    for pk in (1, 3, 10):
+        mixer.blend(LNDWallet, id=pk)
+
+    migration.keep_existing_ports(apps, None)
+
+    slots = {
+        wallet.pk: wallet.port_allocation.slot
+        for wallet in LNDWallet.objects.all()
+    }
+    # existing daemons keep their ports if the pk is a valid slot
+    assert slots == {1: 1, 3: 3, 10: 2}
@@ -0,0 +1,56 @@
+"""This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+# pylint: skip-file
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+from backend.lnd import readiness
+
+
+def write_later(path, delay):
+    def write():
+        time.sleep(delay)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as file:
+            file.write(b"macaroon")
+
+    thread = threading.Thread(target=write)
+    thread.start()
+    return thread
+
+
+@pytest.mark.parametrize("use_inotify", [True, False])
+def test_wait_for_file(tmpdir, monkeypatch, use_inotify):
+    if not use_inotify:
+        monkeypatch.setattr(readiness, "LIBC", None)
+
+    # the directories of the file don't exist yet
+    path = str(tmpdir.join("data", "chain", "admin.macaroon"))
+    thread = write_later(path, 0.2)
+
+    start = time.time()
+    assert readiness.wait_for_file(path, 5)
+    assert time.time() - start < 2, "Should return once the file exists"
+    thread.join()
+
+
+def test_wait_for_file_deadline(tmpdir):
+    start = time.time()
+    assert not readiness.wait_for_file(str(tmpdir.join("missing")), 0.3)
+    assert time.time() - start < 2
+
+
+def test_wait_for_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        sock.listen(1)
+        port = sock.getsockname()[1]
+        assert readiness.wait_for_port(port, 1)
+
+    assert not readiness.wait_for_port(port, 0.3)
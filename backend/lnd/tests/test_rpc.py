@@ -0,0 +1,36 @@
+"""This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+# pylint: skip-file
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+import backend.lnd.rpc_pb2 as rpc_pb2
+from backend.lnd import rpc_descriptions
+from backend.lnd.rpc import LazyModule, rpc_description
+
+
+def test_lazy_module():
+    ln = LazyModule("backend.lnd.rpc_pb2")
+    assert ln.GetInfoRequest is rpc_pb2.GetInfoRequest
+    with pytest.raises(AttributeError):
+        ln.NoSuchMessage
+
+
+def test_descriptions_are_up_to_date(monkeypatch, tmp_path):
+    call_command("generate_rpc_descriptions", check=True)
+    assert rpc_description("Lightning.ListPayments") == \
+        "ListPayments returns a list of all outgoing payments. "
+    assert rpc_description("WalletUnlocker.InitWallet").startswith(
+        "InitWallet is used when lnd is starting up for the first time")
+
+    outdated = tmp_path / "rpc_descriptions.py"
+    outdated.write_text("DESCRIPTIONS = {}\n")
+    monkeypatch.setattr(rpc_descriptions, "__file__", str(outdated))
+    with pytest.raises(CommandError):
+        call_command("generate_rpc_descriptions", check=True)
+
+    call_command("generate_rpc_descriptions")
+    call_command("generate_rpc_descriptions", check=True)
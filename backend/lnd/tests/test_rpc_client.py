@@ -0,0 +1,378 @@
+"""This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+# pylint: skip-file
+import threading
+import time
+from types import SimpleNamespace
+
+import grpc
+import pytest
+from django.core.cache import cache
+
+import backend.lnd.rpc_pb2 as ln
+from backend.lnd import rpc_client
+from backend.lnd.rpc_client import (INVOICE_SETTLED, TRANSACTION,
+                                    RequestBudgetExceeded, WalletUnavailable,
+                                    invalidate_shared_responses, lnd_client,
+                                    start_request_budget)
+from backend.lnd.utils import ChannelData
+from backend.slow_log import start_operation_log
+
+CHANNEL_DATA = ChannelData(channel=object(), macaroon=b"abc", error=None)
+
+
+class FakeStub():
+    calls = []
+    lock = threading.Lock()
+
+    def __init__(self, channel):
+        pass
+
+    def _record(self, method, request, metadata):
+        with self.lock:
+            self.calls.append((method, request, metadata))
+        time.sleep(0.05)
+        return method
+
+    def GetInfo(self, request, metadata=None, timeout=None):
+        return self._record("GetInfo", request, metadata)
+
+    def ListChannels(self, request, metadata=None, timeout=None):
+        return self._record("ListChannels", request, metadata)
+
+    def ListInvoices(self, request, metadata=None, timeout=None):
+        return self._record("ListInvoices", request, metadata)
+
+    def AddInvoice(self, request, metadata=None, timeout=None):
+        return self._record("AddInvoice", request, metadata)
+
+    def ListPeers(self, request, metadata=None, timeout=None):
+        self._record("ListPeers", request, metadata)
+        err = grpc.RpcError()
+        err.code = lambda: grpc.StatusCode.UNAVAILABLE
+        raise err
+
+
+@pytest.fixture(autouse=True)
+def fake_stub(monkeypatch, settings):
+    FakeStub.calls = []
+    monkeypatch.setattr(rpc_client.lnrpc, "LightningStub", FakeStub)
+    # only memoize per request unless a test enables the shared cache
+    settings.LND_RPC = dict(settings.LND_RPC, SHARED_CACHE_TTL={})
+    cache.clear()
+    rpc_client._GATEWAYS.clear()
+    yield
+    cache.clear()
+    rpc_client._GATEWAYS.clear()
+
+
+def test_memoizes_read_only_calls():
+    context = SimpleNamespace()
+    client = lnd_client(context, 1, CHANNEL_DATA)
+
+    assert client.call("GetInfo", ln.GetInfoRequest()) == "GetInfo"
+    assert client.call("GetInfo", ln.GetInfoRequest()) == "GetInfo"
+    assert len(FakeStub.calls) == 1
+    assert FakeStub.calls[0][2] == [("macaroon", b"abc")]
+
+    # shared by all clients of the request, but not by other wallets
+    lnd_client(context, 1, CHANNEL_DATA).call("GetInfo", ln.GetInfoRequest())
+    assert len(FakeStub.calls) == 1
+    lnd_client(context, 2, CHANNEL_DATA).call("GetInfo", ln.GetInfoRequest())
+    assert len(FakeStub.calls) == 2
+
+    # the request is part of the key
+    client.call("ListInvoices", ln.ListInvoiceRequest(num_max_invoices=1))
+    client.call("ListInvoices", ln.ListInvoiceRequest(num_max_invoices=2))
+    client.call("ListInvoices", ln.ListInvoiceRequest(num_max_invoices=1))
+    assert len(FakeStub.calls) == 4
+
+    # nothing is shared without a context
+    lnd_client(None, 1, CHANNEL_DATA).call("GetInfo", ln.GetInfoRequest())
+    assert len(FakeStub.calls) == 5
+
+
+def test_other_calls_drop_memoized_responses():
+    client = lnd_client(SimpleNamespace(), 1, CHANNEL_DATA)
+
+    client.call("ListInvoices", ln.ListInvoiceRequest())
+    client.call("AddInvoice", ln.Invoice(value=10))
+    client.call("AddInvoice", ln.Invoice(value=10))
+    client.call("ListInvoices", ln.ListInvoiceRequest())
+
+    assert [call[0] for call in FakeStub.calls] == [
+        "ListInvoices", "AddInvoice", "AddInvoice", "ListInvoices"
+    ]
+
+
+def test_errors_are_not_memoized():
+    client = lnd_client(SimpleNamespace(), 1, CHANNEL_DATA)
+
+    for _ in range(2):
+        with pytest.raises(grpc.RpcError):
+            client.call("ListPeers", ln.ListPeersRequest())
+    assert len(FakeStub.calls) == 2
+
+
+def test_concurrent_calls_are_deduplicated():
+    client = lnd_client(SimpleNamespace(), 1, CHANNEL_DATA)
+
+    start = time.time()
+    future = client.prefetch("ListChannels", ln.ListChannelsRequest())
+    client.call("GetInfo", ln.GetInfoRequest())
+    assert client.call("ListChannels",
+                       ln.ListChannelsRequest()) == "ListChannels"
+    assert future.result() == "ListChannels"
+
+    assert len(FakeStub.calls) == 2
+    assert time.time() - start < 0.095, "Should run distinct calls " \
+        "concurrently"
+
+
+def test_prefetch_closes_old_connections(monkeypatch):
+    closed = []
+    monkeypatch.setattr(rpc_client, "close_old_connections",
+                        lambda: closed.append(threading.current_thread()))
+    client = lnd_client(SimpleNamespace(), 1, CHANNEL_DATA)
+
+    future = client.prefetch("ListPeers", ln.ListPeersRequest())
+    with pytest.raises(grpc.RpcError):
+        future.result()
+    assert len(closed) == 1
+    assert closed[0].name.startswith("lnd-prefetch")
+
+
+def test_shares_responses_across_requests(monkeypatch, settings):
+    settings.LND_RPC = dict(
+        settings.LND_RPC, SHARED_CACHE_TTL={
+            "ChannelBalance": 60,
+            "WalletBalance": 60
+        })
+    balances = []
+
+    def channel_balance(self, request, metadata=None, timeout=None):
+        balances.append(request)
+        return ln.ChannelBalanceResponse(balance=len(balances))
+
+    monkeypatch.setattr(FakeStub, "ChannelBalance", channel_balance,
+                        raising=False)
+
+    def balance(wallet_pk=1):
+        client = lnd_client(SimpleNamespace(), wallet_pk, CHANNEL_DATA)
+        return client.call("ChannelBalance",
+                           ln.ChannelBalanceRequest()).balance
+
+    assert balance() == 1
+    assert balance() == 1, "Should share the response"
+    assert balance(wallet_pk=2) == 2, "Should not share between wallets"
+
+    invalidate_shared_responses(1, INVOICE_SETTLED)
+    assert balance() == 3
+
+    invalidate_shared_responses(1, TRANSACTION)
+    assert balance() == 3, "Should only invalidate the given methods"
+
+    lnd_client(SimpleNamespace(), 1, CHANNEL_DATA).call(
+        "AddInvoice", ln.Invoice())
+    assert balance() == 4, "Should invalidate after other calls"
+
+
+def test_passes_method_deadline(monkeypatch, settings):
+    settings.LND_RPC = dict(
+        settings.LND_RPC, DEADLINES={
+            "default": 3,
+            "ListInvoices": 20
+        })
+    timeouts = []
+
+    def get_info(self, request, metadata=None, timeout=None):
+        timeouts.append(timeout)
+
+    def list_invoices(self, request, metadata=None, timeout=None):
+        timeouts.append(timeout)
+
+    monkeypatch.setattr(FakeStub, "GetInfo", get_info)
+    monkeypatch.setattr(FakeStub, "ListInvoices", list_invoices)
+
+    client = lnd_client(SimpleNamespace(), 1, CHANNEL_DATA)
+    client.call("GetInfo", ln.GetInfoRequest())
+    client.call("ListInvoices", ln.ListInvoiceRequest())
+    assert timeouts == [3, 20]
+
+
+def test_breaker_opens_after_repeated_failures(monkeypatch, settings):
+    settings.LND_RPC = dict(
+        settings.LND_RPC, BREAKER_THRESHOLD=3, BREAKER_COOLDOWN=30)
+    now = [1000.0]
+    monkeypatch.setattr(rpc_client.time, "time", lambda: now[0])
+
+    def list_peers(wallet_pk=1):
+        client = lnd_client(SimpleNamespace(), wallet_pk, CHANNEL_DATA)
+        return client.call("ListPeers", ln.ListPeersRequest())
+
+    for _ in range(3):
+        with pytest.raises(grpc.RpcError):
+            list_peers()
+
+    with pytest.raises(WalletUnavailable):
+        list_peers()
+    assert len(FakeStub.calls) == 3, "Should not call the daemon"
+
+    with pytest.raises(grpc.RpcError):
+        list_peers(wallet_pk=2)
+    assert len(FakeStub.calls) == 4, "Should not affect other wallets"
+
+    # the probe after the cooldown fails and opens the breaker again
+    now[0] += 31
+    with pytest.raises(grpc.RpcError):
+        list_peers()
+    with pytest.raises(WalletUnavailable):
+        list_peers()
+    assert len(FakeStub.calls) == 5
+
+    # successful calls close it
+    now[0] += 31
+    lnd_client(SimpleNamespace(), 1, CHANNEL_DATA).call(
+        "GetInfo", ln.GetInfoRequest())
+    assert not rpc_client.wallet_gateway(1).is_open()
+    assert rpc_client.wallet_gateway(1).failures == 0
+
+
+def test_breaker_lets_one_probe_through(monkeypatch, settings):
+    settings.LND_RPC = dict(
+        settings.LND_RPC, BREAKER_THRESHOLD=1, BREAKER_COOLDOWN=30)
+    now = [1000.0]
+    monkeypatch.setattr(rpc_client.time, "time", lambda: now[0])
+
+    def get_info(wallet_pk=1):
+        client = lnd_client(SimpleNamespace(), wallet_pk, CHANNEL_DATA)
+        return client.call("GetInfo", ln.GetInfoRequest(), memoize=False)
+
+    with pytest.raises(grpc.RpcError):
+        lnd_client(SimpleNamespace(), 1, CHANNEL_DATA).call(
+            "ListPeers", ln.ListPeersRequest())
+    now[0] += 31
+
+    concurrent = []
+
+    def probe(self, request, metadata=None, timeout=None):
+        # calls arriving while the probe runs still fail
+        with pytest.raises(WalletUnavailable):
+            get_info()
+        concurrent.append(
+            lnd_client(SimpleNamespace(), 2, CHANNEL_DATA).call(
+                "ListChannels", ln.ListChannelsRequest()))
+        return "GetInfo"
+
+    monkeypatch.setattr(FakeStub, "GetInfo", probe)
+    assert get_info() == "GetInfo"
+    assert concurrent == ["ListChannels"], "Should not affect other wallets"
+    assert not rpc_client.wallet_gateway(1).probing
+    assert not rpc_client.wallet_gateway(1).is_open()
+
+
+def test_calls_without_breaker_ignore_it(settings):
+    settings.LND_RPC = dict(settings.LND_RPC, BREAKER_THRESHOLD=1)
+
+    with pytest.raises(grpc.RpcError):
+        lnd_client(SimpleNamespace(), 1, CHANNEL_DATA).call(
+            "ListPeers", ln.ListPeersRequest())
+    assert rpc_client.wallet_gateway(1).is_open()
+
+    client = lnd_client(SimpleNamespace(), 1, CHANNEL_DATA, breaker=False)
+    assert client.call("GetInfo", ln.GetInfoRequest()) == "GetInfo"
+
+
+def test_limits_calls_in_flight(settings):
+    settings.LND_RPC = dict(
+        settings.LND_RPC, MAX_IN_FLIGHT=1, QUEUE_TIMEOUT=0.01)
+
+    client = lnd_client(SimpleNamespace(), 1, CHANNEL_DATA)
+    future = client.prefetch("ListChannels", ln.ListChannelsRequest())
+    time.sleep(0.01)
+    with pytest.raises(WalletUnavailable):
+        lnd_client(SimpleNamespace(), 1, CHANNEL_DATA).call(
+            "GetInfo", ln.GetInfoRequest())
+    assert future.result() == "ListChannels"
+
+    # the slot is free again
+    assert lnd_client(SimpleNamespace(), 1, CHANNEL_DATA).call(
+        "GetInfo", ln.GetInfoRequest()) == "GetInfo"
+
+
+def test_deadlines_respect_request_budget(monkeypatch, settings):
+    settings.LND_RPC = dict(
+        settings.LND_RPC,
+        DEADLINES={"default": 10},
+        REQUEST_BUDGET=15,
+        BREAKER_THRESHOLD=1)
+    now = [1000.0]
+    monkeypatch.setattr(rpc_client.time, "time", lambda: now[0])
+    timeouts = []
+
+    def get_info(self, request, metadata=None, timeout=None):
+        timeouts.append(timeout)
+        err = grpc.RpcError()
+        err.code = lambda: grpc.StatusCode.DEADLINE_EXCEEDED
+        raise err
+
+    monkeypatch.setattr(FakeStub, "GetInfo", get_info)
+
+    context = SimpleNamespace()
+    start_request_budget(context)
+
+    now[0] += 8
+    with pytest.raises(grpc.RpcError):
+        lnd_client(context, 1, CHANNEL_DATA).call("GetInfo",
+                                                  ln.GetInfoRequest())
+    assert timeouts == [7]
+    assert not rpc_client.wallet_gateway(1).is_open(), \
+        "Running out of request time is no failure of the daemon"
+
+    now[0] += 7
+    with pytest.raises(RequestBudgetExceeded) as exc:
+        lnd_client(context, 1, CHANNEL_DATA).call("GetInfo",
+                                                  ln.GetInfoRequest())
+    assert exc.value.code() == grpc.StatusCode.DEADLINE_EXCEEDED
+    assert len(timeouts) == 1, "Should not call the daemon"
+
+    # without a budget the deadline of the method applies
+    with pytest.raises(grpc.RpcError):
+        lnd_client(SimpleNamespace(), 1, CHANNEL_DATA).call(
+            "GetInfo", ln.GetInfoRequest())
+    assert timeouts == [7, 10]
+    assert rpc_client.wallet_gateway(1).is_open()
+
+
+@pytest.mark.parametrize("path", ["/gql/", "/graphql/"])
+def test_graphql_endpoints_start_request_budget(client, settings, path):
+    settings.LND_RPC = dict(settings.LND_RPC, REQUEST_BUDGET=15)
+    start = time.time()
+    response = client.post(
+        path, {"query": "{ __typename }"}, content_type="application/json")
+
+    assert response.status_code == 200
+    deadline = response.wsgi_request.lnd_deadline
+    assert start + 15 <= deadline <= time.time() + 15
+
+
+def test_adds_calls_to_the_operation_log(settings):
+    settings.SLOW_LOG = dict(settings.SLOW_LOG, SAMPLE_RATE=1.0)
+    context = SimpleNamespace()
+    start_operation_log(context)
+    client = lnd_client(context, 7, CHANNEL_DATA)
+
+    client.call("GetInfo", ln.GetInfoRequest())
+    client.call("GetInfo", ln.GetInfoRequest())
+    with pytest.raises(grpc.RpcError):
+        client.call("ListPeers", ln.ListPeersRequest())
+
+    record = context.operation_log.record()
+    assert record["wallets"] == [7]
+    assert record["grpc_calls"] == 2
+    assert [(e["method"], e["code"]) for e in record["timeline"]] == [
+        ("GetInfo", "OK"), ("ListPeers", "UNAVAILABLE")
+    ]
+    assert record["timeline"][0]["duration_ms"] >= 50
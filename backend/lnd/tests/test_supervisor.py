@@ -0,0 +1,160 @@
+"""This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+# pylint: skip-file
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+from mixer.backend.django import mixer
+
+from backend.lnd import supervisor
+from backend.lnd.models import LNDWallet
+from backend.lnd.ports import allocate_ports
+
+pytestmark = pytest.mark.django_db
+
+SLEEP_ARGS = [sys.executable, "-c", "import time; time.sleep(30)"]
+
+
+def test_restart_backoff(settings):
+    settings.LND_SUPERVISOR = dict(
+        settings.LND_SUPERVISOR,
+        RESTART_BACKOFF_BASE=2,
+        RESTART_BACKOFF_MAX=10)
+
+    assert supervisor.restart_backoff(0) == 2
+    assert supervisor.restart_backoff(1) == 4
+    assert supervisor.restart_backoff(2) == 8
+    assert supervisor.restart_backoff(3) == 10, "Should be capped at the max"
+
+
+def test_boot_respects_parallelism(monkeypatch):
+    for _ in range(6):
+        allocate_ports(mixer.blend(LNDWallet, initialized=True))
+    allocate_ports(mixer.blend(LNDWallet, initialized=False))
+    allocate_ports(
+        mixer.blend(LNDWallet, initialized=True, stopped_by_owner=True))
+    # placed on another host of the fleet
+    allocate_ports(
+        mixer.blend(LNDWallet, initialized=True), hosts=["10.0.0.2"])
+
+    lock = threading.Lock()
+    state = {"running": 0, "max": 0, "booted": []}
+
+    def fake_boot(self, wallet):
+        with lock:
+            state["running"] += 1
+            state["max"] = max(state["max"], state["running"])
+        time.sleep(0.05)
+        with lock:
+            state["running"] -= 1
+            state["booted"].append(wallet.pk)
+
+    monkeypatch.setattr(supervisor.LNDSupervisor, "_boot_wallet", fake_boot)
+
+    sup = supervisor.LNDSupervisor(parallelism=2)
+    sup.boot()
+
+    assert len(state["booted"]) == 6, \
+        "Should only boot initialized wallets of this host"
+    assert state["max"] <= 2, "Should not boot more than 2 daemons at once"
+
+
+def crashed_daemon(wallet_id):
+    proc = subprocess.Popen(SLEEP_ARGS)
+    daemon = supervisor.ManagedDaemon(
+        wallet_id, proc, args=SLEEP_ARGS, cwd=".")
+    proc.kill()
+    proc.wait()
+    return daemon
+
+
+def test_check_restarts_crashed_daemon():
+    wallet = mixer.blend(LNDWallet, initialized=True)
+
+    sup = supervisor.LNDSupervisor(parallelism=1)
+    daemon = crashed_daemon(wallet.pk)
+    sup.daemons[wallet.pk] = daemon
+
+    sup.check()
+    assert daemon.restart_at is not None, "Should schedule a restart"
+    assert daemon.restarts == 0, "Should wait for the backoff delay"
+
+    daemon.restart_at = time.time() - 1
+    sup.check()
+
+    try:
+        assert daemon.restarts == 1, "Should have restarted the daemon"
+        assert daemon.is_alive(), "Restarted daemon should be running"
+        assert sup.stats()[0].wallet_id == wallet.pk
+    finally:
+        daemon.popen.kill()
+        daemon.popen.wait()
+
+
+def test_check_forgets_stopped_daemon():
+    wallet = mixer.blend(LNDWallet, initialized=True, stopped_by_owner=True)
+
+    sup = supervisor.LNDSupervisor(parallelism=1)
+    sup.daemons[wallet.pk] = crashed_daemon(wallet.pk)
+
+    sup.check()
+    assert wallet.pk not in sup.daemons, \
+        "Daemons stopped by the owner should not be restarted"
+
+
+def test_new_daemons_keep_autopilot(monkeypatch):
+    wallet = mixer.blend(
+        LNDWallet, initialized=True, autopilot=True, hibernated=False,
+        stopped_by_owner=False)
+    allocate_ports(wallet)
+    spawned = []
+
+    def fake_spawn(autopilot, wallet):
+        spawned.append((autopilot, wallet.pk))
+        return subprocess.Popen(SLEEP_ARGS)
+
+    monkeypatch.setattr(supervisor, "spawn_lnd_process", fake_spawn)
+    monkeypatch.setattr(supervisor, "lnd_processes", lambda: {})
+
+    sup = supervisor.LNDSupervisor(parallelism=1)
+    sup.adopt_new_daemons(start_new_wallets=True)
+    try:
+        assert spawned == [(True, wallet.pk)]
+    finally:
+        sup.daemons[wallet.pk].popen.kill()
+        sup.daemons[wallet.pk].popen.wait()
+
+
+def test_run_survives_failed_iterations(monkeypatch, settings):
+    settings.LND_SUPERVISOR = dict(settings.LND_SUPERVISOR, POLL_INTERVAL=0)
+    sup = supervisor.LNDSupervisor(parallelism=1)
+    iterations = []
+    checks = []
+
+    def failing_adopt(start_new_wallets):
+        iterations.append(1)
+        if len(iterations) == 1:
+            raise supervisor.psutil.NoSuchProcess(1)
+
+    class Stop(Exception):
+        pass
+
+    def sleep(seconds):
+        if len(iterations) == 3:
+            raise Stop()
+
+    monkeypatch.setattr(sup, "adopt_new_daemons", failing_adopt)
+    monkeypatch.setattr(sup, "check", lambda: checks.append(1))
+    monkeypatch.setattr(sup, "hibernate_idle", lambda: None)
+    monkeypatch.setattr(sup, "log_stats", lambda: None)
+    monkeypatch.setattr(sup, "report_load", lambda: None)
+    monkeypatch.setattr(supervisor.time, "sleep", sleep)
+
+    with pytest.raises(Stop):
+        sup.run(boot=False)
+    assert len(checks) == 2, "Should continue after the failed iteration"
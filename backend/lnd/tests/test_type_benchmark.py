@@ -0,0 +1,49 @@
+"""This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+# pylint: skip-file
+import json
+
+from django.core.management import call_command
+
+from backend.lnd.type_benchmark import (CONVERSIONS, ConversionBenchmark,
+                                        run_benchmarks)
+
+
+def test_selects_nested_fields():
+    benchmark = ConversionBenchmark(CONVERSIONS["LnRoute"], 2)
+    assert "hops { chanId" in benchmark.query
+
+    data = benchmark.response
+    for _, stage in benchmark.stages():
+        data = stage(data)
+    routes = json.loads(data)["items"]
+    assert len(routes) == 2
+    assert len(routes[0]["hops"]) == 3
+    assert routes[0]["hops"][0]["chanId"]
+
+
+def test_measures_all_conversions():
+    results = run_benchmarks(sizes=(10, ))
+
+    assert list(results) == list(CONVERSIONS)
+    for sizes in results.values():
+        stages = sizes["10"]
+        assert list(stages) == [
+            "to_dict", "to_graphene", "execute", "serialize"
+        ]
+        for stats in stages.values():
+            assert stats["seconds"] > 0
+            assert stats["peak_bytes"] >= stats["retained_bytes"] > 0
+
+
+def test_command_writes_results(tmp_path):
+    output = tmp_path / "types.json"
+    call_command(
+        "benchmark_types", "--type", "LnPayment", "--sizes", "10", "20",
+        "--output", str(output))
+
+    results = json.loads(output.read_text())
+    assert list(results) == ["LnPayment"]
+    assert list(results["LnPayment"]) == ["10", "20"]
@@ -3,6 +3,8 @@ License, v. 2.0. If a copy of the MPL was not distributed with this
 file, You can obtain one at http://mozilla.org/MPL/2.0/.
 """
 
+import graphene
+
 import backend.lnd.types as types
 from faker import Faker
 fake = Faker()
@@ -478,3 +480,48 @@ def test_ln_peer():
     assert inst.sat_recv == fake_peers[1]["sat_recv"]
     assert inst.inbound == fake_peers[1]["inbound"]
     assert inst.ping_time == fake_peers[1]["ping_time"]
+
+
+def test_row_type():
+    payment = {
+        "payment_hash": fake.sha256(),
+        "value": fake.pyint(),
+        "path": [fake.sha256()],
+    }
+    row = types.LnPaymentRow.from_dict(payment)
+
+    assert not hasattr(row, "__dict__")
+    assert row.payment_hash == payment["payment_hash"]
+    assert row.value == payment["value"]
+    assert row.path == payment["path"]
+    # missing fields get the defaults of the graphene fields
+    assert row.creation_date == 0
+    assert row.fee == 0
+    assert row.payment_preimage is None
+
+    channel = {"chan_id": "1", "pending_htlcs": make_fake_htlcs()}
+    row = types.LnChannelRow.from_dict(channel)
+    assert row.chan_id == "1"
+    assert row.active is None
+    assert len(row.pending_htlcs) == 2
+    assert row.pending_htlcs[1].amount == 2252
+    assert not hasattr(row.pending_htlcs[1], "__dict__")
+
+
+def test_rows_are_resolved():
+    class Query(graphene.ObjectType):
+        payments = graphene.Field(types.LnListPaymentsResponse)
+
+        def resolve_payments(self, info):
+            return types.LnListPaymentsResponse(
+                {"payments": [{"payment_hash": "a", "value": 10}]})
+
+    result = graphene.Schema(query=Query).execute(
+        "{ payments { payments { paymentHash value fee path } } }")
+    assert not result.errors
+    assert result.data["payments"]["payments"] == [{
+        "paymentHash": "a",
+        "value": 10,
+        "fee": 0,
+        "path": []
+    }]
@@ -0,0 +1,225 @@
+"""This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+Micro-benchmarks of the conversion of LND responses into the
+graphene types of backend.lnd.types.
+
+The resolvers convert every response in the same stages, each of
+which is measured separately for synthetic responses of several sizes:
+
+- to_dict: json.loads(MessageToJson(response)), i.e. protobuf to dicts
+- to_graphene: building the graphene objects from the dicts, the
+  rows of backend.lnd.types.row_type for the list responses
+- execute: GraphQL execution of a query selecting all fields
+- serialize: json.dumps of the execution result
+
+Durations are the median of several runs. The allocations of every
+stage are traced in an extra run with tracemalloc: the peak and the
+memory still allocated after the stage. See ./manage.py
+benchmark_types.
+"""
+
+import collections
+import json
+import statistics
+import time
+import tracemalloc
+
+import graphene
+from google.protobuf.json_format import MessageToJson
+
+import backend.lnd.rpc_pb2 as ln
+from backend.lnd.fake_lnd import FakeLndData, FakeLndOptions
+from backend.lnd.types import (LnChannel, LnChannelRow, LnInvoice,
+                               LnInvoiceRow, LnListPaymentsResponse, LnPayment,
+                               LnRoute, LnTransaction, LnTransactionDetails)
+
+SIZES = (10, 1000, 100000)
+
+# each size is run this many items in total, but at least once
+ITEMS_PER_SIZE = 10000
+
+# nested types are selected up to this depth
+MAX_SELECTION_DEPTH = 3
+
+Conversion = collections.namedtuple(
+    "Conversion", ["name", "graphene_type", "response", "convert"])
+
+
+def _data(**sizes) -> FakeLndData:
+    options = {
+        "channels": 0,
+        "peers": 0,
+        "payments": 0,
+        "invoices": 0,
+        "transactions": 0
+    }
+    options.update(sizes)
+    return FakeLndData(FakeLndOptions(**options))
+
+
+def _routes(size: int) -> ln.QueryRoutesResponse:
+    channels = _data(channels=min(size, 1000), peers=10).channels
+    routes = []
+    for index in range(size):
+        hops = [
+            ln.Hop(
+                chan_id=channel.chan_id,
+                chan_capacity=channel.capacity,
+                amt_to_forward=10000 - hop,
+                fee=1,
+                expiry=144 * (3 - hop),
+                amt_to_forward_msat=(10000 - hop) * 1000,
+                fee_msat=1000,
+                pub_key=channel.remote_pubkey)
+            for hop, channel in enumerate(
+                channels[(index + offset) % len(channels)]
+                for offset in range(3))
+        ]
+        routes.append(
+            ln.Route(
+                total_time_lock=432,
+                total_fees=3,
+                total_amt=10003,
+                hops=hops,
+                total_fees_msat=3000,
+                total_amt_msat=10003000))
+    return ln.QueryRoutesResponse(routes=routes)
+
+
+CONVERSIONS = collections.OrderedDict(
+    (conversion.name, conversion) for conversion in [
+        Conversion(
+            "LnChannel", LnChannel, lambda size: ln.ListChannelsResponse(
+                channels=_data(channels=size, peers=10).channels),
+            lambda data: [
+                LnChannelRow.from_dict(c) for c in data["channels"]
+            ]),
+        Conversion(
+            "LnPayment", LnPayment, lambda size: ln.ListPaymentsResponse(
+                payments=_data(payments=size).payments),
+            lambda data: LnListPaymentsResponse(data).payments),
+        Conversion(
+            "LnInvoice", LnInvoice, lambda size: ln.ListInvoiceResponse(
+                invoices=_data(invoices=size).invoices),
+            lambda data: [
+                LnInvoiceRow.from_dict(i) for i in data["invoices"]
+            ]),
+        Conversion("LnRoute", LnRoute, _routes,
+                   lambda data: [LnRoute(r) for r in data["routes"]]),
+        Conversion(
+            "LnTransactionDetails", LnTransaction,
+            lambda size: ln.TransactionDetails(
+                transactions=_data(transactions=size).transactions),
+            lambda data: LnTransactionDetails(data).transactions),
+    ])
+
+
+def _named_type(graphql_type):
+    while hasattr(graphql_type, "of_type"):
+        graphql_type = graphql_type.of_type
+    return graphql_type
+
+
+def selection(graphql_type, depth: int = 0) -> str:
+    """Returns a selection set of all fields of the type"""
+    fields = []
+    for name, field in graphql_type.fields.items():
+        field_type = _named_type(field.type)
+        if not hasattr(field_type, "fields"):
+            fields.append(name)
+        elif depth < MAX_SELECTION_DEPTH:
+            fields.append(name + " " + selection(field_type, depth + 1))
+    return "{ " + " ".join(fields) + " }"
+
+
+def item_schema(graphene_type):
+    """Returns a schema with an items field listing the type,
+    resolved from the root value"""
+
+    class Query(graphene.ObjectType):
+        items = graphene.List(graphene_type)
+
+        def resolve_items(self, info):
+            return self
+
+    return graphene.Schema(query=Query, auto_camelcase=True)
+
+
+class ConversionBenchmark():
+    """Measures the stages of one conversion for one size"""
+
+    def __init__(self, conversion: Conversion, size: int):
+        self.conversion = conversion
+        self.size = size
+        self.response = conversion.response(size)
+        self.schema = item_schema(conversion.graphene_type)
+        self.query = "{ items " + selection(
+            self.schema.get_type(
+                conversion.graphene_type._meta.name)) + " }"
+
+    def stages(self):
+        """Yields the name and function of every stage, each function
+        takes the result of the previous one"""
+        yield "to_dict", lambda response: json.loads(
+            MessageToJson(
+                response,
+                preserving_proto_field_name=True,
+                including_default_value_fields=True))
+        yield "to_graphene", self.conversion.convert
+
+        def execute(items):
+            result = self.schema.execute(self.query, root=items)
+            if result.errors:
+                raise result.errors[0]
+            return result.data
+
+        yield "execute", execute
+        yield "serialize", json.dumps
+
+    def run(self, repeat: int) -> dict:
+        """Returns the duration and allocations of every stage"""
+        durations = collections.defaultdict(list)
+        for _ in range(repeat):
+            value = self.response
+            for name, stage in self.stages():
+                start = time.perf_counter()
+                value = stage(value)
+                durations[name].append(time.perf_counter() - start)
+
+        results = collections.OrderedDict()
+        value = self.response
+        for name, stage in self.stages():
+            tracemalloc.start()
+            value = stage(value)
+            retained, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            seconds = statistics.median(durations[name])
+            results[name] = {
+                "seconds": seconds,
+                "per_item_us": seconds * 1e6 / self.size,
+                "peak_bytes": peak,
+                "retained_bytes": retained,
+                "retained_per_item_bytes": retained / self.size
+            }
+        return results
+
+
+def run_benchmarks(names=None, sizes=SIZES, progress=None) -> dict:
+    """Runs the benchmarks of the conversions, all by default
+
+    progress: optional function called with the name and size
+              before each benchmark
+    """
+    results = collections.OrderedDict()
+    for name in names or CONVERSIONS:
+        results[name] = collections.OrderedDict()
+        for size in sizes:
+            if progress is not None:
+                progress(name, size)
+            benchmark = ConversionBenchmark(CONVERSIONS[name], size)
+            results[name][str(size)] = benchmark.run(
+                repeat=max(1, ITEMS_PER_SIZE // size))
+    return results
@@ -3,11 +3,49 @@ License, v. 2.0. If a copy of the MPL was not distributed with this
 file, You can obtain one at http://mozilla.org/MPL/2.0/.
 """
 
+import collections
+
 import graphene
 from graphene_django.types import DjangoObjectType
 from backend.lnd import models
 
 
+def row_type(graphene_type, **nested):
+    """Returns a namedtuple type with the fields of the graphene type
+
+    Graphene resolves the fields of any object by attribute. The rows
+    keep the fields in a tuple instead of a per-instance __dict__ and
+    take a fraction of the memory of the graphene objects, which
+    matters for list responses with thousands of items.
+    Row.from_dict(data) builds a row from a dict of an LND response,
+    missing fields get the default value of the graphene field.
+
+    nested: row types of the items of nested lists by field name
+    """
+    fields = graphene_type._meta.fields
+    names = tuple(fields)
+    defaults = tuple(field.default_value for field in fields.values())
+    nested_indexes = tuple((names.index(name), item_type)
+                           for name, item_type in nested.items())
+
+    def from_dict(cls, data: dict):
+        values = [
+            data.get(name, default) for name, default in zip(names, defaults)
+        ]
+        for index, item_type in nested_indexes:
+            if names[index] in data:
+                values[index] = [
+                    item_type.from_dict(item) for item in values[index]
+                ]
+        return tuple.__new__(cls, values)
+
+    name = graphene_type._meta.name + "Row"
+    return type(name, (collections.namedtuple(name, names), ), {
+        "__slots__": (),
+        "from_dict": classmethod(from_dict)
+    })
+
+
 class ResponseStatus(graphene.ObjectType):
     def __init__(self, code: int, form_error: str = "", suggestions: str = ""):
         super().__init__()
@@ -227,6 +265,9 @@ class LnPayment(graphene.ObjectType):
     payment_preimage = graphene.String(description="The payment preimage")
 
 
+LnPaymentRow = row_type(LnPayment)
+
+
 class LnGenSeedResponse(graphene.ObjectType):
     """https://api.lightning.community/?python#genseed"""
 
@@ -252,10 +293,10 @@ class LnListPaymentsResponse(graphene.ObjectType):
 
     def __init__(self, data: dict):
         super().__init__()
-        self.payments = []
-        if "payments" in data:
-            for payment in data["payments"]:
-                self.payments.append(LnPayment(payment))
+        self.payments = [
+            LnPaymentRow.from_dict(payment)
+            for payment in data.get("payments", [])
+        ]
 
     payments = graphene.List(LnPayment, description="The list of payments")
 
@@ -308,13 +349,16 @@ class LnTransaction(graphene.ObjectType):
         description="Addresses that received funds for this transaction")
 
 
+LnTransactionRow = row_type(LnTransaction)
+
+
 class LnTransactionDetails(graphene.ObjectType):
     def __init__(self, data: dict):
         super().__init__()
-        self.transactions = []
-        if "transactions" in data:
-            for ta in data["transactions"]:
-                self.transactions.append(LnTransaction(ta))
+        self.transactions = [
+            LnTransactionRow.from_dict(ta)
+            for ta in data.get("transactions", [])
+        ]
 
     transactions = graphene.List(
         LnTransaction,
@@ -392,6 +436,9 @@ class LnInvoice(graphene.ObjectType):
     )
 
 
+LnInvoiceRow = row_type(LnInvoice, route_hints=row_type(LnHopHint))
+
+
 class LnAddInvoiceResponse(graphene.ObjectType):
     """https://api.lightning.community/?python#addinvoiceresponse"""
 
@@ -516,6 +563,9 @@ class LnChannel(graphene.ObjectType):
         description="Whether this channel is advertised to the network or not")
 
 
+LnChannelRow = row_type(LnChannel, pending_htlcs=row_type(LnHTLC))
+
+
 class LnPeer(graphene.ObjectType):
     """https://api.lightning.community/#peer"""
 
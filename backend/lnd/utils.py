@@ -12,16 +12,24 @@ import subprocess
 
 import aiogrpc
 import grpc
-import psutil
+from django.conf import settings
 
 from backend.error_responses import ServerError, WalletInstanceNotRunning
-from backend.lnd.models import IPAddress
+from backend.lnd.models import IPAddress, LNDWallet
+from backend.lnd.ports import get_port_allocation, is_local_host, slot_ports
+from backend.lnd.rpc import LazyModule, ln, lnrpc
+from backend.metrics import RpcMetricsInterceptor
+from backend.request_cache import request_cache
+from backend.tracing import RpcTracingInterceptor, start_span
 
 CONFIG = configparser.ConfigParser()
 CONFIG.read("config.ini")
 
 LOGGER = logging.getLogger(__name__)
 
+# only needed to look up LND processes, imported on first use
+psutil = LazyModule("psutil")
+
 ChannelData = collections.namedtuple('ChannelData',
                                      ['channel', 'macaroon', 'error'])
 
@@ -38,6 +46,7 @@ LNDWalletConfig = collections.namedtuple('LNDWalletConfig', [
     "rpc_listen_port_ipv6",
     "rest_port_ipv4",
     "rest_port_ipv6",
+    "rpc_server",
 ])
 
 BTCNodeConfig = collections.namedtuple(
@@ -101,8 +110,18 @@ class ChannelCache():
             return channel_data
         except KeyError:
             # channel does not yet exist, open it
-            channel_data = self._open_channel(rpc_server, rpc_port, cert_path,
-                                              macaroon_path, is_async)
+            with start_span(
+                    "lnd.channel.open",
+                    attributes={
+                        "net.peer.name": rpc_server,
+                        "net.peer.port": rpc_port,
+                        "lnd.async": is_async
+                    }) as span:
+                channel_data = self._open_channel(
+                    rpc_server, rpc_port, cert_path, macaroon_path, is_async)
+                if channel_data.error is not None:
+                    span.set_attribute("lnd.error",
+                                       type(channel_data.error).__name__)
             if channel_data.channel and channel_data.error is None:
                 # only add channels in case there was no error
                 self._cache[_hash] = channel_data
@@ -141,6 +160,8 @@ class ChannelCache():
                 creds = grpc.ssl_channel_credentials(cert)
                 channel = grpc.secure_channel(rpc_url, creds)
                 grpc.channel_ready_future(channel).result(timeout=2)
+                channel = grpc.intercept_channel(
+                    channel, RpcMetricsInterceptor(), RpcTracingInterceptor())
 
         except grpc.RpcError as exc:
             # pylint: disable=E1101
@@ -172,16 +193,31 @@ def build_grpc_channel_manual(rpc_server,
                              is_async, rebuild)
 
 
+def get_user_wallet(context):
+    """Returns the wallet of the requesting user or None
+
+    The wallet is looked up once per request and then shared by
+    all resolvers of the request.
+    """
+    user = context.user
+    return request_cache(context).get_or_compute(
+        ("wallet", user.pk),
+        lambda: LNDWallet.objects.filter(owner=user).first(),
+        cache_if=lambda wallet: wallet is not None)
+
+
 def build_lnd_wallet_config(pk) -> LNDWalletConfig:
     """Generates the wallet configuration from the wallet id
 
+    The host and ports are taken from the port allocation of the
+    wallet. Wallets without an allocation get one assigned.
+
     pk: The wallet id
     """
     path = os.path.join(CONFIG["DEFAULT"]["lnd_data_path"], str(pk))
 
-    default_listen_port = 19739
-    default_rpc_port = 12009
-    default_rest_port = 8079
+    allocation = get_port_allocation(pk)
+    ports = slot_ports(allocation.slot)
 
     return LNDWalletConfig(
         data_dir=path,
@@ -190,12 +226,13 @@ def build_lnd_wallet_config(pk) -> LNDWalletConfig:
         admin_macaroon_path=path + "/admin.macaroon",
         read_only_macaroon_path=path + "/readonly.macaroon",
         log_dir=path + "/logs",
-        listen_port_ipv6=default_listen_port + pk * 2,
-        listen_port_ipv4=default_listen_port + pk * 2 - 1,
-        rpc_listen_port_ipv6=default_rpc_port + pk * 2,
-        rpc_listen_port_ipv4=default_rpc_port + pk * 2 - 1,
-        rest_port_ipv6=default_rest_port + pk * 2,
-        rest_port_ipv4=default_rest_port + pk * 2 - 1)
+        listen_port_ipv6=ports.listen_port_ipv6,
+        listen_port_ipv4=ports.listen_port_ipv4,
+        rpc_listen_port_ipv6=ports.rpc_listen_port_ipv6,
+        rpc_listen_port_ipv4=ports.rpc_listen_port_ipv4,
+        rest_port_ipv6=ports.rest_port_ipv6,
+        rest_port_ipv4=ports.rest_port_ipv4,
+        rpc_server=allocation.host)
 
 
 def build_lnd_startup_args(autopilot: bool, wallet):
@@ -227,6 +264,15 @@ def build_lnd_startup_args(autopilot: bool, wallet):
         network,
     ]
 
+    if not is_local_host(cfg.rpc_server):
+        # the daemon lives on another host of the fleet,
+        # the API must be able to reach its RPC interface
+        lnd_args.extend([
+            "--rpclisten={}:{}".format(cfg.rpc_server,
+                                       cfg.rpc_listen_port_ipv4),
+            "--tlsextraip={}".format(cfg.rpc_server),
+        ])
+
     node_cfg = get_node_config()
 
     if node == "btcd":
@@ -281,6 +327,84 @@ def lnd_instance_is_running(cfg: LNDWalletConfig) -> bool:
     return psutil.pid_exists(int(output[0]))
 
 
+def rpc_deadline(method: str) -> float:
+    """Returns the deadline in seconds for unary calls of the RPC,
+    see LND_RPC["DEADLINES"]"""
+    deadlines = settings.LND_RPC["DEADLINES"]
+    return deadlines.get(method, deadlines["default"])
+
+
+def lnd_wallet_is_locked(cfg: LNDWalletConfig) -> bool:
+    """Checks whether the running LND instance still waits to be unlocked
+
+    A locked LND instance only serves the WalletUnlocker service,
+    so GetInfo returns UNIMPLEMENTED until the wallet is unlocked.
+    Any other outcome is treated as not locked.
+    """
+    channel_data = build_grpc_channel_manual(
+        rpc_server=cfg.rpc_server,
+        rpc_port=cfg.rpc_listen_port_ipv4,
+        cert_path=cfg.tls_cert_path,
+        macaroon_path=cfg.admin_macaroon_path)
+
+    if channel_data.error is not None:
+        return False
+
+    stub = lnrpc.LightningStub(channel_data.channel)
+    try:
+        stub.GetInfo(
+            ln.GetInfoRequest(),
+            metadata=[('macaroon', channel_data.macaroon)],
+            timeout=rpc_deadline("GetInfo"))
+    except grpc.RpcError as exc:
+        # pylint: disable=E1101
+        return exc.code() == grpc.StatusCode.UNIMPLEMENTED
+
+    return False
+
+
+def spawn_lnd_process(autopilot: bool, wallet) -> subprocess.Popen:
+    """Starts a new LND process for the given wallet
+
+    The process is started in its own process group so it
+    survives a restart of the process that spawned it.
+
+    Returns:
+        The Popen object of the new process
+    """
+    args = build_lnd_startup_args(autopilot, wallet)
+
+    if not os.path.exists(args["data_dir"]):
+        os.makedirs(args["data_dir"])
+
+    return subprocess.Popen(
+        args["args"],
+        cwd=r'{}'.format(args["data_dir"]),
+        preexec_fn=os.setpgrp)
+
+
+def lnd_processes() -> dict:
+    """Maps the data dir of every running LND process to its psutil.Process"""
+    processes = {}
+    for proc in psutil.process_iter(attrs=["cmdline"]):
+        cmdline = proc.info["cmdline"] or []
+        if not any(os.path.basename(arg) == "lnd" for arg in cmdline):
+            continue
+        for arg in cmdline:
+            if arg.startswith("--datadir="):
+                processes[arg[len("--datadir="):]] = proc
+    return processes
+
+
+def find_lnd_process(cfg: LNDWalletConfig):
+    """Searches the LND process that uses the data dir of the given config
+
+    Returns:
+        A psutil.Process or None if no such process is running
+    """
+    return lnd_processes().get(cfg.data_dir)
+
+
 def process_lnd_doc_string(doc: str):
     lines = doc.splitlines()
     new_doc_string = ""
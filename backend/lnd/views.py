@@ -3,6 +3,69 @@ License, v. 2.0. If a copy of the MPL was not distributed with this
 file, You can obtain one at http://mozilla.org/MPL/2.0/.
 """
 
-from django.shortcuts import render
+import grpc
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 
-# Create your views here.
+from backend.error_responses import (ServerError, Unauthenticated,
+                                     WalletInstanceNotFound,
+                                     WalletInstanceNotRunning)
+from backend.lnd.export import (EXPORTS, FORMATS, chunks, export_rows,
+                                export_setting, render_export)
+from backend.lnd.rpc_client import WalletUnavailable, lnd_client
+from backend.lnd.utils import (build_grpc_channel_manual,
+                               build_lnd_wallet_config, get_user_wallet)
+
+
+def _error(error, status: int) -> JsonResponse:
+    return JsonResponse({"error_message": error.error_message}, status=status)
+
+
+def export_view(request, kind: str):
+    """Streams the payments, invoices or transactions of the wallet
+    of the user as NDJSON or, with ?format=csv, as CSV
+
+    See backend.lnd.export.
+    """
+    if kind not in EXPORTS:
+        raise Http404("Unknown export {}".format(kind))
+    format_name = request.GET.get("format", "ndjson")
+    if format_name not in FORMATS:
+        return _error(
+            ServerError(error_message="Unknown format, use one of " +
+                        ", ".join(sorted(FORMATS))), 400)
+
+    if not request.user.is_authenticated:
+        return _error(Unauthenticated(), 401)
+
+    wallet = get_user_wallet(request)
+    if wallet is None:
+        return _error(WalletInstanceNotFound(), 404)
+
+    cfg = build_lnd_wallet_config(wallet.pk)
+    channel_data = build_grpc_channel_manual(
+        rpc_server=cfg.rpc_server,
+        rpc_port=cfg.rpc_listen_port_ipv4,
+        cert_path=cfg.tls_cert_path,
+        macaroon_path=cfg.admin_macaroon_path)
+    if channel_data.error is not None:
+        return _error(channel_data.error, 503)
+
+    client = lnd_client(None, wallet.pk, channel_data)
+    try:
+        rows = export_rows(client, kind)
+    except WalletUnavailable:
+        return _error(WalletInstanceNotRunning(), 503)
+    except grpc.RpcError as exc:
+        # pylint: disable=E1101
+        return _error(
+            ServerError.generic_rpc_error(exc.code(), exc.details()), 502)
+
+    export_format = FORMATS[format_name]
+    response = StreamingHttpResponse(
+        chunks(
+            render_export(export_format, kind, rows),
+            export_setting("CHUNK_SIZE")),
+        content_type=export_format.content_type)
+    response["Content-Disposition"] = "attachment; filename={}.{}".format(
+        kind, format_name)
+    return response
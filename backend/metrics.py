@@ -0,0 +1,308 @@
+"""This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+Metrics of the GraphQL API in the Prometheus text format.
+
+- graphql_resolver_duration_seconds: resolver duration by type and
+  field, recorded by backend.middleware.MetricsMiddleware for the
+  root fields or all fields, see METRICS["ALL_FIELDS"]
+- lnd_rpc_duration_seconds: latency of the unary LND calls by method
+  and status code, recorded by the RpcMetricsInterceptor of the gRPC
+  channels
+- graphql_request_db_queries: database queries issued by the
+  resolvers of one HTTP request
+- graphql_subscription_events_total and graphql_subscriptions_active:
+  events sent to and operations of the subscribers by root field
+
+The values are kept in memory by every process, Prometheus scrapes
+each worker on its own at /metrics.
+"""
+
+import collections
+import threading
+import time
+
+import grpc
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from backend.slow_log import operation_log
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                    10.0, 30.0)
+
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+REGISTRY = collections.OrderedDict()
+
+
+def metrics_setting(name: str):
+    """Returns the value of the given METRICS setting"""
+    return settings.METRICS[name]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace(
+        "\"", "\\\"")
+
+
+def _format_labels(names, values) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join("{}=\"{}\"".format(name, _escape(value))
+                          for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric():
+    """Base class of all metrics, the values are kept per label set"""
+
+    type_name = None
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY[name] = self
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        """Yields the name, label names, label values and value
+        of all samples"""
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in sorted(values):
+            yield self.name, self.labelnames, key, value
+
+    def render(self) -> str:
+        lines = [
+            "# HELP {} {}".format(self.name, self.documentation),
+            "# TYPE {} {}".format(self.name, self.type_name)
+        ]
+        for name, labelnames, labelvalues, value in self.samples():
+            lines.append("{}{} {}".format(
+                name, _format_labels(labelnames, labelvalues),
+                _format_value(value)))
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type_name = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Counter):
+    type_name = "gauge"
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    type_name = "histogram"
+
+    def __init__(self,
+                 name: str,
+                 documentation: str,
+                 labelnames=(),
+                 buckets=DURATION_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets) + (float("inf"), )
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # one count per bucket and the sum
+                counts = [0] * len(self.buckets) + [0]
+                self._values[key] = counts
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            counts[-1] += value
+
+    def count(self, **labels) -> int:
+        counts = self._values.get(self._key(labels))
+        return 0 if counts is None else counts[-2]
+
+    def samples(self):
+        labelnames = self.labelnames + ("le", )
+        for _, _, key, counts in super().samples():
+            for bound, count in zip(self.buckets, counts):
+                yield (self.name + "_bucket", labelnames,
+                       key + (_format_value(bound), ), count)
+            yield self.name + "_sum", self.labelnames, key, counts[-1]
+            yield self.name + "_count", self.labelnames, key, counts[-2]
+
+
+def render_metrics() -> str:
+    """Returns all metrics in the Prometheus text format"""
+    return "\n".join(metric.render() for metric in REGISTRY.values()) + "\n"
+
+
+RESOLVER_DURATION = Histogram(
+    "graphql_resolver_duration_seconds",
+    "Duration of the GraphQL resolvers in seconds", ["type", "field"])
+
+LND_RPC_DURATION = Histogram("lnd_rpc_duration_seconds",
+                             "Latency of the unary LND calls in seconds",
+                             ["method", "code"])
+
+REQUEST_DB_QUERIES = Histogram(
+    "graphql_request_db_queries",
+    "Database queries issued by the resolvers of one request",
+    buckets=QUERY_BUCKETS)
+
+SUBSCRIPTION_EVENTS = Counter("graphql_subscription_events_total",
+                              "Events sent to the subscribers",
+                              ["subscription"])
+
+SUBSCRIPTIONS_ACTIVE = Gauge("graphql_subscriptions_active",
+                             "Running subscription operations",
+                             ["subscription"])
+
+
+class RpcMetricsInterceptor(grpc.UnaryUnaryClientInterceptor):
+    """Records the latency and status code of the unary calls"""
+
+    def intercept_unary_unary(self, continuation, client_call_details,
+                              request):
+        method = client_call_details.method.rsplit("/", 1)[-1]
+        start = time.perf_counter()
+
+        def observe(outcome):
+            LND_RPC_DURATION.observe(
+                time.perf_counter() - start,
+                method=method,
+                code=outcome.code().name)
+
+        try:
+            outcome = continuation(client_call_details, request)
+        except grpc.RpcError as exc:
+            # blocking calls raise instead of returning the failure
+            observe(exc)
+            raise
+        outcome.add_done_callback(observe)
+        return outcome
+
+
+# QueryCounters which count the queries of all threads
+_QUERY_COUNTERS = set()
+
+# the context of the request the thread is resolving fields for
+_CURRENT = threading.local()
+
+
+def _count_query(execute, sql, params, many, context):
+    for counter in list(_QUERY_COUNTERS):
+        counter.add()
+
+    request = getattr(_CURRENT, "request", None)
+    if request is None:
+        return execute(sql, params, many, context)
+
+    request_queries(request).add()
+    log = operation_log(request)
+    if log is None:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        log.add_query(sql, start)
+
+
+def _install_query_hook(sender=None, connection=None, **kwargs):
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+# Connections are kept by the threads of the executors, so every
+# connection gets the hook once instead of wrapping them on demand
+connection_created.connect(_install_query_hook)
+
+_CREATE_LOCK = threading.Lock()
+
+
+class QueryCounter():
+    """Counts database queries
+
+    Used as context manager the queries of all threads are counted.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def add(self):
+        with self._lock:
+            self.count += 1
+
+    def __enter__(self):
+        for connection in connections.all():
+            _install_query_hook(connection=connection)
+        _QUERY_COUNTERS.add(self)
+        return self
+
+    def __exit__(self, *args):
+        _QUERY_COUNTERS.discard(self)
+
+
+def request_queries(context) -> QueryCounter:
+    """Returns the counter of the queries of the request
+    the context belongs to"""
+    counter = getattr(context, "db_queries", None)
+    if counter is None:
+        with _CREATE_LOCK:
+            counter = getattr(context, "db_queries", None)
+            if counter is None:
+                counter = QueryCounter()
+                context.db_queries = counter
+    return counter
+
+
+class counting_queries():
+    """Counts the queries the current thread issues within the block
+    as queries of the request and adds them to its operation log"""
+
+    def __init__(self, context):
+        # the context of subscriptions is the scope dict
+        self.request = None if isinstance(context, dict) else context
+
+    def __enter__(self):
+        self.previous = getattr(_CURRENT, "request", None)
+        _CURRENT.request = self.request
+        if not getattr(_CURRENT, "hooked", False):
+            # connections opened before this module was imported
+            for connection in connections.all():
+                _install_query_hook(connection=connection)
+            _CURRENT.hooked = True
+
+    def __exit__(self, *args):
+        _CURRENT.request = self.previous
+
+
+def observe_request(request):
+    """Records the metrics of a finished HTTP request"""
+    counter = getattr(request, "db_queries", None)
+    REQUEST_DB_QUERIES.observe(0 if counter is None else counter.count)
@@ -6,7 +6,17 @@ file, You can obtain one at http://mozilla.org/MPL/2.0/.
 Hosts all middlewares necessary for the project
 """
 
-from rest_framework_jwt.authentication import JSONWebTokenAuthentication
+import time
+
+from promise import Promise, is_thenable
+
+from backend.authentication import TOKEN_VERIFIER, token_from_header
+from backend.error_responses import WalletInstanceNotRunning
+from backend.lnd.hibernation import record_activity
+from backend.lnd.rpc_client import WalletUnavailable
+from backend.metrics import (RESOLVER_DURATION, counting_queries,
+                             metrics_setting)
+from backend.tracing import request_span, start_span, use_span
 
 
 class JWTMiddleware(object):
@@ -21,13 +31,126 @@ class JWTMiddleware(object):
         return self.get_response(request)
 
     def process_view(self, request, view_func, view_args, view_kwargs):
-        token = request.META.get('HTTP_AUTHORIZATION', '')
-        if not token.startswith('JWT'):
+        token = token_from_header(request.META.get('HTTP_AUTHORIZATION', ''))
+        if token is None:
             return
-        jwt_auth = JSONWebTokenAuthentication()
-        auth = None
+        user = TOKEN_VERIFIER.verify(token)
+        if user is not None:
+            request.user = user
+
+
+class WalletActivityMiddleware(object):
+    """
+    Records the activity of authenticated users and wakes up their hibernated wallets.
+    Must be placed after the JWTMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        record_activity(request.user)
+
+
+class WalletUnavailableMiddleware(object):
+    """
+    Graphene middleware which answers with WalletInstanceNotRunning when
+    the gRPC gateway refuses to call a failing or overloaded LND daemon.
+    """
+
+    def resolve(self, next, root, info, **args):
+        def not_running(exc):
+            possible_types = getattr(info.return_type, "types", ())
+            if not isinstance(exc, WalletUnavailable) or \
+                    WalletInstanceNotRunning._meta.name not in [
+                        possible_type.name for possible_type in possible_types
+                    ]:
+                raise exc
+            return WalletInstanceNotRunning()
+
         try:
-            auth = jwt_auth.authenticate(request)
+            result = next(root, info, **args)
+        except WalletUnavailable as exc:
+            return not_running(exc)
+
+        if is_thenable(result):
+            return Promise.resolve(result).catch(not_running)
+        return result
+
+
+class MetricsMiddleware(object):
+    """
+    Graphene middleware which records the duration of the resolvers
+    and counts the database queries they issue, see backend.metrics.
+    Only root fields are timed unless METRICS["ALL_FIELDS"] is set.
+    """
+
+    def resolve(self, next, root, info, **args):
+        if len(info.path) > 1 and not metrics_setting("ALL_FIELDS"):
+            with counting_queries(info.context):
+                return next(root, info, **args)
+
+        start = time.perf_counter()
+
+        def observe():
+            RESOLVER_DURATION.observe(
+                time.perf_counter() - start,
+                type=info.parent_type.name,
+                field=info.field_name)
+
+        def resolved(value):
+            observe()
+            return value
+
+        def failed(exc):
+            observe()
+            raise exc
+
+        try:
+            with counting_queries(info.context):
+                result = next(root, info, **args)
         except Exception:
-            return
-        request.user = auth[0]
+            observe()
+            raise
+
+        if is_thenable(result):
+            return Promise.resolve(result).then(resolved, failed)
+        return resolved(result)
+
+
+class TracingMiddleware(object):
+    """
+    Graphene middleware which traces the resolvers of the root fields
+    as children of the span of the request, see backend.tracing.
+    """
+
+    def resolve(self, next, root, info, **args):
+        if len(info.path) > 1:
+            return next(root, info, **args)
+
+        span = start_span(
+            "resolve {}.{}".format(info.parent_type.name, info.field_name),
+            parent=request_span(info.context),
+            attributes={"graphql.field": info.field_name})
+
+        def resolved(value):
+            span.end()
+            return value
+
+        def failed(exc):
+            span.set_error(exc)
+            span.end()
+            raise exc
+
+        try:
+            with use_span(span):
+                result = next(root, info, **args)
+        except Exception as exc:
+            return failed(exc)
+
+        if is_thenable(result):
+            return Promise.resolve(result).then(resolved, failed)
+        return resolved(result)
@@ -0,0 +1,85 @@
+"""
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+Automatic persisted queries as implemented by Apollo
+https://github.com/apollographql/apollo-link-persisted-queries
+
+Clients send only the sha256 hash of the query in the
+extensions.persistedQuery field. If the server doesn't know the
+hash yet, it answers with a PersistedQueryNotFound error and the
+client sends the hash together with the query to register it.
+"""
+
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from graphql import GraphQLError
+
+from backend.graphql_backend import document_hash
+
+
+class PersistedQueryError(GraphQLError):
+    def __init__(self, message: str, code: str):
+        super().__init__(message, extensions={"code": code})
+
+
+def persisted_query_setting(name: str):
+    """Returns the value of the given PERSISTED_QUERIES setting"""
+    return settings.PERSISTED_QUERIES[name]
+
+
+def _cache_key(sha256_hash: str) -> str:
+    return "persisted_query_{}".format(sha256_hash)
+
+
+def get_extensions(request, data) -> dict:
+    """Returns the extensions of a GraphQL HTTP request"""
+    extensions = request.GET.get("extensions") or data.get("extensions")
+    if isinstance(extensions, str):
+        try:
+            extensions = json.loads(extensions)
+        except ValueError:
+            extensions = None
+    return extensions if isinstance(extensions, dict) else {}
+
+
+def resolve_persisted_query(query: str, extensions: dict) -> str:
+    """Returns the query to execute
+
+    query: the query text of the request, might be empty
+    extensions: the extensions field of the request
+
+    Raises:
+        PersistedQueryError if the hash is unknown or does not
+        match the query
+    """
+    persisted = (extensions or {}).get("persistedQuery")
+    if not persisted:
+        return query
+
+    if persisted.get("version") != 1:
+        raise PersistedQueryError("Unsupported persisted query version",
+                                  "PERSISTED_QUERY_NOT_SUPPORTED")
+
+    sha256_hash = persisted.get("sha256Hash")
+    if not isinstance(sha256_hash, str):
+        raise PersistedQueryError("sha256Hash is missing",
+                                  "PERSISTED_QUERY_NOT_SUPPORTED")
+
+    if query:
+        if document_hash(query) != sha256_hash:
+            raise PersistedQueryError("provided sha does not match query",
+                                      "PERSISTED_QUERY_HASH_MISMATCH")
+        cache.set(
+            _cache_key(sha256_hash), query,
+            persisted_query_setting("TIMEOUT"))
+        return query
+
+    query = cache.get(_cache_key(sha256_hash))
+    if query is None:
+        raise PersistedQueryError("PersistedQueryNotFound",
+                                  "PERSISTED_QUERY_NOT_FOUND")
+    return query
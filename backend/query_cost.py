@@ -0,0 +1,212 @@
+"""
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+Estimates the cost of GraphQL operations before they are executed.
+
+Every field has a weight, see GRAPHQL_QUERY_COST["FIELD_COSTS"].
+The cost of a field is its weight plus the cost of its selections,
+multiplied by the number of pages requested by its pagination
+arguments. Operations above MAX_COST are rejected and every wallet
+may only spend WALLET_BUDGET per WALLET_WINDOW seconds, so a single
+user can't keep the LND host busy with full history dumps.
+"""
+
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from graphql import GraphQLError
+from graphql.execution.values import get_argument_values, get_variable_values
+from graphql.language import ast
+
+from backend.lnd.utils import get_user_wallet
+
+
+class QueryCostError(GraphQLError):
+    def __init__(self, message: str, code: str, cost: int):
+        super().__init__(message, extensions={"code": code, "cost": cost})
+
+
+def query_cost_setting(name: str):
+    """Returns the value of the given GRAPHQL_QUERY_COST setting"""
+    return settings.GRAPHQL_QUERY_COST[name]
+
+
+def _named_type(graphql_type):
+    while hasattr(graphql_type, "of_type"):
+        graphql_type = graphql_type.of_type
+    return graphql_type
+
+
+def _get_operation(document_ast, operation_name):
+    operations = [
+        definition for definition in document_ast.definitions
+        if isinstance(definition, ast.OperationDefinition)
+    ]
+    if operation_name:
+        for operation in operations:
+            if operation.name and operation.name.value == operation_name:
+                return operation
+        return None
+    return operations[0] if len(operations) == 1 else None
+
+
+def _root_type(schema, operation):
+    if operation.operation == "mutation":
+        return schema.get_mutation_type()
+    if operation.operation == "subscription":
+        return schema.get_subscription_type()
+    return schema.get_query_type()
+
+
+class _CostEstimator():
+    def __init__(self, schema, fragments, variables):
+        self.schema = schema
+        self.fragments = fragments
+        self.variables = variables
+        self.field_costs = query_cost_setting("FIELD_COSTS")
+        self.default_cost = query_cost_setting("DEFAULT_FIELD_COST")
+        self.page_sizes = query_cost_setting("PAGINATION_ARGUMENTS")
+
+    def selection_set(self, parent_type, selection_set, spread=()) -> int:
+        cost = 0
+        for selection in selection_set.selections:
+            if isinstance(selection, ast.Field):
+                cost += self.field(parent_type, selection, spread)
+            elif isinstance(selection, ast.InlineFragment):
+                fragment_type = parent_type
+                if selection.type_condition:
+                    fragment_type = self.schema.get_type(
+                        selection.type_condition.name.value)
+                cost += self.selection_set(fragment_type,
+                                           selection.selection_set, spread)
+            elif isinstance(selection, ast.FragmentSpread):
+                name = selection.name.value
+                fragment = self.fragments.get(name)
+                if fragment is None or name in spread:
+                    continue
+                cost += self.selection_set(
+                    self.schema.get_type(fragment.type_condition.name.value),
+                    fragment.selection_set, spread + (name, ))
+        return cost
+
+    def field(self, parent_type, field, spread) -> int:
+        name = field.name.value
+        if name.startswith("__"):
+            return 0
+
+        field_def = getattr(parent_type, "fields", {}).get(name)
+
+        if field.selection_set is None:
+            return self.field_costs.get(name, 0)
+
+        field_type = _named_type(field_def.type) if field_def else None
+        children = self.selection_set(field_type, field.selection_set, spread)
+        weight = self.field_costs.get(name, self.default_cost)
+        return self.pages(field_def, field) * (weight + children)
+
+    def pages(self, field_def, field) -> int:
+        """Returns the number of pages requested by the field"""
+        if field_def is None or not field_def.args:
+            return 1
+
+        try:
+            values = get_argument_values(field_def.args, field.arguments,
+                                         self.variables)
+        except (GraphQLError, TypeError, ValueError):
+            return 1
+
+        pages = 1
+        for name, arg_def in field_def.args.items():
+            page_size = self.page_sizes.get(name)
+            value = values.get(arg_def.out_name or name)
+            if page_size and isinstance(value, int) and value > 0:
+                pages = max(pages, math.ceil(value / page_size))
+        return pages
+
+
+def query_cost(schema, document_ast, variables=None,
+               operation_name=None) -> int:
+    """Returns the estimated cost of the operation
+
+    Operations which can't be executed, e.g. because of invalid
+    variables, cost nothing. Their execution fails anyway.
+    """
+    operation = _get_operation(document_ast, operation_name)
+    if operation is None:
+        return 0
+
+    try:
+        variables = get_variable_values(
+            schema, operation.variable_definitions or [], variables or {})
+    except (GraphQLError, TypeError, ValueError):
+        return 0
+
+    fragments = {
+        definition.name.value: definition
+        for definition in document_ast.definitions
+        if isinstance(definition, ast.FragmentDefinition)
+    }
+    estimator = _CostEstimator(schema, fragments, variables)
+    return estimator.selection_set(
+        _root_type(schema, operation), operation.selection_set)
+
+
+def check_query_cost(schema, document_ast, variables=None,
+                     operation_name=None) -> int:
+    """Returns the cost of the operation
+
+    Raises:
+        QueryCostError if the cost is above MAX_COST
+    """
+    cost = query_cost(schema, document_ast, variables, operation_name)
+    max_cost = query_cost_setting("MAX_COST")
+    if cost > max_cost:
+        raise QueryCostError(
+            "Query cost {} exceeds the maximum cost of {}".format(
+                cost, max_cost), "QUERY_TOO_EXPENSIVE", cost)
+    return cost
+
+
+def charge_wallet(wallet_pk: int, cost: int):
+    """Charges the cost to the budget of the wallet
+
+    Raises:
+        QueryCostError if the budget of the current window is spent
+    """
+    window = query_cost_setting("WALLET_WINDOW")
+    key = "query_cost_{}_{}".format(wallet_pk, int(time.time() // window))
+
+    cache.add(key, 0, window)
+    try:
+        spent = cache.incr(key, cost)
+    except ValueError:
+        # expired in the meantime
+        spent = cost
+        cache.set(key, spent, window)
+
+    if spent > query_cost_setting("WALLET_BUDGET"):
+        raise QueryCostError(
+            "Query budget of the wallet is spent, try again later",
+            "WALLET_THROTTLED", cost)
+
+
+def admit_request(request, document, variables=None, operation_name=None):
+    """Rejects expensive operations of an HTTP request
+
+    The cost is charged to the wallet of the requesting user.
+
+    Raises:
+        QueryCostError
+    """
+    cost = check_query_cost(document.schema, document.document_ast,
+                            variables, operation_name)
+
+    user = getattr(request, "user", None)
+    if cost and user is not None and user.is_authenticated:
+        wallet = get_user_wallet(request)
+        if wallet is not None:
+            charge_wallet(wallet.pk, cost)
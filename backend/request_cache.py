@@ -0,0 +1,79 @@
+"""
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+Values shared by all resolvers of one HTTP request.
+
+The operations of a batched request and the root fields of a query
+are resolved concurrently in several threads. Looking up the same
+key from several threads at once computes the value only once, the
+other threads wait for the result.
+"""
+
+import threading
+from concurrent.futures import Future
+
+_CREATE_LOCK = threading.Lock()
+
+
+class RequestCache():
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute, cache_if=None):
+        """Returns the cached value of the key or computes it
+
+        compute: function without arguments returning the value
+        cache_if: optional predicate, values for which it returns
+                  False are not kept for later lookups
+        """
+        with self._lock:
+            future = self._values.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                self._values[key] = future
+
+        if not is_owner:
+            return future.result()
+
+        try:
+            value = compute()
+        except Exception as exc:
+            self._remove(key, future)
+            future.set_exception(exc)
+            raise
+
+        if cache_if is not None and not cache_if(value):
+            self._remove(key, future)
+
+        future.set_result(value)
+        return value
+
+    def discard(self, predicate):
+        """Removes all keys for which the predicate returns True
+
+        Lookups which are already waiting for a value still get it.
+        """
+        with self._lock:
+            for key in [key for key in self._values if predicate(key)]:
+                del self._values[key]
+
+    def _remove(self, key, future):
+        with self._lock:
+            if self._values.get(key) is future:
+                del self._values[key]
+
+
+def request_cache(context) -> RequestCache:
+    """Returns the cache of the request the context belongs to"""
+    cache = getattr(context, "request_cache", None)
+    if cache is None:
+        with _CREATE_LOCK:
+            cache = getattr(context, "request_cache", None)
+            if cache is None:
+                cache = RequestCache()
+                context.request_cache = cache
+    return cache
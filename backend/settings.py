@@ -26,6 +26,9 @@ LOGGING = {
         'simple': {
             'format': '%(levelname)s %(asctime)s %(message)s'
         },
+        'message': {
+            'format': '%(message)s'
+        },
         'django.server': DEFAULT_LOGGING['formatters']['django.server'],
     },
     'handlers': {
@@ -46,6 +49,15 @@ LOGGING = {
             'backupCount': 2,
             'formatter': 'simple',
         },
+        'slow_log': {
+            'level': 'WARNING',
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': BASE_DIR + "/slow_operations.log",
+            'maxBytes': 5000000,
+            'backupCount': 4,
+            'formatter': 'message',
+            'delay': True,
+        },
         'django.server': DEFAULT_LOGGING['handlers']['django.server'],
     },
     'loggers': {
@@ -58,6 +70,11 @@ LOGGING = {
             'handlers': ['console'],
             'propagate': False,
         },
+        'backend.slow_log': {
+            'level': 'WARNING',
+            'handlers': ['slow_log'],
+            'propagate': False,
+        },
         'django.server': DEFAULT_LOGGING['loggers']['django.server'],
         'django.request': {
             'handlers': ['console'],
@@ -104,7 +121,96 @@ INSTALLED_APPS = [
     'graphene_django',
 ]
 
-GRAPHENE = {"MIDDLEWARE": [], 'SCHEMA': 'backend.schema.schema'}
+GRAPHENE = {
+    "MIDDLEWARE": [
+        "backend.middleware.MetricsMiddleware",
+        "backend.middleware.TracingMiddleware",
+        "backend.middleware.WalletUnavailableMiddleware"
+    ],
+    'SCHEMA': 'backend.schema.schema'
+}
+
+# Metrics served at /metrics (backend.metrics)
+METRICS = {
+    # time the resolvers of all fields instead of the root fields only
+    "ALL_FIELDS": False,
+    # addresses allowed to scrape the metrics
+    "ALLOWED_IPS": ["127.0.0.1", "::1"],
+}
+
+# Tracing (backend.tracing)
+TRACING = {
+    # "file", "otlp" or None to disable tracing
+    "EXPORTER": None,
+    # the spans are appended to this file by the file exporter
+    "FILE": BASE_DIR + "/traces.jsonl",
+    # OTLP/HTTP endpoint, see ./manage.py trace_collector
+    "OTLP_ENDPOINT": "http://localhost:4318/v1/traces",
+    "SERVICE_NAME": "fort-bitcoin-gql",
+    # share of the new traces which are recorded
+    "SAMPLE_RATE": 1.0,
+    # seconds between the exports of the finished spans
+    "EXPORT_INTERVAL": 5,
+    # finished spans waiting for the export, further spans are dropped
+    "MAX_QUEUE": 2048,
+}
+
+# Log of slow requests (backend.slow_log), the entries are written
+# to slow_operations.log, see LOGGING
+SLOW_LOG = {
+    # requests taking longer are logged, in seconds
+    "THRESHOLD": 2.0,
+    # share of the requests which record their timeline
+    "SAMPLE_RATE": 0.1,
+    # queries and LND calls kept per request
+    "MAX_EVENTS": 200,
+}
+
+# Number of parsed and validated documents kept in memory
+# by the HTTP views and the subscription server
+GRAPHQL_DOCUMENT_CACHE = {
+    "SIZE": 500,
+    # introspection results built by ./manage.py build_schema_snapshot
+    "SNAPSHOT": os.path.join(BASE_DIR, "schema_snapshot.json"),
+}
+
+# Automatic persisted queries (backend.persisted_queries)
+PERSISTED_QUERIES = {
+    # seconds a registered query is kept in the cache, None keeps it forever
+    "TIMEOUT": 7 * 24 * 60 * 60,
+}
+
+# Batched queries on /gql/ (backend.subscriptions.http, backend.views)
+GRAPHQL_HTTP = {
+    # maximum number of operations in one batched request
+    "MAX_BATCH_SIZE": 20,
+}
+
+# Query cost analysis and admission control (backend.query_cost)
+GRAPHQL_QUERY_COST = {
+    # operations above this cost are rejected before execution
+    "MAX_COST": 1000,
+    # weight of object fields without an entry in FIELD_COSTS,
+    # scalar fields are free
+    "DEFAULT_FIELD_COST": 1,
+    "FIELD_COSTS": {
+        # LND always returns the complete history for these
+        "lnGetTransactions": 50,
+        "lnListPayments": 20,
+        "lnListInvoices": 20,
+        "lnListChannels": 5,
+        "lnListPeers": 5,
+    },
+    # page size of pagination arguments, a field is charged once
+    # per requested page
+    "PAGINATION_ARGUMENTS": {
+        "numMaxPayments": 100,
+        "numMaxInvoices": 100,
+    },
+    # cost a wallet may spend per WALLET_WINDOW seconds
+    "WALLET_BUDGET": 3000,
+    "WALLET_WINDOW": 60,
+}
 
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES':
@@ -125,6 +231,13 @@ JWT_AUTH = {
     'backend.user_profile.handlers.jwt_response_payload_handler',
 }
 
+# Users of verified tokens are cached until the token expires,
+# but at most MAX_AGE seconds (backend.authentication)
+JWT_CACHE = {
+    "SIZE": 10000,
+    "MAX_AGE": 300,
+}
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -135,6 +248,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'backend.middleware.WalletActivityMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -142,11 +256,25 @@ ROOT_URLCONF = 'backend.urls'
 SESSION_ENGINE = "django.contrib.sessions.backends.cache"
 ASGI_APPLICATION = "backend.subscriptions.routing.session_application"
 
-CACHES = {
-    "default": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache"
+# The cache holds the sessions, persisted queries and shared LND
+# responses. LocMemCache is not shared between worker processes.
+if CONFIG["DEFAULT"].get("cache", "locmem") == "locmem":
+    cache = {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+elif CONFIG["DEFAULT"]["cache"] == "memcached":
+    cache = {
+        "BACKEND": "django.core.cache.backends.memcached.MemcachedCache",
+        "LOCATION": CONFIG["MEMCACHED"]["memcached.location"],
     }
-}
+elif CONFIG["DEFAULT"]["cache"] == "database":
+    cache = {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "django_cache",
+    }
+else:
+    raise EnvironmentError(
+        "Cache must be either locmem, memcached or database")
+
+CACHES = {"default": cache}
 CHANNEL_LAYERS = {
     "default": {
         "BACKEND": "channels.layers.InMemoryChannelLayer"
@@ -237,3 +365,109 @@ CELERY_BROKER_URL = CONFIG['DEFAULT']['celery_broker_url']
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_TRACK_STARTED = True
+
+# Deadlines (seconds) for LND daemons started or initialized by a request
+LND_STARTUP = {
+    # until the TLS certificate, the RPC port or the macaroons are ready
+    "TIMEOUT": 60,
+    # until an unlocked wallet serves the Lightning RPC service
+    "UNLOCK_TIMEOUT": 30,
+}
+
+# gRPC calls to the LND daemons (backend.lnd.rpc_client)
+LND_RPC = {
+    # threads issuing RPCs in the background, e.g. prefetched responses
+    "PREFETCH_WORKERS": 8,
+    # calls to one daemon running at the same time and seconds
+    # further calls wait for a free slot
+    "MAX_IN_FLIGHT": 4,
+    "QUEUE_TIMEOUT": 5,
+    # seconds until a call fails with DEADLINE_EXCEEDED
+    "DEADLINES": {
+        "default": 10,
+        "GetTransactions": 30,
+        "ListInvoices": 30,
+        "ListPayments": 30,
+        "SendPaymentSync": 60,
+    },
+    # seconds a GraphQL request may spend waiting for LND in total,
+    # the deadlines of its calls are shortened to the remaining time
+    "REQUEST_BUDGET": 60,
+    # consecutive UNAVAILABLE or DEADLINE_EXCEEDED errors after which
+    # a daemon is not called for BREAKER_COOLDOWN seconds
+    "BREAKER_THRESHOLD": 5,
+    "BREAKER_COOLDOWN": 30,
+    # seconds the responses of these RPCs are shared across requests
+    # in the Django cache, other RPCs are never shared
+    "SHARED_CACHE_TTL": {
+        "GetInfo": 5,
+        "ChannelBalance": 5,
+        "WalletBalance": 10,
+        "ListChannels": 5,
+    },
+}
+
+# Streaming exports of the payments, invoices and transactions of a
+# wallet at /export/<kind>/ (backend.lnd.export)
+LND_EXPORT = {
+    # invoices fetched from LND per call
+    "PAGE_SIZE": 1000,
+    # the rows are written to the response in chunks of this many bytes
+    "CHUNK_SIZE": 64 * 1024,
+}
+
+# Daemons of idle wallets are stopped by the LND supervisor and
+# started again with the next request of their owner
+LND_HIBERNATION = {
+    # seconds without requests until a wallet is hibernated, None disables
+    "IDLE_TIMEOUT": 3 * 24 * 60 * 60,
+    # the activity of a user is written at most once per resolution (seconds)
+    "ACTIVITY_RESOLUTION": 60,
+    # seconds to wait for a stopped daemon before it is killed
+    "STOP_TIMEOUT": 30,
+}
+
+# Settings of the LND supervisor (./manage.py lnd_supervisor)
+LND_SUPERVISOR = {
+    # number of daemons booted at the same time on host startup
+    "BOOT_PARALLELISM": 4,
+    # seconds to wait for a booting daemon to open its RPC port
+    "BOOT_TIMEOUT": 60,
+    # seconds between two health checks
+    "POLL_INTERVAL": 5,
+    # restart delays grow from BASE to MAX seconds on repeated crashes
+    "RESTART_BACKOFF_BASE": 2,
+    "RESTART_BACKOFF_MAX": 300,
+    # seconds a daemon must run before its crash counter is reset
+    "STABLE_AFTER": 600,
+    # seconds between two CPU / memory reports
+    "STATS_INTERVAL": 60,
+}
+
+# Address under which the LND daemons of this machine are reached
+LND_HOST_ADDRESS = "127.0.0.1"
+
+# Placement of new wallets on the LND hosts, see backend/lnd/placement.py
+LND_PLACEMENT = {
+    # hosts without a heartbeat for this many seconds get no new wallets
+    "HEARTBEAT_TIMEOUT": 180,
+    # weights of the load figures, the host with the lowest score wins
+    "DAEMON_WEIGHT": 1.0,
+    "CPU_WEIGHT": 0.5,
+    "MEMORY_WEIGHT": 1.0,
+}
+
+# Port layout of the hosted LND daemons, see backend/lnd/ports.py
+# Every wallet gets a slot on a host. HOSTS is used if no LNDHost is
+# registered (see LND_PLACEMENT). Slot n uses the ports
+# BASE + 2n - 1 (IPv4) and BASE + 2n (IPv6) of every range.
+LND_PORTS = {
+    "HOSTS": ["127.0.0.1"],
+    "LISTEN_BASE": 19739,
+    "RPC_BASE": 12009,
+    "REST_BASE": 8079,
+    "SLOTS_PER_HOST": 1964,
+    # seconds a process keeps an allocation after looking it up,
+    # other processes see freed slots after this time
+    "CACHE_TTL": 60,
+}
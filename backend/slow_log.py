@@ -0,0 +1,132 @@
+"""This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+Log of slow GraphQL requests.
+
+A share of the HTTP requests (SLOW_LOG["SAMPLE_RATE"]) records the
+timeline of the database queries issued by the resolvers and of the
+LND calls. Requests which take longer than SLOW_LOG["THRESHOLD"]
+seconds are written as one JSON line to the backend.slow_log logger:
+the operation names, the hashes of the queries and variables, the
+wallets and the timeline. The rotating file handler of the logger
+(see LOGGING in the settings) keeps a bounded ring of the latest
+entries on disk.
+"""
+
+import collections
+import hashlib
+import json
+import logging
+import random
+import re
+import threading
+import time
+
+from django.conf import settings
+
+from backend.graphql_backend import document_hash
+
+LOGGER = logging.getLogger(__name__)
+
+OPERATION_NAME = re.compile(r"^\s*(?:query|mutation|subscription)\s+(\w+)")
+
+
+def slow_log_setting(name: str):
+    """Returns the value of the given SLOW_LOG setting"""
+    return settings.SLOW_LOG[name]
+
+
+def variables_digest(variables) -> str:
+    """Returns a short hash of the variables, the values
+    themselves are never logged"""
+    if not variables:
+        return None
+    data = json.dumps(variables, sort_keys=True, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()[:16]
+
+
+class OperationLog():
+    """Timeline of the operations of one request"""
+
+    def __init__(self):
+        self.started = time.time()
+        self.start = time.perf_counter()
+        self.operations = []
+        self.events = []
+        self.counts = collections.Counter()
+        self.wallets = set()
+        self._lock = threading.Lock()
+
+    def add_operation(self, query: str, variables, operation_name: str):
+        if operation_name is None and query:
+            # the name of the first operation of the document
+            match = OPERATION_NAME.match(query)
+            operation_name = match.group(1) if match else None
+        with self._lock:
+            self.operations.append({
+                "name": operation_name,
+                "query_hash": document_hash(query) if query else None,
+                "variables": variables_digest(variables)
+            })
+
+    def _add_event(self, event: dict, start: float):
+        event["start_ms"] = round((start - self.start) * 1000, 3)
+        event["duration_ms"] = round(
+            (time.perf_counter() - start) * 1000, 3)
+        with self._lock:
+            self.counts[event["type"]] += 1
+            if len(self.events) < slow_log_setting("MAX_EVENTS"):
+                self.events.append(event)
+
+    def add_query(self, sql: str, start: float):
+        """Adds a database query which started at start
+        (time.perf_counter()) and just finished"""
+        self._add_event({"type": "db", "sql": sql[:200]}, start)
+
+    def add_rpc(self, wallet_pk: int, method: str, code: str, start: float):
+        """Adds an LND call which started at start and just finished"""
+        with self._lock:
+            self.wallets.add(wallet_pk)
+        self._add_event({
+            "type": "grpc",
+            "wallet": wallet_pk,
+            "method": method,
+            "code": code
+        }, start)
+
+    def duration(self) -> float:
+        return time.perf_counter() - self.start
+
+    def record(self) -> dict:
+        with self._lock:
+            events = sorted(self.events, key=lambda e: e["start_ms"])
+            return {
+                "started": self.started,
+                "duration_ms": round(self.duration() * 1000, 3),
+                "operations": list(self.operations),
+                "wallets": sorted(self.wallets),
+                "db_queries": self.counts["db"],
+                "grpc_calls": self.counts["grpc"],
+                "dropped_events": sum(self.counts.values()) - len(events),
+                "timeline": events
+            }
+
+
+def operation_log(context) -> OperationLog:
+    """Returns the log of the request the context belongs to,
+    None if the request is not sampled"""
+    return getattr(context, "operation_log", None)
+
+
+def start_operation_log(request):
+    """Decides whether the request is sampled and starts its log"""
+    sampled = random.random() < slow_log_setting("SAMPLE_RATE")
+    request.operation_log = OperationLog() if sampled else None
+
+
+def finish_operation_log(request):
+    """Writes the log of the request if it was too slow"""
+    log = operation_log(request)
+    if log is not None and log.duration() >= slow_log_setting("THRESHOLD"):
+        LOGGER.warning(json.dumps(log.record()))
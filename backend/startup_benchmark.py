@@ -0,0 +1,119 @@
+"""This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+Benchmark of the startup of the worker processes.
+
+Every target imports what one kind of worker imports before it
+serves the first request: the URLs and the schema of the web
+workers, the ASGI application or the tasks of the Celery workers.
+The introspection target serves the first introspection query, from
+the schema snapshot if there is one (see backend.graphql_backend).
+Each run starts a fresh interpreter and reports the duration of
+django.setup() and the imports and the peak memory. An extra run
+with python -X importtime finds the modules with the largest import
+times.
+
+The modules in LAZY_MODULES must not be imported at startup, see
+backend.lnd.rpc. See ./manage.py benchmark_startup.
+"""
+
+import collections
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+
+# imported on first use only
+LAZY_MODULES = ("backend.lnd.rpc_pb2", "backend.lnd.rpc_pb2_grpc")
+
+TARGETS = collections.OrderedDict([
+    ("web", "import_module(settings.ROOT_URLCONF)\n"
+     "import_module(settings.GRAPHENE['SCHEMA'].rsplit('.', 1)[0])"),
+    ("asgi", "import_module(settings.ASGI_APPLICATION.rsplit('.', 1)[0])"),
+    ("celery", "from backend.celery import app\n"
+     "app.loader.import_default_modules()"),
+    ("introspection", "from backend.graphql_backend import DOCUMENT_CACHE\n"
+     "from graphql.utils.introspection_query import introspection_query\n"
+     "schema = import_module(settings.GRAPHENE['SCHEMA'].rsplit('.', 1)[0])"
+     ".schema\n"
+     "DOCUMENT_CACHE.document_from_string(schema, introspection_query)"
+     ".execute()"),
+])
+
+SCRIPT = """
+import json, resource, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+from importlib import import_module
+from django.conf import settings
+{target}
+print(json.dumps({{
+    "seconds": time.perf_counter() - start,
+    "maxrss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "modules": sorted(sys.modules)
+}}))
+"""
+
+StartupRun = collections.namedtuple(
+    "StartupRun", ["seconds", "maxrss_kb", "modules", "import_times"])
+
+
+def _parse_import_times(output: str) -> dict:
+    """Returns the self and cumulative import times in microseconds
+    of the python -X importtime output by module"""
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        if own.strip().isdigit():
+            times[name.strip()] = (int(own), int(cumulative))
+    return times
+
+
+def run_startup(target: str, importtime: bool = False) -> StartupRun:
+    """Starts a fresh interpreter which imports the target
+
+    importtime: record the import times, which slows down the imports
+    """
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE="backend.settings")
+    options = ["-X", "importtime"] if importtime else []
+    process = subprocess.run(
+        [sys.executable] + options +
+        ["-c", SCRIPT.format(target=TARGETS[target])],
+        cwd=settings.BASE_DIR,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True)
+    result = json.loads(process.stdout.strip().splitlines()[-1])
+    return StartupRun(result["seconds"], result["maxrss_kb"],
+                      result["modules"], _parse_import_times(process.stderr))
+
+
+def benchmark_startup(target: str, repeat: int = 5, top: int = 10) -> dict:
+    """Returns the median duration and memory of the startup of the
+    target and the modules which take longest to import"""
+    runs = [run_startup(target) for _ in range(repeat)]
+    import_times = run_startup(target, importtime=True).import_times
+    slowest = sorted(
+        import_times, key=lambda name: import_times[name][0],
+        reverse=True)[:top]
+    return {
+        "seconds": statistics.median(run.seconds for run in runs),
+        "maxrss_kb": statistics.median(run.maxrss_kb for run in runs),
+        "modules": len(runs[-1].modules),
+        "lazy_modules_imported":
+        [name for name in LAZY_MODULES if name in runs[-1].modules],
+        "slowest_imports": collections.OrderedDict(
+            (name, {
+                "self_ms": import_times[name][0] / 1000,
+                "cumulative_ms": import_times[name][1] / 1000
+            }) for name in slowest)
+    }
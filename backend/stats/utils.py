@@ -13,6 +13,7 @@ import logging
 
 import backend.stats.prom_queries as prom_queries
 from backend.exceptions import ClientVisibleException
+from backend.tracing import CLIENT, inject, start_span
 
 logger = logging.getLogger(__name__)
 
@@ -70,8 +71,18 @@ def query_prometheus(query: str) -> PrometheusResponse:
     try:
         url = "{}/api/v1/query?query={}".format(config["prom_api_url"], query)
         logger.debug(url)
-        output = request.urlopen(
-            url, timeout=10)  # type: http.client.HTTPResponse
+        with start_span(
+                "prometheus query",
+                CLIENT,
+                attributes={
+                    "http.method": "GET",
+                    "db.system": "prometheus",
+                    "db.statement": query
+                }) as span:
+            output = request.urlopen(
+                request.Request(url, headers=inject({})),
+                timeout=10)  # type: http.client.HTTPResponse
+            span.set_attribute("http.status_code", output.code)
     except urllib.error.HTTPError as error:
         logger.exception(error)
         resp = PrometheusResponse(error.code, None, error.msg, error.reason)
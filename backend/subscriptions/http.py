@@ -0,0 +1,229 @@
+"""This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+Serves GraphQL queries over HTTP on the ASGI event loop.
+
+The resolvers of the root fields do blocking gRPC and database
+calls. They are run in the thread pool of channels, so the sibling
+root fields of a query (e.g. lnGetInfo and lnListChannels) are
+resolved concurrently and the event loop keeps serving other
+requests in the meantime.
+
+A JSON list of operations is executed as a batch. The operations of
+a batch run concurrently and share the request scoped caches of
+backend.request_cache, e.g. the wallet of the user is loaded once.
+Without ASGI /gql/ is served by PersistedQueryGraphQLView, which
+runs the operations of a batch one after the other.
+"""
+
+import asyncio
+from inspect import isawaitable
+
+from channels.db import database_sync_to_async
+from channels.generic.http import AsyncHttpConsumer
+from channels.http import AsgiRequest
+from django.contrib.auth.models import AnonymousUser
+from django.http import (HttpResponse, HttpResponseBadRequest,
+                         HttpResponseNotAllowed)
+from graphene_django.views import HttpError
+from graphql.execution import ExecutionResult
+from graphql.execution.executors.asyncio import AsyncioExecutor, ensure_future
+from promise import Promise
+
+from backend.graphql_backend import DOCUMENT_CACHE
+from backend.lnd.hibernation import record_activity
+from backend.lnd.rpc_client import start_request_budget
+from backend.metrics import observe_request
+from backend.persisted_queries import (PersistedQueryError, get_extensions,
+                                       resolve_persisted_query)
+from backend.query_cost import QueryCostError, admit_request
+from backend.slow_log import (finish_operation_log, operation_log,
+                              start_operation_log)
+from backend.tracing import start_request_span
+from backend.views import PersistedQueryGraphQLView, parse_operations
+
+
+def is_root_field(info) -> bool:
+    return info.parent_type in (info.schema.get_query_type(),
+                                info.schema.get_mutation_type())
+
+
+class RootFieldExecutor(AsyncioExecutor):
+    """Resolves root fields in the thread pool and all other fields
+    directly on the event loop
+
+    Mutations stay serial, graphql only starts the next root field
+    of a mutation after the previous one has been resolved.
+    """
+
+    def execute(self, fn, *args, **kwargs):
+        info = args[1]
+        if not is_root_field(info):
+            return super().execute(fn, *args, **kwargs)
+
+        future = ensure_future(
+            self.resolve_in_thread(fn, *args, **kwargs), loop=self.loop)
+        self.futures.append(future)
+        return Promise.resolve(future)
+
+    @staticmethod
+    async def resolve_in_thread(fn, *args, **kwargs):
+        result = await database_sync_to_async(fn)(*args, **kwargs)
+        if isawaitable(result):
+            result = await result
+        return result
+
+
+class GraphQLHttpConsumer(AsyncHttpConsumer):
+    """Async replacement for graphene_django's GraphQLView
+
+    Request parsing and error formatting is borrowed from GraphQLView,
+    so the responses are the same as before. The schema and the
+    graphene middleware are taken from the view as well.
+    """
+
+    view = PersistedQueryGraphQLView(batch=False, backend=DOCUMENT_CACHE)
+
+    async def handle(self, body):
+        request = AsgiRequest(self.scope, body)
+        request.user = self.scope.get("user", AnonymousUser())
+        start_request_budget(request)
+        start_operation_log(request)
+        # the event loop serves many requests, so the span is never
+        # the current span of the thread
+        span = start_request_span(request)
+        await database_sync_to_async(record_activity)(request.user)
+
+        try:
+            response = await self.get_response(request)
+        except HttpError as exc:
+            response = exc.response
+            response["Content-Type"] = "application/json"
+            response.content = self.view.json_encode(
+                request, {"errors": [self.view.format_error(exc)]})
+        observe_request(request)
+        finish_operation_log(request)
+        span.set_attribute("http.status_code", response.status_code)
+        span.end()
+
+        await self.send_response(
+            response.status_code,
+            response.content,
+            headers=[(key.encode(), value.encode())
+                     for key, value in response.items()])
+
+    async def get_response(self, request) -> HttpResponse:
+        if request.method.lower() not in ("get", "post"):
+            raise HttpError(
+                HttpResponseNotAllowed(
+                    ["GET", "POST"],
+                    "GraphQL only supports GET and POST requests."))
+
+        data = self.parse_body(request)
+
+        if not isinstance(data, list):
+            response, status_code = self.format_result(
+                await self.execute(request, data))
+            return HttpResponse(
+                status=status_code,
+                content=self.view.json_encode(request, response),
+                content_type="application/json")
+
+        # The operations of a batch share the request as context,
+        # so they share the request cache as well.
+        results = await asyncio.gather(
+            *[self.execute_batch_entry(request, entry) for entry in data])
+
+        responses = []
+        for entry, result in zip(data, results):
+            response, status_code = self.format_result(result)
+            response["id"] = entry.get("id")
+            response["status"] = status_code
+            responses.append(response)
+
+        return HttpResponse(
+            status=max(response["status"] for response in responses),
+            content=self.view.json_encode(request, responses),
+            content_type="application/json")
+
+    def parse_body(self, request):
+        """Returns the request data, a list of operations for batches"""
+        if self.view.get_content_type(request) != "application/json":
+            return self.view.parse_body(request)
+        return parse_operations(request)
+
+    def format_result(self, execution_result: ExecutionResult):
+        """Returns the response dict and status code of a result"""
+        status_code = 200
+        response = {}
+        if execution_result.errors:
+            response["errors"] = [
+                self.view.format_error(e) for e in execution_result.errors
+            ]
+
+        if execution_result.invalid:
+            status_code = 400
+        else:
+            response["data"] = execution_result.data
+
+        return response, status_code
+
+    async def execute_batch_entry(self, request, data) -> ExecutionResult:
+        try:
+            return await self.execute(request, data)
+        except HttpError as exc:
+            return ExecutionResult(errors=[exc], invalid=True)
+
+    async def execute(self, request, data) -> ExecutionResult:
+        query, variables, operation_name, _ = self.view.get_graphql_params(
+            request, data)
+
+        try:
+            query = resolve_persisted_query(query,
+                                            get_extensions(request, data))
+        except PersistedQueryError as exc:
+            return ExecutionResult(errors=[exc])
+
+        if not query:
+            raise HttpError(
+                HttpResponseBadRequest("Must provide query string."))
+
+        log = operation_log(request)
+        if log is not None:
+            log.add_operation(query, variables, operation_name)
+
+        try:
+            document = self.view.get_backend(request).document_from_string(
+                self.view.schema, query)
+        except Exception as exc:
+            return ExecutionResult(errors=[exc], invalid=True)
+
+        if request.method.lower() == "get":
+            operation_type = document.get_operation_type(operation_name)
+            if operation_type and operation_type != "query":
+                raise HttpError(
+                    HttpResponseNotAllowed(
+                        ["POST"],
+                        "Can only perform a {} operation from a POST request."
+                        .format(operation_type)))
+
+        try:
+            await database_sync_to_async(admit_request)(
+                request, document, variables, operation_name)
+        except QueryCostError as exc:
+            return ExecutionResult(errors=[exc])
+
+        try:
+            result = document.execute(
+                variables=variables,
+                operation_name=operation_name,
+                context=request,
+                middleware=self.view.get_middleware(request),
+                executor=RootFieldExecutor(loop=asyncio.get_event_loop()),
+                return_promise=True)
+            if isawaitable(result):
+                result = await result
+            return result
+        except Exception as exc:
+            return ExecutionResult(errors=[exc], invalid=True)
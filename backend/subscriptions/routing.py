@@ -1,19 +1,19 @@
 """Adapted from https://github.com/SmileyChris/graphql-ws/tree/channels2/graphql_ws/django (MIT)
 """
 
-import traceback
+from functools import partial
 
-import jwt
 from channels.auth import AuthMiddlewareStack
+from channels.db import database_sync_to_async
+from channels.http import AsgiHandler
 from channels.routing import ProtocolTypeRouter, URLRouter
 from django.apps import apps
-from django.conf import settings
-from django.contrib.auth.models import AnonymousUser, User
-from django.core.exceptions import ObjectDoesNotExist
-from django.urls import path
-from jwt import DecodeError, ExpiredSignatureError, InvalidSignatureError
+from django.contrib.auth.models import AnonymousUser
+from django.urls import path, re_path
 
+from backend.authentication import TOKEN_VERIFIER, token_from_header
 from backend.subscriptions.consumers import GraphQLSubscriptionConsumer
+from backend.subscriptions.http import GraphQLHttpConsumer
 
 
 class TokenAuthMiddleware:
@@ -21,32 +21,34 @@ class TokenAuthMiddleware:
     Token authorization middleware for Django Channels 2
     https://github.com/jaquan1227/django-channel-jwt-auth
 
+    Tokens which are not cached yet are verified off the event loop.
     """
 
     def __init__(self, inner):
         self.inner = inner
 
     def __call__(self, scope):
-        headers = dict(scope["headers"])
-        token_name = None
-        token_key = None
-        scope['user'] = AnonymousUser()
+        return partial(self.coroutine_call, dict(scope))
+
+    async def coroutine_call(self, scope, receive, send):
+        scope["user"] = await self.get_user(scope)
+        inner_instance = self.inner(scope)
+        await inner_instance(receive, send)
 
+    @staticmethod
+    async def get_user(scope):
+        headers = dict(scope["headers"])
+        token = None
         if b"authorization" in headers:
-            token_name, token_key = headers[b'authorization'].decode().split()
+            token = token_from_header(headers[b"authorization"].decode())
 
-        if token_name.startswith("JWT"):
-            try:
-                user_jwt = jwt.decode(
-                    token_key,
-                    settings.SECRET_KEY,
-                )
-                scope["user"] = User.objects.get(id=user_jwt["user_id"])
-            except (InvalidSignatureError, KeyError, ExpiredSignatureError,
-                    DecodeError, ObjectDoesNotExist):
-                traceback.print_exc()
+        if token is None:
+            return AnonymousUser()
 
-        return self.inner(scope)
+        user = TOKEN_VERIFIER.cached_user(token)
+        if user is None:
+            user = await database_sync_to_async(TOKEN_VERIFIER.verify)(token)
+        return user or AnonymousUser()
 
 
 TokenAuthMiddlewareStack = lambda inner: TokenAuthMiddleware(AuthMiddlewareStack(inner))
@@ -58,11 +60,19 @@ else:
 
 websocket_urlpatterns = [path("subscriptions", GraphQLSubscriptionConsumer)]
 
+# /gql/ is served on the event loop, everything else by Django
+http_urlpatterns = [
+    path("gql/", TokenAuthMiddlewareStack(GraphQLHttpConsumer)),
+    re_path(r"", AsgiHandler),
+]
+
 application = ProtocolTypeRouter({
     "websocket": URLRouter(websocket_urlpatterns)
 })
 
 session_application = ProtocolTypeRouter({
+    "http":
+    URLRouter(http_urlpatterns),
     "websocket":
     TokenAuthMiddlewareStack(URLRouter(websocket_urlpatterns))
 })
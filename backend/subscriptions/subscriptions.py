@@ -3,16 +3,37 @@
 
 from inspect import isawaitable
 
+from channels.db import database_sync_to_async
 from graphene_django.settings import graphene_settings
 from graphql.execution.executors.asyncio import AsyncioExecutor
 from graphql_ws.base import BaseConnectionContext, BaseSubscriptionServer
 from graphql_ws.constants import (GQL_COMPLETE, GQL_CONNECTION_ACK,
                                   GQL_CONNECTION_ERROR)
+from graphql.backend.base import GraphQLBackend
+from graphql.execution import ExecutionResult
+from graphql.utils.get_operation_ast import get_operation_ast
 from graphql_ws.observable_aiter import setup_observable_extension
 
+from backend.graphql_backend import DOCUMENT_CACHE
+from backend.lnd.hibernation import record_activity
+from backend.metrics import SUBSCRIPTION_EVENTS, SUBSCRIPTIONS_ACTIVE
+from backend.persisted_queries import (PersistedQueryError,
+                                       resolve_persisted_query)
+from backend.query_cost import QueryCostError, check_query_cost
+
 setup_observable_extension()
 
 
+class PreparedDocumentBackend(GraphQLBackend):
+    """Returns the document resolved before the execution"""
+
+    def __init__(self, document):
+        self.document = document
+
+    def document_from_string(self, schema, document_string):
+        return self.document
+
+
 class ChannelsConnectionContext(BaseConnectionContext):
     async def send(self, data):
         await self.ws.send_json(data)
@@ -26,7 +47,12 @@ class ChannelsSubscriptionServer(BaseSubscriptionServer):
         payload["context"] = connection_context.request_context
         params = super(ChannelsSubscriptionServer, self).get_graphql_params(
             connection_context, payload)
-        return dict(params, return_promise=True, executor=AsyncioExecutor())
+        return dict(
+            params,
+            extensions=payload.get("extensions"),
+            return_promise=True,
+            executor=AsyncioExecutor(),
+            backend=DOCUMENT_CACHE)
 
     async def handle(self, ws, request_context=None):
         connection_context = ChannelsConnectionContext(ws, request_context)
@@ -65,7 +91,67 @@ class ChannelsSubscriptionServer(BaseSubscriptionServer):
                                   GQL_CONNECTION_ERROR)
             await connection_context.close(1011)
 
+    async def record_activity(self, connection_context):
+        """Keeps the wallet of a subscribed user awake"""
+        user = connection_context.request_context.get("user")
+        if user is not None:
+            await database_sync_to_async(record_activity)(user)
+
+    def resolve_document(self, params):
+        """Returns the parsed and validated document of the operation
+        or None if it has syntax errors
+
+        Parsing and validating a new document takes a while, call
+        this in a worker thread.
+        """
+        try:
+            return DOCUMENT_CACHE.document_from_string(
+                self.schema, params["request_string"])
+        except Exception:
+            # syntax errors are reported by the execution
+            return None
+
+    def check_cost(self, document, params):
+        """Rejects operations above the maximum cost
+
+        Subscriptions are long lived, so their cost is not charged
+        to the wallet like the cost of HTTP requests.
+        """
+        if document is None:
+            return
+
+        check_query_cost(self.schema, document.document_ast,
+                         params.get("variable_values"),
+                         params.get("operation_name"))
+
+    def subscription_name(self, document, params) -> str:
+        """Returns the root field of the subscription operation"""
+        try:
+            operation = get_operation_ast(document.document_ast,
+                                          params.get("operation_name"))
+            return operation.selection_set.selections[0].name.value
+        except Exception:
+            return "unknown"
+
     async def on_start(self, connection_context, op_id, params):
+        await self.record_activity(connection_context)
+
+        try:
+            params["request_string"] = await database_sync_to_async(
+                resolve_persisted_query)(params["request_string"],
+                                         params.pop("extensions"))
+            document = await database_sync_to_async(self.resolve_document)(
+                params)
+            self.check_cost(document, params)
+        except (PersistedQueryError, QueryCostError) as exc:
+            await self.send_execution_result(connection_context, op_id,
+                                             ExecutionResult(errors=[exc]))
+            await self.on_operation_complete(connection_context, op_id)
+            return
+
+        if document is not None:
+            # executes the document resolved above
+            params["backend"] = PreparedDocumentBackend(document)
         execution_result = self.execute(connection_context.request_context,
                                         params)
 
@@ -75,19 +161,26 @@ class ChannelsSubscriptionServer(BaseSubscriptionServer):
         if hasattr(execution_result, "__aiter__"):
             iterator = await execution_result.__aiter__()
             connection_context.register_operation(op_id, iterator)
-            async for single_result in iterator:
-                if not connection_context.has_operation(op_id):
-                    break
-                await self.send_execution_result(connection_context, op_id,
-                                                 single_result)
+            name = self.subscription_name(document, params)
+            SUBSCRIPTIONS_ACTIVE.inc(subscription=name)
+            try:
+                async for single_result in iterator:
+                    if not connection_context.has_operation(op_id):
+                        break
+                    await self.record_activity(connection_context)
+                    await self.send_execution_result(
+                        connection_context, op_id, single_result)
+                    SUBSCRIPTION_EVENTS.inc(subscription=name)
+            finally:
+                SUBSCRIPTIONS_ACTIVE.dec(subscription=name)
         else:
             await self.send_execution_result(connection_context, op_id,
                                              execution_result)
         await self.on_operation_complete(connection_context, op_id)
 
     async def on_close(self, connection_context):
-        for op_id in connection_context.operations:
-            self.unsubscribe(connection_context, op_id)
+        for op_id in list(connection_context.operations):
+            await self.unsubscribe(connection_context, op_id)
 
     async def on_stop(self, connection_context, op_id):
         await self.unsubscribe(connection_context, op_id)
@@ -96,6 +189,10 @@ class ChannelsSubscriptionServer(BaseSubscriptionServer):
         if connection_context.has_operation(op_id):
             op = connection_context.get_operation(op_id)
             op.dispose()
+            # a disposed iterator never ends, wake up on_start()
+            future = getattr(op, "future", None)
+            if future is not None and not future.done():
+                future.cancel()
             connection_context.remove_operation(op_id)
         await self.on_operation_complete(connection_context, op_id)
 
@@ -35,7 +35,8 @@ def fake_lnd_wallet_config():
         rpc_listen_port_ipv4="",
         rpc_listen_port_ipv6="",
         rest_port_ipv4="",
-        rest_port_ipv6="")
+        rest_port_ipv6="",
+        rpc_server="")
 
 
 def fake_build_grpc_channel_manual(error=None):
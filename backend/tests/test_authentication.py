@@ -0,0 +1,144 @@
+"""This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+# pylint: skip-file
+import asyncio
+import datetime
+
+import pytest
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from mixer.backend.django import mixer
+from rest_framework_jwt.settings import api_settings
+
+from backend.authentication import (TOKEN_VERIFIER, TokenVerifier,
+                                    token_from_header)
+from backend.middleware import JWTMiddleware
+from backend.subscriptions import routing
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def clear_token_cache():
+    TOKEN_VERIFIER.clear()
+    yield
+    TOKEN_VERIFIER.clear()
+
+
+def make_token(user, **claims):
+    payload = api_settings.JWT_PAYLOAD_HANDLER(user)
+    payload.update(claims)
+    return api_settings.JWT_ENCODE_HANDLER(payload)
+
+
+def test_token_from_header():
+    assert token_from_header("JWT abc") == "abc"
+    assert token_from_header("Bearer abc") is None
+    assert token_from_header("JWT") is None
+    assert token_from_header("") is None
+
+
+def test_verify_caches_user():
+    user = mixer.blend("auth.User")
+    token = make_token(user)
+    verifier = TokenVerifier(size=10, max_age=60)
+
+    assert verifier.cached_user(token) is None
+    assert verifier.verify(token).pk == user.pk
+
+    with CaptureQueriesContext(connection) as queries:
+        first = verifier.verify(token)
+        second = verifier.cached_user(token)
+    assert len(queries) == 0, "Should not hit the database again"
+    assert first.pk == second.pk == user.pk
+    assert first is not second, "Should hand out copies of the user"
+
+
+def test_verify_rejects_invalid_tokens():
+    verifier = TokenVerifier(size=10, max_age=60)
+    user = mixer.blend("auth.User")
+
+    expired = make_token(
+        user, exp=datetime.datetime.utcnow() - datetime.timedelta(hours=1))
+    assert verifier.verify(expired) is None
+    assert verifier.verify("not-a-token") is None
+
+    inactive = mixer.blend("auth.User", is_active=False)
+    assert verifier.verify(make_token(inactive)) is None
+
+
+def test_cache_is_bounded():
+    verifier = TokenVerifier(size=2, max_age=60)
+    tokens = [make_token(mixer.blend("auth.User")) for _ in range(3)]
+    for token in tokens:
+        verifier.verify(token)
+
+    assert verifier.cached_user(tokens[0]) is None, "Should evict the oldest"
+    assert verifier.cached_user(tokens[2]) is not None
+
+    verifier = TokenVerifier(size=2, max_age=0)
+    verifier.verify(tokens[0])
+    assert verifier.cached_user(tokens[0]) is None, "Should respect max_age"
+
+
+def test_http_middleware():
+    user = mixer.blend("auth.User")
+    middleware = JWTMiddleware(lambda request: None)
+
+    request = RequestFactory().get(
+        "/", HTTP_AUTHORIZATION="JWT " + make_token(user))
+    request.user = AnonymousUser()
+    middleware.process_view(request, None, None, None)
+    assert request.user.pk == user.pk
+
+    request = RequestFactory().get("/", HTTP_AUTHORIZATION="JWT broken")
+    request.user = AnonymousUser()
+    middleware.process_view(request, None, None, None)
+    assert not request.user.is_authenticated
+
+
+def test_websocket_middleware(monkeypatch):
+    user = mixer.blend("auth.User")
+    scopes = []
+    offloaded = []
+
+    # the test database is not shared with other threads,
+    # so run the database lookup right here
+    def fake_database_sync_to_async(func):
+        async def wrapper(*args):
+            offloaded.append(args)
+            return func(*args)
+
+        return wrapper
+
+    monkeypatch.setattr(routing, "database_sync_to_async",
+                        fake_database_sync_to_async)
+
+    async def inner_instance(receive, send):
+        pass
+
+    def inner(scope):
+        scopes.append(scope)
+        return inner_instance
+
+    middleware = routing.TokenAuthMiddleware(inner)
+    scope = {
+        "headers": [(b"authorization",
+                     "JWT {}".format(make_token(user)).encode())]
+    }
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(middleware(scope)(None, None))
+        loop.run_until_complete(middleware(scope)(None, None))
+        loop.run_until_complete(middleware({"headers": []})(None, None))
+    finally:
+        loop.close()
+
+    assert scopes[0]["user"].pk == scopes[1]["user"].pk == user.pk
+    assert len(offloaded) == 1, "Should only look up uncached tokens"
+    assert not scopes[2]["user"].is_authenticated
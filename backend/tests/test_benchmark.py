@@ -0,0 +1,100 @@
+"""This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+# pylint: skip-file
+import pytest
+from django.core.cache import cache
+from mixer.backend.django import mixer
+
+from backend.benchmark import (WORKLOADS, Benchmark, failed, latency_summary,
+                               percentile)
+from backend.lnd import rpc_client, utils
+from backend.lnd.fake_lnd import FakeLnd, FakeLndOptions
+from backend.lnd.models import IPAddress, LNDWallet
+from backend.metrics import SUBSCRIPTION_EVENTS
+from backend.subscriptions.routing import session_application
+
+
+def test_percentile():
+    values = [4, 1, 3, 2, 5]
+    assert percentile(values, 50) == 3
+    assert percentile(values, 100) == 5
+    assert percentile(values, 95) == pytest.approx(4.8)
+    assert percentile([], 50) is None
+
+    summary = latency_summary([0.1, 0.2, 0.3], duration=2)
+    assert summary["p50_ms"] == pytest.approx(200)
+    assert summary["throughput_rps"] == 1.5
+    assert latency_summary([], duration=1)["p99_ms"] is None
+
+
+def test_failed():
+    assert failed({"errors": [{"message": "boom"}]})
+    assert failed({"data": {"a": {"__typename": "WalletInstanceNotFound"}}})
+    assert failed({"data": {"a": [{"b": {"__typename": "ListPeersError"}}]}})
+    assert not failed({"data": {"a": {"__typename": "GetInfoSuccess"}}})
+
+
+@pytest.fixture
+def fake_wallet(transactional_db, tmp_path, monkeypatch, settings):
+    monkeypatch.setitem(utils.CONFIG["DEFAULT"], "lnd_data_path",
+                        str(tmp_path))
+    # the ports stay busy for a while, keep them away from other tests
+    settings.LND_PORTS = dict(settings.LND_PORTS, RPC_BASE=42009)
+    cache.clear()
+    rpc_client._GATEWAYS.clear()
+
+    mixer.blend(IPAddress, pk=1, ip_address="127.0.0.1")
+    user = mixer.blend("auth.User")
+    wallet = mixer.blend(LNDWallet, owner=user)
+    cfg = utils.build_lnd_wallet_config(wallet.pk)
+    node = FakeLnd(
+        cfg.data_dir,
+        port=cfg.rpc_listen_port_ipv4,
+        host=cfg.rpc_server,
+        options=FakeLndOptions(event_interval=0.1))
+    node.start()
+
+    yield user, node
+
+    node.stop()
+    for channel_data in utils.CHANNEL_CACHE._cache.values():
+        channel_data.channel.close()
+    # grpc fails to collect channels left over at exit
+    utils.CHANNEL_CACHE._cache.clear()
+    cache.clear()
+
+
+def test_http_workload(fake_wallet):
+    user, node = fake_wallet
+    benchmark = Benchmark(session_application, user, lambda: node.calls)
+
+    result = benchmark.run(
+        WORKLOADS["dashboard"], requests=20, concurrency=4, warmup=2)
+
+    dashboard = result["operations"]["Dashboard"]
+    assert dashboard["requests"] == 20
+    assert dashboard["errors"] == 0
+    assert dashboard["p50_ms"] <= dashboard["p99_ms"]
+    assert dashboard["db_queries"] > 0
+    assert result["total"]["throughput_rps"] > 0
+    assert result["workload"] == "dashboard"
+
+
+def test_subscription_workload(fake_wallet):
+    user, node = fake_wallet
+    benchmark = Benchmark(session_application, user, lambda: node.calls)
+    events = SUBSCRIPTION_EVENTS.value(subscription="transactionSubscription")
+
+    result = benchmark.run(
+        WORKLOADS["subscribers"], concurrency=4, duration=1)
+
+    total = result["total"]
+    assert total["subscribers"] == 4
+    assert total["errors"] == 0
+    assert total["events"] > 0
+    assert total["grpc_calls"]["by_method"]["SubscribeTransactions"] == 2
+    assert SUBSCRIPTION_EVENTS.value(
+        subscription="transactionSubscription") > events
+
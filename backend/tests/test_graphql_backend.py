@@ -0,0 +1,173 @@
+"""This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+# pylint: skip-file
+import json
+import logging
+
+import graphene
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from graphql import graphql
+from graphql.language.base import parse
+from graphql.utils.introspection_query import introspection_query
+from promise import Promise
+
+from backend import graphql_backend
+from backend.graphql_backend import (CachedDocumentBackend, build_snapshot,
+                                     is_introspection)
+
+
+class Query(graphene.ObjectType):
+    hello = graphene.String()
+
+    def resolve_hello(self, info):
+        return "world"
+
+
+class OtherQuery(Query):
+    bye = graphene.String()
+
+
+SCHEMA = graphene.Schema(query=Query)
+
+
+@pytest.fixture
+def validations(monkeypatch):
+    calls = []
+    validate = graphql_backend.validate
+
+    def counting_validate(schema, ast):
+        calls.append(ast)
+        return validate(schema, ast)
+
+    monkeypatch.setattr(graphql_backend, "validate", counting_validate)
+    return calls
+
+
+def test_documents_are_validated_once(validations):
+    backend = CachedDocumentBackend(size=10)
+
+    for _ in range(3):
+        result = graphql(SCHEMA, "{ hello }", backend=backend)
+        assert result.data == {"hello": "world"}
+
+    assert len(validations) == 1
+    assert backend.stats() == {"hits": 2, "misses": 1, "size": 1}
+
+    # a new schema version does not reuse the document
+    graphql(graphene.Schema(query=OtherQuery), "{ hello }", backend=backend)
+    assert backend.stats()["misses"] == 2
+
+
+def test_invalid_documents(validations):
+    backend = CachedDocumentBackend(size=10)
+
+    for _ in range(2):
+        result = graphql(SCHEMA, "{ unknown }", backend=backend)
+        assert result.invalid
+        assert "unknown" in result.errors[0].message
+    assert len(validations) == 1, "Should cache the validation errors"
+
+    result = graphql(SCHEMA, "{ hello", backend=backend)
+    assert result.invalid, "Should report syntax errors"
+
+
+def test_cache_is_bounded():
+    backend = CachedDocumentBackend(size=2)
+    for query in ("{ hello }", "{ a: hello }", "{ b: hello }"):
+        backend.document_from_string(SCHEMA, query)
+    assert backend.stats()["size"] == 2
+
+    backend.document_from_string(SCHEMA, "{ hello }")
+    assert backend.stats()["misses"] == 4, "Should have evicted the oldest"
+
+
+@pytest.fixture
+def executions(monkeypatch):
+    calls = []
+    execute = graphql_backend.execute
+
+    def counting_execute(schema, document_ast, *args, **kwargs):
+        calls.append(document_ast)
+        return execute(schema, document_ast, *args, **kwargs)
+
+    monkeypatch.setattr(graphql_backend, "execute", counting_execute)
+    return calls
+
+
+def test_is_introspection():
+    assert is_introspection(parse("{ __schema { types { name } } }"))
+    assert is_introspection(parse(introspection_query))
+    assert is_introspection(parse("{ __typename __type(name: \"A\") { a } }"))
+    assert not is_introspection(parse("{ __typename }"))
+    assert not is_introspection(parse("{ __typename hello }"))
+    assert not is_introspection(parse("{ ...F } fragment F on Query { a }"))
+    assert not is_introspection(parse("mutation { __typename }"))
+
+
+def test_introspection_is_executed_once(executions):
+    backend = CachedDocumentBackend(size=10)
+    query = "query Types { __schema { types { name } } }"
+
+    results = [
+        graphql(SCHEMA, query, backend=backend),
+        graphql(SCHEMA, query, backend=backend, operation_name="Types"),
+        backend.document_from_string(SCHEMA, query).execute(
+            return_promise=True),
+    ]
+    assert len(executions) == 1
+    assert isinstance(results[2], Promise)
+    results[2] = results[2].get()
+    assert results[0].data == results[1].data == results[2].data
+    assert {"name": "Query"} in results[0].data["__schema"]["types"]
+
+    result = graphql(SCHEMA, query, backend=backend, operation_name="Other")
+    assert result.errors
+
+    query = "query Type($name: String!) { __type(name: $name) { name } }"
+    for name in ("Query", "String"):
+        result = graphql(
+            SCHEMA, query, backend=backend, variable_values={"name": name})
+        assert result.data == {"__type": {"name": name}}
+    assert len(executions) == 4
+
+
+def test_introspection_from_snapshot(executions, tmp_path, monkeypatch,
+                                     caplog):
+    # the configured logger writes to a file and does not propagate
+    monkeypatch.setattr(graphql_backend, "LOGGER",
+                        logging.getLogger("test_graphql_backend"))
+    path = tmp_path / "snapshot.json"
+    path.write_text(json.dumps(build_snapshot(SCHEMA)))
+    expected = graphql(SCHEMA, introspection_query).data
+    executions.clear()
+
+    backend = CachedDocumentBackend(size=10, snapshot_path=str(path))
+    result = graphql(SCHEMA, introspection_query, backend=backend)
+    assert result.data == expected
+    assert executions == []
+
+    # snapshots of other versions of the schema are ignored
+    backend = CachedDocumentBackend(size=10, snapshot_path=str(path))
+    other = graphene.Schema(query=OtherQuery)
+    result = graphql(other, introspection_query, backend=backend)
+    assert "bye" in json.dumps(result.data)
+    assert len(executions) == 1
+    assert "outdated" in caplog.text
+
+    backend = CachedDocumentBackend(size=10, snapshot_path=str(tmp_path))
+    graphql(SCHEMA, "{ __typename }", backend=backend)
+
+
+def test_build_schema_snapshot(tmp_path):
+    path = str(tmp_path / "snapshot.json")
+    with pytest.raises(CommandError):
+        call_command("build_schema_snapshot", output=path, check=True)
+
+    call_command("build_schema_snapshot", output=path)
+    call_command("build_schema_snapshot", output=path, check=True)
+    with open(path) as snapshot:
+        assert "results" in json.load(snapshot)
@@ -0,0 +1,156 @@
+"""This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+# pylint: skip-file
+import asyncio
+import json
+import time
+
+import graphene
+from channels.testing import HttpCommunicator
+from graphene_django.views import GraphQLView
+
+from backend.graphql_backend import DOCUMENT_CACHE
+from backend.subscriptions.http import GraphQLHttpConsumer
+
+
+class Query(graphene.ObjectType):
+    slow_a = graphene.String()
+    slow_b = graphene.String()
+
+    def resolve_slow_a(self, info):
+        time.sleep(0.3)
+        return "a"
+
+    def resolve_slow_b(self, info):
+        time.sleep(0.3)
+        return "b"
+
+
+class SlowConsumer(GraphQLHttpConsumer):
+    view = GraphQLView(
+        schema=graphene.Schema(query=Query),
+        batch=False,
+        backend=DOCUMENT_CACHE)
+
+
+def post(body):
+    async def request():
+        communicator = HttpCommunicator(
+            SlowConsumer,
+            "POST",
+            "/gql/",
+            body=json.dumps(body).encode(),
+            headers=[(b"content-type", b"application/json")])
+        return await communicator.get_response()
+
+    loop = asyncio.new_event_loop()
+    try:
+        response = loop.run_until_complete(request())
+    finally:
+        loop.close()
+    return response["status"], json.loads(response["body"].decode())
+
+
+def test_sibling_root_fields_run_concurrently():
+    start = time.time()
+    status, body = post({"query": "{ slowA slowB }"})
+
+    assert status == 200
+    assert body == {"data": {"slowA": "a", "slowB": "b"}}
+    assert time.time() - start < 0.55, "Should resolve slowA and slowB " \
+        "at the same time"
+
+
+def test_invalid_query():
+    status, body = post({"query": "{ unknownField }"})
+
+    assert status == 400
+    assert "unknownField" in body["errors"][0]["message"]
+
+    status, body = post({"foo": "bar"})
+    assert status == 400
+    assert body["errors"][0]["message"] == "Must provide query string."
+
+
+def test_batch_runs_operations_concurrently():
+    start = time.time()
+    status, body = post([
+        {
+            "id": 1,
+            "query": "{ slowA }"
+        },
+        {
+            "id": 2,
+            "query": "{ slowB }"
+        },
+    ])
+
+    assert status == 200
+    assert body == [
+        {
+            "id": 1,
+            "status": 200,
+            "data": {
+                "slowA": "a"
+            }
+        },
+        {
+            "id": 2,
+            "status": 200,
+            "data": {
+                "slowB": "b"
+            }
+        },
+    ]
+    assert time.time() - start < 0.55, "Should run both operations " \
+        "at the same time"
+
+
+def test_batch_errors(settings):
+    status, body = post([{"query": "{ slowA }"}, {"foo": "bar"}])
+
+    assert status == 400
+    assert body[0]["data"] == {"slowA": "a"}
+    assert body[1]["status"] == 400
+    assert body[1]["errors"][0]["message"] == "Must provide query string."
+
+    status, body = post([])
+    assert status == 400
+
+    settings.GRAPHQL_HTTP = {"MAX_BATCH_SIZE": 1}
+    status, body = post([{"query": "{ slowA }"}, {"query": "{ slowB }"}])
+    assert status == 400
+    assert body["errors"][0]["message"] == \
+        "Batches are limited to 1 operations."
+
+
+def test_wsgi_endpoint_runs_batches(client):
+    response = client.post(
+        "/gql/",
+        json.dumps([{
+            "id": 1,
+            "query": "{ __typename }"
+        }, {
+            "id": 2,
+            "query": "{ unknownField }"
+        }, {
+            "id": 3
+        }]),
+        content_type="application/json")
+
+    assert response.status_code == 400
+    body = response.json()
+    assert body[0] == {"id": 1, "status": 200, "data": {"__typename": "Query"}}
+    assert body[1]["status"] == 400
+    assert "unknownField" in body[1]["errors"][0]["message"]
+    assert body[2]["errors"][0]["message"] == "Must provide query string."
+
+    response = client.post(
+        "/gql/", {"query": "{ __typename }"},
+        content_type="application/json")
+    assert response.json() == {"data": {"__typename": "Query"}}
+
+    response = client.get("/gql/", {"query": "{ __typename }"})
+    assert response.json() == {"data": {"__typename": "Query"}}
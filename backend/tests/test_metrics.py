@@ -0,0 +1,244 @@
+"""This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+# pylint: skip-file
+import asyncio
+import threading
+
+import graphene
+import grpc
+import pytest
+from django.contrib.auth.models import User
+from rx import Observable
+
+import backend.lnd.rpc_pb2 as ln
+import backend.lnd.rpc_pb2_grpc as lnrpc
+from backend.lnd import utils
+from backend.lnd.fake_lnd import FakeLnd, FakeLndOptions
+from backend.metrics import (LND_RPC_DURATION, REQUEST_DB_QUERIES,
+                             RESOLVER_DURATION, SUBSCRIPTION_EVENTS,
+                             SUBSCRIPTIONS_ACTIVE, Counter, Histogram)
+from backend.middleware import MetricsMiddleware
+from backend.subscriptions import subscriptions
+from backend.subscriptions.subscriptions import ChannelsSubscriptionServer
+
+
+def test_renders_text_format():
+    counter = Counter("test_events_total", "Events", ["kind"])
+    counter.inc(kind="a\"b")
+    counter.inc(2, kind="c")
+    histogram = Histogram(
+        "test_duration_seconds", "Duration", ["method"], buckets=(0.1, 1))
+    histogram.observe(0.5, method="GetInfo")
+    histogram.observe(2, method="GetInfo")
+
+    assert counter.render().splitlines() == [
+        "# HELP test_events_total Events",
+        "# TYPE test_events_total counter",
+        "test_events_total{kind=\"a\\\"b\"} 1",
+        "test_events_total{kind=\"c\"} 2",
+    ]
+    assert histogram.render().splitlines()[2:] == [
+        "test_duration_seconds_bucket{method=\"GetInfo\",le=\"0.1\"} 0",
+        "test_duration_seconds_bucket{method=\"GetInfo\",le=\"1\"} 1",
+        "test_duration_seconds_bucket{method=\"GetInfo\",le=\"+Inf\"} 2",
+        "test_duration_seconds_sum{method=\"GetInfo\"} 2.5",
+        "test_duration_seconds_count{method=\"GetInfo\"} 2",
+    ]
+    assert histogram.count(method="GetInfo") == 2
+
+
+class Item(graphene.ObjectType):
+    users = graphene.Int()
+
+    def resolve_users(self, info):
+        return User.objects.count()
+
+
+class Query(graphene.ObjectType):
+    users = graphene.Int()
+    item = graphene.Field(Item)
+    error = graphene.String()
+
+    def resolve_users(self, info):
+        return User.objects.count()
+
+    def resolve_item(self, info):
+        return Item()
+
+    def resolve_error(self, info):
+        raise ValueError("boom")
+
+
+class Subscription(graphene.ObjectType):
+    ticks = graphene.Int()
+
+    def resolve_ticks(self, info):
+        return Observable.from_([1, 2]).concat(Observable.never())
+
+
+SCHEMA = graphene.Schema(query=Query, subscription=Subscription)
+
+
+class Context():
+    pass
+
+
+def test_middleware_times_resolvers_and_counts_queries(db, settings):
+    settings.METRICS = dict(settings.METRICS, ALL_FIELDS=False)
+    users = RESOLVER_DURATION.count(type="Query", field="users")
+    errors = RESOLVER_DURATION.count(type="Query", field="error")
+    nested = RESOLVER_DURATION.count(type="Item", field="users")
+
+    context = Context()
+    result = SCHEMA.execute(
+        "{ users item { users } error }",
+        context=context,
+        middleware=[MetricsMiddleware()])
+
+    assert result.data["users"] == 0
+    assert result.data["item"] == {"users": 0}
+    assert len(result.errors) == 1
+    assert context.db_queries.count == 2
+    assert RESOLVER_DURATION.count(type="Query", field="users") == users + 1
+    assert RESOLVER_DURATION.count(type="Query", field="error") == errors + 1
+    assert RESOLVER_DURATION.count(type="Item", field="users") == nested
+
+    settings.METRICS = dict(settings.METRICS, ALL_FIELDS=True)
+    SCHEMA.execute(
+        "{ item { users } }",
+        context=Context(),
+        middleware=[MetricsMiddleware()])
+    assert RESOLVER_DURATION.count(type="Item", field="users") == nested + 1
+
+
+class Socket():
+    def __init__(self):
+        self.messages = []
+
+    async def send_json(self, data):
+        self.messages.append(data)
+
+
+def run_on_new_loop(coroutine):
+    # other tests leave tasks behind on the default loop
+    previous = asyncio.get_event_loop()
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+        asyncio.set_event_loop(previous)
+
+
+def test_counts_subscription_events():
+    server = ChannelsSubscriptionServer(schema=SCHEMA)
+    events = SUBSCRIPTION_EVENTS.value(subscription="ticks")
+
+    async def subscribe():
+        socket = Socket()
+        context = await server.handle(socket, {})
+        params = server.get_graphql_params(
+            context, {"query": "subscription { ticks }"})
+        operation = asyncio.ensure_future(
+            server.on_start(context, "1", params))
+
+        while SUBSCRIPTION_EVENTS.value(subscription="ticks") < events + 2:
+            await asyncio.sleep(0.01)
+        assert SUBSCRIPTIONS_ACTIVE.value(subscription="ticks") == 1
+
+        await server.on_close(context)
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(operation, 1)
+        assert socket.messages[-1] == {"id": "1", "type": "complete"}
+
+    run_on_new_loop(subscribe())
+    assert SUBSCRIPTIONS_ACTIVE.value(subscription="ticks") == 0
+
+
+def test_subscription_start_leaves_the_loop_to_others(monkeypatch):
+    server = ChannelsSubscriptionServer(schema=SCHEMA)
+    threads = []
+
+    def resolve(query, extensions):
+        threads.append(threading.current_thread())
+        return query
+
+    monkeypatch.setattr(subscriptions, "resolve_persisted_query", resolve)
+    lookups = []
+    document_from_string = subscriptions.DOCUMENT_CACHE.document_from_string
+
+    def lookup(schema, document_string):
+        lookups.append(threading.current_thread())
+        return document_from_string(schema, document_string)
+
+    monkeypatch.setattr(subscriptions.DOCUMENT_CACHE, "document_from_string",
+                        lookup)
+
+    async def subscribe():
+        socket = Socket()
+        context = await server.handle(socket, {})
+        params = server.get_graphql_params(
+            context, {"query": "subscription { ticks }"})
+        operation = asyncio.ensure_future(
+            server.on_start(context, "1", params))
+        while len(socket.messages) < 2:
+            await asyncio.sleep(0.01)
+        await server.on_close(context)
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(operation, 1)
+
+    run_on_new_loop(subscribe())
+    assert threads and threading.main_thread() not in threads, \
+        "Should look up the persisted queries in a worker thread"
+    assert len(lookups) == 1, "Should resolve the document once"
+    assert threading.main_thread() not in lookups, \
+        "Should parse and validate the document in a worker thread"
+
+
+def test_view(client, db, settings):
+    requests = REQUEST_DB_QUERIES.count()
+    client.post(
+        "/gql/", {"query": "{ __typename }"}, content_type="application/json")
+    assert REQUEST_DB_QUERIES.count() == requests + 1
+
+    response = client.get("/metrics", REMOTE_ADDR="127.0.0.1")
+    assert response.status_code == 200
+    assert response["Content-Type"].startswith("text/plain")
+    assert b"graphql_request_db_queries_count " in response.content
+    assert b"# TYPE lnd_rpc_duration_seconds histogram" in response.content
+
+    assert client.get("/metrics", REMOTE_ADDR="10.0.0.1").status_code == 403
+
+
+def test_interceptor_records_rpc_latency(tmp_path):
+    node = FakeLnd(str(tmp_path), options=FakeLndOptions(latency=0.1))
+    node.start()
+    channel_data = utils.build_grpc_channel_manual(
+        "localhost", node.port, node.tls_cert_path, node.admin_macaroon_path)
+    stub = lnrpc.LightningStub(channel_data.channel)
+    metadata = [("macaroon", channel_data.macaroon)]
+    try:
+        succeeded = LND_RPC_DURATION.count(method="GetInfo", code="OK")
+        failed = LND_RPC_DURATION.count(
+            method="GetInfo", code="RESOURCE_EXHAUSTED")
+
+        stub.GetInfo(ln.GetInfoRequest(), metadata=metadata, timeout=5)
+        node.options = node.options._replace(
+            error_rate=1.0, error_code="RESOURCE_EXHAUSTED")
+        with pytest.raises(grpc.RpcError):
+            stub.GetInfo(ln.GetInfoRequest(), metadata=metadata, timeout=5)
+
+        assert LND_RPC_DURATION.count(
+            method="GetInfo", code="OK") == succeeded + 1
+        assert LND_RPC_DURATION.count(
+            method="GetInfo", code="RESOURCE_EXHAUSTED") == failed + 1
+        assert "lnd_rpc_duration_seconds_bucket{method=\"GetInfo\"," \
+            "code=\"OK\",le=\"0.05\"}" in LND_RPC_DURATION.render()
+    finally:
+        channel_data.channel.close()
+        node.stop()
+        # grpc fails to collect channels left over at exit
+        utils.CHANNEL_CACHE._cache.clear()
@@ -0,0 +1,52 @@
+"""This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+# pylint: skip-file
+import graphene
+
+from backend.error_responses import WalletInstanceNotRunning
+from backend.lnd.rpc_client import WalletUnavailable
+from backend.middleware import WalletUnavailableMiddleware
+
+
+class Success(graphene.ObjectType):
+    value = graphene.String()
+
+
+class Payload(graphene.Union):
+    class Meta:
+        types = (Success, WalletInstanceNotRunning)
+
+
+class Query(graphene.ObjectType):
+    payload = graphene.Field(Payload)
+    value = graphene.String()
+
+    def resolve_payload(self, info, **kwargs):
+        raise WalletUnavailable()
+
+    def resolve_value(self, info, **kwargs):
+        raise WalletUnavailable()
+
+
+SCHEMA = graphene.Schema(query=Query)
+
+
+def test_maps_wallet_unavailable_to_not_running():
+    result = SCHEMA.execute(
+        "{ payload { __typename } }",
+        middleware=[WalletUnavailableMiddleware()])
+    assert result.errors is None
+    assert result.data == {
+        "payload": {
+            "__typename": "WalletInstanceNotRunning"
+        }
+    }
+
+
+def test_reraises_without_matching_response_type():
+    result = SCHEMA.execute(
+        "{ value }", middleware=[WalletUnavailableMiddleware()])
+    assert result.data == {"value": None}
+    assert len(result.errors) == 1
@@ -0,0 +1,68 @@
+"""This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+# pylint: skip-file
+import json
+
+import pytest
+from django.core.cache import cache
+from django.test import RequestFactory
+
+from backend.graphql_backend import document_hash
+from backend.persisted_queries import (PersistedQueryError,
+                                       resolve_persisted_query)
+from backend.views import PersistedQueryGraphQLView
+
+QUERY = "{ getConfiguration { testnet } }"
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+def persisted(query_hash):
+    return {"persistedQuery": {"version": 1, "sha256Hash": query_hash}}
+
+
+def test_resolve_persisted_query():
+    assert resolve_persisted_query(QUERY, {}) == QUERY, \
+        "Should pass through regular requests"
+
+    with pytest.raises(PersistedQueryError) as exc:
+        resolve_persisted_query(None, persisted(document_hash(QUERY)))
+    assert exc.value.extensions["code"] == "PERSISTED_QUERY_NOT_FOUND"
+
+    with pytest.raises(PersistedQueryError) as exc:
+        resolve_persisted_query(QUERY, persisted("0" * 64))
+    assert exc.value.extensions["code"] == "PERSISTED_QUERY_HASH_MISMATCH"
+
+    # register and look up
+    extensions = persisted(document_hash(QUERY))
+    assert resolve_persisted_query(QUERY, extensions) == QUERY
+    assert resolve_persisted_query(None, extensions) == QUERY
+
+
+def post(data):
+    request = RequestFactory().post(
+        "/gql/", json.dumps(data), content_type="application/json")
+    response = PersistedQueryGraphQLView.as_view()(request)
+    return response.status_code, json.loads(response.content.decode())
+
+
+@pytest.mark.django_db
+def test_view():
+    extensions = persisted(document_hash(QUERY))
+
+    status, body = post({"extensions": extensions})
+    assert status == 200
+    assert body["errors"][0]["message"] == "PersistedQueryNotFound"
+
+    status, body = post({"query": QUERY, "extensions": extensions})
+    assert body["data"] == {"getConfiguration": {"testnet": True}}
+
+    status, body = post({"extensions": extensions})
+    assert body["data"] == {"getConfiguration": {"testnet": True}}
@@ -0,0 +1,138 @@
+"""This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+# pylint: skip-file
+import json
+
+import pytest
+from django.core.cache import cache
+from django.test import RequestFactory
+from graphql.language.parser import parse
+from mixer.backend.django import mixer
+
+from backend.lnd.models import LNDWallet
+from backend.query_cost import (QueryCostError, charge_wallet,
+                                check_query_cost, query_cost)
+from backend.schema import schema
+from backend.views import PersistedQueryGraphQLView
+
+LIST_PAYMENTS = """
+query Payments($num: Int) {
+    lnListPayments(numMaxPayments: $num) {
+        ... on ListPaymentsSuccess { payments { paymentHash } }
+    }
+}
+"""
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+def cost(query, variables=None, operation_name=None):
+    return query_cost(schema, parse(query), variables, operation_name)
+
+
+def test_query_cost():
+    assert cost("{ getConfiguration { testnet } }") == 1
+    assert cost("{ __typename getConfiguration { __typename } }") == 1
+
+    # weight + payments list, charged per started page of 100
+    assert cost(LIST_PAYMENTS) == 21
+    assert cost(LIST_PAYMENTS, {"num": 100}) == 21
+    assert cost(LIST_PAYMENTS, {"num": 101}) == 42
+    assert cost(LIST_PAYMENTS, {"num": 100000}) == 21000
+
+    fragments = """
+    { lnGetTransactions { ...Transactions } lnListInvoices { ...Invoices } }
+    fragment Transactions on GetTransactionsSuccess { lnTransactionDetails {
+        transactions { txHash } } }
+    fragment Invoices on ListInvoicesSuccess { invoices { memo } }
+    """
+    assert cost(fragments) == (50 + 2) + (20 + 1)
+
+    assert cost("{ a } { b }") == 0, "Should ignore ambiguous documents"
+    assert cost(LIST_PAYMENTS, {"num": "many"}) == 0, \
+        "Should ignore invalid variables"
+
+
+def test_check_query_cost(settings):
+    settings.GRAPHQL_QUERY_COST = dict(
+        settings.GRAPHQL_QUERY_COST, MAX_COST=100)
+    document = parse(LIST_PAYMENTS)
+
+    assert check_query_cost(schema, document, {"num": 200}) == 42
+    with pytest.raises(QueryCostError) as exc:
+        check_query_cost(schema, document, {"num": 1000})
+    assert exc.value.extensions == {
+        "code": "QUERY_TOO_EXPENSIVE",
+        "cost": 210
+    }
+
+
+def test_charge_wallet(settings):
+    settings.GRAPHQL_QUERY_COST = dict(
+        settings.GRAPHQL_QUERY_COST, WALLET_BUDGET=100)
+
+    charge_wallet(1, 60)
+    charge_wallet(2, 60)
+    with pytest.raises(QueryCostError) as exc:
+        charge_wallet(1, 60)
+    assert exc.value.extensions["code"] == "WALLET_THROTTLED"
+
+
+@pytest.mark.django_db
+def test_view_rejects_expensive_queries(settings):
+    settings.GRAPHQL_QUERY_COST = dict(
+        settings.GRAPHQL_QUERY_COST, WALLET_BUDGET=50)
+    user = mixer.blend("auth.User")
+    mixer.blend(LNDWallet, owner=user)
+
+    def post(variables):
+        request = RequestFactory().post(
+            "/gql/",
+            json.dumps({
+                "query": LIST_PAYMENTS,
+                "variables": variables
+            }),
+            content_type="application/json")
+        request.user = user
+        response = PersistedQueryGraphQLView.as_view()(request)
+        return json.loads(response.content.decode())
+
+    body = post({"num": 100000})
+    assert body["errors"][0]["extensions"]["code"] == "QUERY_TOO_EXPENSIVE"
+
+    # the resolver fails without a running daemon, the budget is
+    # charged before the execution anyway
+    post({"num": 100})
+    post({"num": 100})
+    body = post({"num": 100})
+    assert body["errors"][0]["extensions"]["code"] == "WALLET_THROTTLED"
+
+
+@pytest.mark.django_db
+def test_graphiql_endpoint_rejects_expensive_queries(client, settings):
+    settings.GRAPHQL_QUERY_COST = dict(
+        settings.GRAPHQL_QUERY_COST, MAX_COST=100)
+    client.force_login(mixer.blend("auth.User"))
+
+    response = client.post(
+        "/graphql/",
+        json.dumps({
+            "query": LIST_PAYMENTS,
+            "variables": {
+                "num": 1000
+            }
+        }),
+        content_type="application/json")
+    body = response.json()
+    assert body["errors"][0]["extensions"]["code"] == "QUERY_TOO_EXPENSIVE"
+    assert "data" not in body or body["data"] is None
+
+    response = client.get("/graphql/", HTTP_ACCEPT="text/html")
+    assert response.status_code == 200, "Should still serve GraphiQL"
@@ -0,0 +1,60 @@
+"""This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+# pylint: skip-file
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from backend.request_cache import RequestCache, request_cache
+
+
+def test_computes_once_for_concurrent_lookups():
+    cache = RequestCache()
+    calls = []
+    results = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.1)
+        return "value"
+
+    def lookup():
+        results.append(cache.get_or_compute("key", compute))
+
+    threads = [threading.Thread(target=lookup) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == ["value"] * 5
+    assert cache.get_or_compute("key", lambda: "other") == "value"
+
+
+def test_failures_and_cache_if():
+    cache = RequestCache()
+
+    def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        cache.get_or_compute("key", fail)
+    assert cache.get_or_compute("key", lambda: 1) == 1, \
+        "Should not keep failures"
+
+    assert cache.get_or_compute("none", lambda: None, cache_if=bool) is None
+    assert cache.get_or_compute("none", lambda: 2, cache_if=bool) == 2
+    assert cache.get_or_compute("none", lambda: 3, cache_if=bool) == 2
+
+
+def test_request_cache_is_bound_to_context():
+    first = SimpleNamespace()
+    second = SimpleNamespace()
+
+    assert request_cache(first) is request_cache(first)
+    assert request_cache(first) is not request_cache(second)
@@ -0,0 +1,113 @@
+"""This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+# pylint: skip-file
+import json
+import logging
+import time
+
+import graphene
+import pytest
+from django.contrib.auth.models import User
+
+from backend import slow_log
+from backend.graphql_backend import document_hash
+from backend.middleware import MetricsMiddleware
+from backend.slow_log import (OperationLog, finish_operation_log,
+                              start_operation_log, variables_digest)
+
+
+@pytest.fixture
+def logged(monkeypatch, settings, caplog):
+    settings.SLOW_LOG = dict(
+        settings.SLOW_LOG, THRESHOLD=0, SAMPLE_RATE=1.0, MAX_EVENTS=3)
+    # the configured logger writes to a file and does not propagate
+    monkeypatch.setattr(slow_log, "LOGGER",
+                        logging.getLogger("test_slow_log"))
+
+    def records():
+        return [
+            json.loads(record.getMessage()) for record in caplog.records
+            if record.name == "test_slow_log"
+        ]
+
+    return records
+
+
+def test_record():
+    log = OperationLog()
+    log.add_operation("{ a }", {"b": 1}, "Op")
+    start = time.perf_counter()
+    log.add_rpc(3, "GetInfo", "OK", start)
+    log.add_query("SELECT 1", start - 0.01)
+
+    record = log.record()
+    assert record["operations"] == [{
+        "name": "Op",
+        "query_hash": document_hash("{ a }"),
+        "variables": variables_digest({"b": 1})
+    }]
+    assert record["wallets"] == [3]
+    assert [e["type"] for e in record["timeline"]] == ["db", "grpc"]
+    assert record["timeline"][0]["duration_ms"] >= 10
+    assert variables_digest({"b": 1}) != variables_digest({"b": 2})
+    assert variables_digest(None) is None
+
+
+class Query(graphene.ObjectType):
+    users = graphene.Int()
+
+    def resolve_users(self, info):
+        User.objects.count()
+        return User.objects.count()
+
+
+SCHEMA = graphene.Schema(query=Query)
+
+
+class Context():
+    pass
+
+
+def test_logs_slow_requests(db, settings, logged):
+    context = Context()
+    start_operation_log(context)
+    SCHEMA.execute(
+        "{ a: users b: users }",
+        context=context,
+        middleware=[MetricsMiddleware()])
+    finish_operation_log(context)
+
+    record = logged()[0]
+    assert record["db_queries"] == 4
+    assert record["dropped_events"] == 1
+    assert [e["sql"].split()[0] for e in record["timeline"]] == ["SELECT"] * 3
+
+    settings.SLOW_LOG = dict(settings.SLOW_LOG, THRESHOLD=60)
+    start_operation_log(context)
+    finish_operation_log(context)
+    settings.SLOW_LOG = dict(settings.SLOW_LOG, THRESHOLD=0, SAMPLE_RATE=0)
+    start_operation_log(context)
+    assert context.operation_log is None
+    finish_operation_log(context)
+    assert len(logged()) == 1
+
+
+def test_view(client, db, logged):
+    query = "query Op($a: Int) { __typename }"
+    client.post(
+        "/gql/", {
+            "query": query,
+            "variables": {
+                "a": 1
+            }
+        },
+        content_type="application/json")
+
+    record = logged()[0]
+    assert record["operations"] == [{
+        "name": "Op",
+        "query_hash": document_hash(query),
+        "variables": variables_digest({"a": 1})
+    }]
@@ -0,0 +1,36 @@
+"""This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+# pylint: skip-file
+import pytest
+
+from backend.startup_benchmark import (LAZY_MODULES, _parse_import_times,
+                                       benchmark_startup, run_startup)
+
+
+def test_parse_import_times():
+    assert _parse_import_times("\n".join([
+        "import time: self [us] | cumulative | imported package",
+        "import time:       120 |        150 |   backend.lnd.rpc",
+        "unrelated line",
+    ])) == {
+        "backend.lnd.rpc": (120, 150)
+    }
+
+
+@pytest.mark.parametrize("target", ["web", "celery"])
+def test_workers_do_not_import_the_generated_modules(target):
+    run = run_startup(target)
+    assert run.seconds > 0
+    assert ("backend.lnd.schema" in run.modules) == (target == "web")
+    assert [name for name in LAZY_MODULES if name in run.modules] == []
+
+
+def test_benchmark_startup():
+    result = benchmark_startup("asgi", repeat=1, top=3)
+    assert result["lazy_modules_imported"] == []
+    assert result["maxrss_kb"] > 0
+    assert len(result["slowest_imports"]) == 3
+    for times in result["slowest_imports"].values():
+        assert times["cumulative_ms"] >= times["self_ms"] > 0
@@ -0,0 +1,284 @@
+"""This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+# pylint: skip-file
+import json
+import threading
+
+import graphene
+import grpc
+import pytest
+
+import backend.lnd.rpc_pb2 as ln
+import backend.lnd.rpc_pb2_grpc as lnrpc
+from backend import tracing
+from backend.lnd import utils
+from backend.lnd.fake_lnd import FakeLnd
+from backend.middleware import TracingMiddleware
+from backend.tracing import (CLIENT, CONSUMER, SERVER, NoopSpan,
+                             RpcTracingInterceptor, SpanContext,
+                             TraceCollector, extract, inject, start_span,
+                             wrap)
+from backend.user_profile import tasks
+
+TRACE_ID = "0af7651916cd43dd8448eb211c80319c"
+TRACEPARENT = "00-{}-b7ad6b7169203331-01".format(TRACE_ID)
+
+
+@pytest.fixture
+def exported(settings, tmp_path):
+    settings.TRACING = dict(
+        settings.TRACING,
+        EXPORTER="file",
+        FILE=str(tmp_path / "traces.jsonl"),
+        SAMPLE_RATE=1.0,
+        EXPORT_INTERVAL=60)
+
+    def spans():
+        tracing.flush()
+        if not (tmp_path / "traces.jsonl").exists():
+            return []
+        spans = []
+        with open(settings.TRACING["FILE"]) as output:
+            for line in output:
+                batch = json.loads(line)
+                for resource in batch["resourceSpans"]:
+                    for scope in resource["scopeSpans"]:
+                        spans.extend(scope["spans"])
+        return spans
+
+    return spans
+
+
+def by_name(spans):
+    return {span["name"]: span for span in spans}
+
+
+def test_extract_and_inject(exported):
+    assert extract(TRACEPARENT) == SpanContext(TRACE_ID, "b7ad6b7169203331",
+                                               True)
+    assert extract("00-{}-b7ad6b7169203331-00".format(TRACE_ID)).sampled \
+        is False
+    assert extract("garbage") is None
+    assert extract(None) is None
+
+    assert inject({}) == {}
+    with start_span("outer", parent=extract(TRACEPARENT)) as span:
+        assert inject({}) == {"traceparent": span.traceparent()}
+        assert span.trace_id == TRACE_ID
+
+    spans = exported()
+    assert len(spans) == 1
+    assert spans[0]["traceId"] == TRACE_ID
+    assert spans[0]["parentSpanId"] == "b7ad6b7169203331"
+
+
+def test_sampling(exported, settings):
+    unsampled = extract("00-{}-b7ad6b7169203331-00".format(TRACE_ID))
+    assert isinstance(start_span("a", parent=unsampled), NoopSpan)
+
+    settings.TRACING = dict(settings.TRACING, SAMPLE_RATE=0.0)
+    with start_span("root") as root:
+        assert isinstance(root, NoopSpan)
+        # the children of unsampled traces are not recorded either
+        assert isinstance(start_span("child"), NoopSpan)
+        assert inject({}) == {}
+
+    settings.TRACING = dict(settings.TRACING, EXPORTER=None)
+    assert isinstance(start_span("a", parent=extract(TRACEPARENT)), NoopSpan)
+    assert exported() == []
+
+
+def test_file_exporter(exported):
+    with start_span("parent", attributes={"a": 1, "b": "c"}) as parent:
+        with pytest.raises(ValueError):
+            with start_span("child", CLIENT):
+                raise ValueError("boom")
+        # work handed to other threads keeps the parent
+        thread = threading.Thread(target=wrap(lambda: start_span("t").end()))
+        thread.start()
+        thread.join()
+
+    spans = by_name(exported())
+    assert set(spans) == {"parent", "child", "t"}
+    assert spans["parent"]["attributes"] == [{
+        "key": "a",
+        "value": {
+            "intValue": "1"
+        }
+    }, {
+        "key": "b",
+        "value": {
+            "stringValue": "c"
+        }
+    }]
+    assert "parentSpanId" not in spans["parent"]
+    for name in ("child", "t"):
+        assert spans[name]["traceId"] == parent.trace_id
+        assert spans[name]["parentSpanId"] == parent.span_id
+    assert spans["child"]["kind"] == CLIENT
+    assert spans["child"]["status"] == {"code": 2, "message": "boom"}
+    assert int(spans["parent"]["endTimeUnixNano"]) >= int(
+        spans["child"]["endTimeUnixNano"])
+
+
+def test_otlp_exporter(settings):
+    received = []
+    collector = TraceCollector(("localhost", 0), received.append)
+    thread = threading.Thread(target=collector.serve_forever, daemon=True)
+    thread.start()
+    try:
+        settings.TRACING = dict(
+            settings.TRACING,
+            EXPORTER="otlp",
+            OTLP_ENDPOINT="http://localhost:{}/v1/traces".format(
+                collector.server_address[1]),
+            SERVICE_NAME="test",
+            SAMPLE_RATE=1.0,
+            EXPORT_INTERVAL=60)
+        start_span("exported").end()
+        tracing.flush()
+    finally:
+        collector.shutdown()
+        collector.server_close()
+
+    assert len(received) == 1
+    resource = received[0]["resourceSpans"][0]
+    assert resource["resource"]["attributes"] == [{
+        "key": "service.name",
+        "value": {
+            "stringValue": "test"
+        }
+    }]
+    assert resource["scopeSpans"][0]["spans"][0]["name"] == "exported"
+
+
+def test_interceptor_adds_traceparent_to_metadata(exported):
+    calls = []
+
+    class Outcome():
+        def code(self):
+            return grpc.StatusCode.OK
+
+        def add_done_callback(self, callback):
+            callback(self)
+
+    def continuation(details, request):
+        calls.append(details)
+        return Outcome()
+
+    details = tracing._CallDetails("/lnrpc.Lightning/GetInfo", 5,
+                                   [("macaroon", "00")], None, None)
+    with start_span("request") as span:
+        RpcTracingInterceptor().intercept_unary_unary(
+            continuation, details, None)
+
+    spans = by_name(exported())
+    metadata = dict(calls[0].metadata)
+    assert metadata["macaroon"] == "00"
+    assert metadata["traceparent"] == "00-{}-{}-01".format(
+        span.trace_id, spans["lnrpc.Lightning/GetInfo"]["spanId"])
+    assert spans["lnrpc.Lightning/GetInfo"]["parentSpanId"] == span.span_id
+
+
+def test_traces_lnd_calls(exported, tmp_path):
+    node = FakeLnd(str(tmp_path))
+    node.start()
+    try:
+        channel_data = utils.build_grpc_channel_manual(
+            "localhost", node.port, node.tls_cert_path,
+            node.admin_macaroon_path)
+        stub = lnrpc.LightningStub(channel_data.channel)
+        metadata = [("macaroon", channel_data.macaroon)]
+        with start_span("request"):
+            stub.GetInfo(ln.GetInfoRequest(), metadata=metadata, timeout=5)
+            with pytest.raises(grpc.RpcError):
+                stub.GetInfo(ln.GetInfoRequest(), timeout=5)
+    finally:
+        node.stop()
+        channel_data.channel.close()
+        # grpc fails to collect channels left over at exit
+        utils.CHANNEL_CACHE._cache.clear()
+
+    spans = exported()
+    calls = [s for s in spans if s["name"] == "lnrpc.Lightning/GetInfo"]
+    assert [s["kind"] for s in calls] == [CLIENT, CLIENT]
+    assert "status" not in calls[0]
+    assert calls[1]["status"] == {"code": 2, "message": "UNAUTHENTICATED"}
+    assert by_name(spans)["lnd.channel.open"]["kind"] == tracing.INTERNAL
+
+
+def test_traces_celery_tasks(exported):
+    tasks.test.apply(args=["traced"], headers={"traceparent": TRACEPARENT})
+
+    span = by_name(exported())["run backend.user_profile.tasks.test"]
+    assert span["kind"] == CONSUMER
+    assert span["traceId"] == TRACE_ID
+    assert span["parentSpanId"] == "b7ad6b7169203331"
+    assert tracing.current_span() is None
+
+
+def test_injects_task_headers(exported):
+    headers = {}
+    with start_span("request") as span:
+        tracing._inject_task_headers(sender="a.task", headers=headers)
+
+    publish = by_name(exported())["publish a.task"]
+    assert publish["parentSpanId"] == span.span_id
+    assert headers["traceparent"] == "00-{}-{}-01".format(
+        span.trace_id, publish["spanId"])
+
+
+class Query(graphene.ObjectType):
+    hello = graphene.String()
+    error = graphene.String()
+
+    def resolve_hello(self, info):
+        start_span("inner").end()
+        return "world"
+
+    def resolve_error(self, info):
+        raise ValueError("boom")
+
+
+class Context():
+    pass
+
+
+def test_middleware(exported):
+    context = Context()
+    context.trace_span = start_span("request", SERVER)
+    result = graphene.Schema(query=Query).execute(
+        "{ hello error }", context=context, middleware=[TracingMiddleware()])
+    context.trace_span.end()
+
+    assert result.data["hello"] == "world"
+    spans = by_name(exported())
+    request_id = context.trace_span.span_id
+    assert spans["resolve Query.hello"]["parentSpanId"] == request_id
+    assert spans["resolve Query.error"]["parentSpanId"] == request_id
+    assert spans["resolve Query.error"]["status"]["message"] == "boom"
+    assert spans["inner"]["parentSpanId"] == \
+        spans["resolve Query.hello"]["spanId"]
+
+
+def test_view(client, db, exported):
+    client.post(
+        "/gql/", {"query": "{ __typename }"},
+        content_type="application/json",
+        HTTP_TRACEPARENT=TRACEPARENT)
+
+    spans = by_name(exported())
+    request = spans["POST /gql/"]
+    assert request["kind"] == SERVER
+    assert request["traceId"] == TRACE_ID
+    assert request["parentSpanId"] == "b7ad6b7169203331"
+    assert {
+        "key": "http.status_code",
+        "value": {
+            "intValue": "200"
+        }
+    } in request["attributes"]
+    assert spans["resolve Query.__typename"]["parentSpanId"] == \
+        request["spanId"]
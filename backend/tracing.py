@@ -0,0 +1,534 @@
+"""This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+Tracing compatible with OpenTelemetry.
+
+Spans are created for the HTTP requests, the root field resolvers
+(backend.middleware.TracingMiddleware), the opening of gRPC channels,
+the unary LND calls, Celery tasks and the HTTP calls to Prometheus
+and bitcoind. The trace context is propagated in the W3C traceparent
+format: from the HTTP headers of the request, into the gRPC metadata
+of the LND calls and into the headers of the Celery messages.
+
+Finished spans are exported in batches as OTLP/JSON, either appended
+to a file (one ExportTraceServiceRequest per line) or posted to an
+OTLP/HTTP collector, see TRACING in the settings. ./manage.py
+trace_collector runs a stand-in collector which writes the received
+batches to a file.
+
+Every thread has a current span, the parent of the spans it starts.
+Code which hands work to another thread passes the span along with
+wrap().
+"""
+
+import atexit
+import collections
+import json
+import logging
+import queue
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib import request as urllib_request
+
+import grpc
+from celery.signals import before_task_publish, task_postrun, task_prerun
+from django.conf import settings
+
+LOGGER = logging.getLogger(__name__)
+
+# span kinds and status codes of the OTLP protocol
+INTERNAL, SERVER, CLIENT, PRODUCER, CONSUMER = 1, 2, 3, 4, 5
+STATUS_OK, STATUS_ERROR = 1, 2
+
+TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+SpanContext = collections.namedtuple("SpanContext",
+                                     ["trace_id", "span_id", "sampled"])
+
+
+def tracing_setting(name: str):
+    """Returns the value of the given TRACING setting"""
+    return settings.TRACING[name]
+
+
+def _random_id(size: int) -> str:
+    return "{:0{}x}".format(random.getrandbits(size * 8), size * 2)
+
+
+def _attribute_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _attributes(attributes: dict) -> list:
+    return [{
+        "key": key,
+        "value": _attribute_value(value)
+    } for key, value in attributes.items()]
+
+
+class Span():
+    """A timed operation of a trace
+
+    Use as context manager to make it the current span of the thread
+    and end it on exit, or call end() explicitly.
+    """
+
+    def __init__(self,
+                 name: str,
+                 trace_id: str,
+                 parent_id: str = None,
+                 kind: int = INTERNAL,
+                 attributes: dict = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = _random_id(8)
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.status = None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def set_error(self, exc: Exception):
+        self.status = {"code": STATUS_ERROR, "message": str(exc)}
+        self.attributes["exception.type"] = type(exc).__name__
+
+    def traceparent(self) -> str:
+        return "00-{}-{}-01".format(self.trace_id, self.span_id)
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            _processor().add(self)
+
+    def __enter__(self):
+        self._previous = current_span()
+        _CURRENT.span = self
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc is not None:
+            self.set_error(exc)
+        _CURRENT.span = self._previous
+        self.end()
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": _attributes(self.attributes)
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        if self.status:
+            span["status"] = self.status
+        return span
+
+
+class NoopSpan():
+    """Stands in for spans which are not recorded"""
+
+    trace_id = None
+
+    def set_attribute(self, key: str, value):
+        pass
+
+    def set_error(self, exc: Exception):
+        pass
+
+    def traceparent(self) -> str:
+        return None
+
+    def end(self):
+        pass
+
+    def __enter__(self):
+        # spans started within are not recorded either
+        self._previous = current_span()
+        _CURRENT.span = self
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        _CURRENT.span = self._previous
+
+
+_CURRENT = threading.local()
+
+
+def current_span():
+    """Returns the current span of the thread or None"""
+    return getattr(_CURRENT, "span", None)
+
+
+class use_span():
+    """Makes the span the current span of the thread within the
+    block without ending it"""
+
+    def __init__(self, span):
+        self.span = span
+
+    def __enter__(self):
+        self.previous = current_span()
+        _CURRENT.span = self.span
+        return self.span
+
+    def __exit__(self, *args):
+        _CURRENT.span = self.previous
+
+
+def wrap(fn):
+    """Returns fn running with the current span of the calling thread,
+    for work handed to other threads"""
+    span = current_span()
+
+    def run(*args, **kwargs):
+        with use_span(span):
+            return fn(*args, **kwargs)
+
+    return run
+
+
+def extract(traceparent: str) -> SpanContext:
+    """Returns the context of a W3C traceparent header or None"""
+    match = TRACEPARENT.match(traceparent or "")
+    if match is None:
+        return None
+    trace_id, span_id, flags = match.groups()
+    return SpanContext(trace_id, span_id, int(flags, 16) & 1 == 1)
+
+
+def start_span(name: str, kind: int = INTERNAL, parent=None,
+               attributes=None):
+    """Starts a span
+
+    parent: a Span, SpanContext or None for the current span of
+            the thread. Spans without a parent start a new trace
+            which is sampled at TRACING["SAMPLE_RATE"].
+
+    Returns a NoopSpan if tracing is disabled or the trace
+    is not sampled.
+    """
+    if tracing_setting("EXPORTER") is None:
+        return NoopSpan()
+
+    if parent is None:
+        parent = current_span()
+    if parent is None:
+        if random.random() >= tracing_setting("SAMPLE_RATE"):
+            return NoopSpan()
+        return Span(name, _random_id(16), None, kind, attributes)
+    if isinstance(parent, NoopSpan) or not getattr(parent, "sampled", True):
+        return NoopSpan()
+    return Span(name, parent.trace_id, parent.span_id, kind, attributes)
+
+
+def inject(carrier: dict) -> dict:
+    """Adds the traceparent of the current span to the headers"""
+    span = current_span()
+    traceparent = span.traceparent() if span is not None else None
+    if traceparent is not None:
+        carrier["traceparent"] = traceparent
+    return carrier
+
+
+def start_request_span(request):
+    """Starts the SERVER span of an HTTP request, continuing the trace
+    of the traceparent header, and keeps it as request.trace_span"""
+    span = start_span(
+        "{} {}".format(request.method, request.path),
+        SERVER,
+        parent=extract(request.META.get("HTTP_TRACEPARENT")),
+        attributes={
+            "http.method": request.method,
+            "http.target": request.path
+        })
+    request.trace_span = span
+    return span
+
+
+def request_span(context):
+    """Returns the span of the request the context belongs to"""
+    return getattr(context, "trace_span", None)
+
+
+class FileExporter():
+    """Appends the batches to a file, one OTLP/JSON request per line"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def export(self, payload: dict):
+        with open(self.path, "a") as output:
+            output.write(json.dumps(payload) + "\n")
+
+
+class OtlpHttpExporter():
+    """Posts the batches to an OTLP/HTTP collector as JSON"""
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+
+    def export(self, payload: dict):
+        request = urllib_request.Request(
+            self.endpoint,
+            data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST")
+        with urllib_request.urlopen(request, timeout=10) as response:
+            response.read()
+
+
+class BatchProcessor():
+    """Exports the finished spans in the background
+
+    The spans are exported every TRACING["EXPORT_INTERVAL"] seconds,
+    spans beyond TRACING["MAX_QUEUE"] are dropped.
+    """
+
+    def __init__(self, exporter, service_name: str):
+        self.exporter = exporter
+        self.service_name = service_name
+        self.dropped = 0
+        self._queue = queue.Queue(tracing_setting("MAX_QUEUE"))
+        self._flush = threading.Event()
+        self._flushed = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(
+            target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def add(self, span: Span):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout: float = 10):
+        """Exports the queued spans and waits for the export"""
+        deadline = time.time() + timeout
+        with self._flushed:
+            while True:
+                self._flush.set()
+                self._flushed.wait(max(0, deadline - time.time()))
+                # a running export might have missed the latest spans
+                if self._queue.empty() or time.time() >= deadline:
+                    return
+
+    def shutdown(self):
+        self._stopped = True
+        self.flush()
+
+    def payload(self, spans) -> dict:
+        return {
+            "resourceSpans": [{
+                "resource": {
+                    "attributes":
+                    _attributes({
+                        "service.name": self.service_name
+                    })
+                },
+                "scopeSpans": [{
+                    "scope": {
+                        "name": __name__
+                    },
+                    "spans": [span.to_otlp() for span in spans]
+                }]
+            }]
+        }
+
+    def _run(self):
+        while True:
+            self._flush.wait(tracing_setting("EXPORT_INTERVAL"))
+            self._flush.clear()
+
+            spans = []
+            while True:
+                try:
+                    spans.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if spans:
+                try:
+                    self.exporter.export(self.payload(spans))
+                except Exception as exc:
+                    LOGGER.warning("Exporting %s spans failed: %s",
+                                   len(spans), exc)
+
+            with self._flushed:
+                self._flushed.notify_all()
+            if self._stopped:
+                return
+
+
+_PROCESSOR = None
+_PROCESSOR_LOCK = threading.Lock()
+
+
+def _exporter_key() -> tuple:
+    return (tracing_setting("EXPORTER"), tracing_setting("FILE"),
+            tracing_setting("OTLP_ENDPOINT"))
+
+
+def _processor() -> BatchProcessor:
+    global _PROCESSOR
+    key = _exporter_key()
+    with _PROCESSOR_LOCK:
+        if _PROCESSOR is None or _PROCESSOR.key != key:
+            if _PROCESSOR is not None:
+                _PROCESSOR.shutdown()
+            if key[0] == "otlp":
+                exporter = OtlpHttpExporter(key[2])
+            else:
+                exporter = FileExporter(key[1])
+            _PROCESSOR = BatchProcessor(exporter,
+                                        tracing_setting("SERVICE_NAME"))
+            _PROCESSOR.key = key
+        return _PROCESSOR
+
+
+def flush():
+    """Exports all finished spans"""
+    if _PROCESSOR is not None:
+        _PROCESSOR.flush()
+
+
+atexit.register(flush)
+
+
+class _CallDetails(
+        collections.namedtuple(
+            "_CallDetails",
+            ["method", "timeout", "metadata", "credentials",
+             "wait_for_ready"]), grpc.ClientCallDetails):
+    pass
+
+
+class RpcTracingInterceptor(grpc.UnaryUnaryClientInterceptor):
+    """Traces the unary calls and propagates the trace context
+    in the metadata"""
+
+    def intercept_unary_unary(self, continuation, client_call_details,
+                              request):
+        service, method = client_call_details.method.strip("/").rsplit(
+            "/", 1)
+        span = start_span(
+            client_call_details.method.strip("/"),
+            CLIENT,
+            attributes={
+                "rpc.system": "grpc",
+                "rpc.service": service,
+                "rpc.method": method
+            })
+        if isinstance(span, NoopSpan):
+            return continuation(client_call_details, request)
+
+        metadata = list(client_call_details.metadata or [])
+        metadata.append(("traceparent", span.traceparent()))
+        details = _CallDetails(
+            client_call_details.method, client_call_details.timeout,
+            metadata, client_call_details.credentials,
+            getattr(client_call_details, "wait_for_ready", None))
+
+        def finish(outcome):
+            code = outcome.code()
+            span.set_attribute("rpc.grpc.status_code", code.value[0])
+            if code != grpc.StatusCode.OK:
+                span.status = {"code": STATUS_ERROR, "message": code.name}
+            span.end()
+
+        try:
+            outcome = continuation(details, request)
+        except grpc.RpcError as exc:
+            finish(exc)
+            raise
+        outcome.add_done_callback(finish)
+        return outcome
+
+
+# spans of the Celery tasks running in this worker by task id
+_TASK_SPANS = {}
+
+
+@before_task_publish.connect
+def _inject_task_headers(sender=None, headers=None, **kwargs):
+    if headers is None:
+        return
+    span = start_span(
+        "publish " + str(sender),
+        PRODUCER,
+        attributes={"messaging.system": "celery"})
+    with span:
+        inject(headers)
+
+
+@task_prerun.connect
+def _start_task_span(sender=None, task_id=None, task=None, **kwargs):
+    headers = task.request.get("headers") or {}
+    traceparent = task.request.get("traceparent") or headers.get(
+        "traceparent")
+    span = start_span(
+        "run " + task.name,
+        CONSUMER,
+        parent=extract(traceparent),
+        attributes={
+            "messaging.system": "celery",
+            "celery.task_id": task_id
+        })
+    _TASK_SPANS[task_id] = (span, current_span())
+    _CURRENT.span = span
+
+
+@task_postrun.connect
+def _end_task_span(sender=None, task_id=None, state=None, **kwargs):
+    span, previous = _TASK_SPANS.pop(task_id, (NoopSpan(), None))
+    span.set_attribute("celery.state", str(state))
+    if state == "FAILURE":
+        span.status = {"code": STATUS_ERROR, "message": str(state)}
+    _CURRENT.span = previous
+    span.end()
+
+
+class _CollectorHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        try:
+            payload = json.loads(body.decode("utf-8"))
+        except ValueError:
+            self.send_response(400)
+            self.end_headers()
+            return
+
+        self.server.receive(payload)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, format, *args):
+        LOGGER.debug(format, *args)
+
+
+class TraceCollector(ThreadingHTTPServer):
+    """Stand-in for an OTLP/HTTP collector, accepts JSON batches
+    at any path and passes them to the receive function"""
+
+    def __init__(self, address, receive):
+        super().__init__(address, _CollectorHandler)
+        self.receive = receive
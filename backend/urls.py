@@ -21,19 +21,28 @@ from django.contrib import admin
 from django.urls import path
 from django.views.decorators.csrf import csrf_exempt
 
-from graphene_django.views import GraphQLView
-
 from rest_framework_jwt.views import obtain_jwt_token
 from rest_framework_jwt.views import refresh_jwt_token
 from rest_framework_jwt.views import verify_jwt_token
 
+import backend.lnd.views
 import backend.user_profile.views
+from backend.graphql_backend import DOCUMENT_CACHE
+from backend.views import PersistedQueryGraphQLView, metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('graphql/', csrf_exempt(GraphQLView.as_view(graphiql=True))),
-    path('gql/', csrf_exempt(GraphQLView.as_view(batch=False))),
+    path('graphql/',
+         csrf_exempt(
+             PersistedQueryGraphQLView.as_view(
+                 graphiql=True, backend=DOCUMENT_CACHE))),
+    path('gql/',
+         csrf_exempt(
+             PersistedQueryGraphQLView.as_view(
+                 batch=True, backend=DOCUMENT_CACHE))),
     path('api-token-auth/', obtain_jwt_token),
     path('api-token-refresh/', refresh_jwt_token),
     path('api-token-verify/', verify_jwt_token),
+    path('metrics', metrics_view),
+    path('export/<str:kind>/', backend.lnd.views.export_view),
 ]
@@ -0,0 +1,152 @@
+"""
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+import json
+
+from django.conf import settings
+from django.http import (HttpResponse, HttpResponseBadRequest,
+                         HttpResponseForbidden)
+from graphene_django.views import GraphQLView, HttpError
+from graphql.execution import ExecutionResult
+
+from backend.lnd.rpc_client import start_request_budget
+from backend.metrics import metrics_setting, observe_request, render_metrics
+from backend.persisted_queries import (PersistedQueryError, get_extensions,
+                                       resolve_persisted_query)
+from backend.query_cost import QueryCostError, admit_request
+from backend.slow_log import (finish_operation_log, operation_log,
+                              start_operation_log)
+from backend.tracing import start_request_span
+
+
+def parse_operations(request):
+    """Returns the operation of a JSON request or the list of
+    operations of a batch
+
+    Raises:
+        HttpError if the body is no operation or batch
+    """
+    try:
+        data = json.loads(request.body.decode("utf-8"))
+    except (TypeError, ValueError):
+        raise HttpError(HttpResponseBadRequest("POST body sent invalid JSON."))
+
+    if isinstance(data, dict):
+        return data
+
+    if not isinstance(data, list) or not data or not all(
+            isinstance(entry, dict) for entry in data):
+        raise HttpError(
+            HttpResponseBadRequest(
+                "The received data is not a valid JSON query."))
+
+    max_size = settings.GRAPHQL_HTTP["MAX_BATCH_SIZE"]
+    if len(data) > max_size:
+        raise HttpError(
+            HttpResponseBadRequest(
+                "Batches are limited to {} operations.".format(max_size)))
+
+    return data
+
+
+class PersistedQueryGraphQLView(GraphQLView):
+    """GraphQLView with support for automatic persisted queries
+
+    Operations above the cost limits are rejected before execution,
+    see backend.query_cost.
+
+    With batch=True a JSON list of operations is executed as a batch
+    and a single operation is answered like without batching. The
+    operations run one after the other and share the request scoped
+    caches, the ASGI endpoint runs them concurrently (see
+    backend.subscriptions.http).
+    """
+
+    def parse_body(self, request):
+        if self.batch and \
+                self.get_content_type(request) == "application/json":
+            data = parse_operations(request)
+        else:
+            data = super().parse_body(request)
+
+        if not isinstance(data, list):
+            # as_view() creates a view for every request
+            self.batch = False
+        return data
+
+    def get_response(self, request, data, show_graphiql=False):
+        try:
+            return super().get_response(request, data, show_graphiql)
+        except HttpError as exc:
+            if not self.batch:
+                raise
+            # only the failing operation of a batch is rejected
+            status_code = exc.response.status_code
+            return self.json_encode(
+                request, {
+                    "errors": [self.format_error(exc)],
+                    "id": data.get("id"),
+                    "status": status_code
+                }), status_code
+
+    def dispatch(self, request, *args, **kwargs):
+        start_request_budget(request)
+        start_operation_log(request)
+        with start_request_span(request) as span:
+            try:
+                response = super().dispatch(request, *args, **kwargs)
+            finally:
+                observe_request(request)
+                finish_operation_log(request)
+            span.set_attribute("http.status_code", response.status_code)
+            return response
+
+    def execute_graphql_request(self,
+                                request,
+                                data,
+                                query,
+                                variables,
+                                operation_name,
+                                show_graphiql=False):
+        try:
+            query = resolve_persisted_query(query,
+                                            get_extensions(request, data))
+        except PersistedQueryError as exc:
+            return ExecutionResult(errors=[exc])
+
+        log = operation_log(request)
+        if log is not None:
+            log.add_operation(query, variables, operation_name)
+
+        try:
+            self.admit(request, query, variables, operation_name)
+        except QueryCostError as exc:
+            return ExecutionResult(errors=[exc])
+
+        return super().execute_graphql_request(
+            request, data, query, variables, operation_name, show_graphiql)
+
+    def admit(self, request, query, variables, operation_name):
+        """Rejects operations above the cost limits"""
+        if not query:
+            return
+
+        try:
+            document = self.get_backend(request).document_from_string(
+                self.schema, query)
+        except Exception:
+            # syntax errors are reported by the execution
+            return
+
+        admit_request(request, document, variables, operation_name)
+
+
+def metrics_view(request):
+    """Serves the metrics in the Prometheus text format"""
+    if request.META.get("REMOTE_ADDR") not in metrics_setting("ALLOWED_IPS"):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        render_metrics(), content_type="text/plain; version=0.0.4")